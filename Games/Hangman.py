@@ -1,11 +1,34 @@
 # ALPHABET -> String lowercase alphabet
-# WORDS -> List of words
+# DEFAULT_DICTIONARY -> String name of the word list used unless another is chosen
+# DICTIONARY_PATH -> String folder holding <name>.txt word lists, one word per line
+# DIFFICULTIES -> List of difficulty bucket names, easiest first
+# RARE_LETTERS -> Set of letters players seldom guess early
+# PAGE_SIZE -> Integer number of words shown at once by the 2 player word picker
+# ROUND_HEADER -> Struct of magic, version, lives, guessed letters mask, word id, dictionary name length
+# LOG_HEADER -> Struct of magic, version, seed, lives, word id, dictionary name length
 # HANGMAN -> List of hangman stages
 from random import *
+from array import array
+from bisect import bisect_left
+import os
+import mmap
+import struct
+import threading
 
 ALPHABET = "abcdefghijklmnopqrstuvwxyz "
 
-WORDS = ["ant","baboon","badger","bat","bear","beaver","camel","cat","clam","cobra","cougar","coyote","crow","deer","dog","donkey","duck","eagle","ferret","fox","frog","goat","goose","hawk","lion","lizard","llama","mole","monkey","moose","mouse","mule","newt","otter","owl","panda","parrot","pigeon","python","rabbit","ram","rat","raven","rhino","salmon","seal","shark","sheep","skunk","sloth","snake","spider","stork","swan","tiger","toad","trout","turkey","turtle","weasel","whale","wolf","wombat","zebra"]
+DEFAULT_DICTIONARY = "animals"
+DICTIONARY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Data", "Hangman", "Dictionaries")
+DIFFICULTIES = ["easy", "medium", "hard"]
+WORD_SPACE = " \t\r\v\f" # Trimmed from both ends of each dictionary line, whichever way it is read
+RARE_LETTERS = set("bfjkqvwxyz")
+PAGE_SIZE = 40
+ROUND_MAGIC = b"HSNP"
+ROUND_VERSION = 1
+ROUND_HEADER = struct.Struct("<4sHBIiB")
+LOG_MAGIC = b"HLOG"
+LOG_VERSION = 1
+LOG_HEADER = struct.Struct("<4sHQBiB")
 
 HANGMAN = ['''
 
@@ -89,154 +112,653 @@ HANGMAN = ['''
       |
 =========''']
 
+# WORD_CHARACTERS -> Set of characters a custom word may use
+WORD_CHARACTERS = frozenset(ALPHABET)
+
+# LETTER_BITS -> Dictionary of letter to bit, for letter presence masks
+LETTER_BITS = {}
+for index, letter in enumerate(ALPHABET):
+    LETTER_BITS[letter] = 1 << index
+
+# CLASS WordIndex(List p_words)
+# Answers "which words fit this board" without scanning every word
+#   by_length   -> Dictionary of word length to set of word numbers
+#   by_position -> Dictionary of (length, position, letter) to set of word numbers
+#   masks       -> List of letter presence bitmasks, one per word
+class WordIndex():
+    def __init__(self,p_words):
+        self.words = []
+        self.masks = []
+        self.by_length = {}
+        self.by_position = {}
+        for word in p_words:
+            self.add(word)
+
+    # PROCEDURE add(String p_word)
+    def add(self,p_word):
+        number = len(self.words)
+        self.words.append(p_word)
+        length = len(p_word)
+        mask = 0
+        if length not in self.by_length:
+            self.by_length[length] = set()
+        self.by_length[length].add(number)
+        for position, letter in enumerate(p_word):
+            key = (length, position, letter)
+            if key not in self.by_position:
+                self.by_position[key] = set()
+            self.by_position[key].add(number)
+            mask |= LETTER_BITS.get(letter, 0)
+        self.masks.append(mask)
+
+    # FUNCTION letters_mask(String p_letters) RETURNS Integer
+    def letters_mask(self,p_letters):
+        mask = 0
+        for letter in p_letters:
+            mask |= LETTER_BITS.get(letter, 0)
+        return mask
+
+    # FUNCTION candidates(String p_pattern, String p_excluded) RETURNS set
+    # p_pattern has "_" for each hidden letter, e.g. "_a__e"
+    # A revealed letter is revealed everywhere, so it cannot be hidden as well
+    def candidates(self,p_pattern, p_excluded=""):
+        length = len(p_pattern)
+        groups = [self.by_length.get(length, set())]
+        revealed = set()
+        hidden = []
+        for position, letter in enumerate(p_pattern):
+            if letter == "_":
+                hidden.append(position)
+            else:
+                revealed.add(letter)
+                groups.append(self.by_position.get((length, position, letter), set()))
+        groups.sort(key=len)
+        output = set(groups[0])
+        for group in groups[1:]:
+            if not output:
+                break
+            output &= group
+        for letter in revealed:
+            for position in hidden:
+                output -= self.by_position.get((length, position, letter), set())
+        excluded = self.letters_mask(p_excluded)
+        if excluded:
+            masks = self.masks
+            output = {number for number in output if not masks[number] & excluded}
+        return output
+
+    # FUNCTION matches(String p_pattern, String p_excluded) RETURNS List
+    def matches(self,p_pattern, p_excluded=""):
+        return sorted(self.words[number] for number in self.candidates(p_pattern, p_excluded))
+
+    # FUNCTION letter_counts(String p_pattern, String p_excluded) RETURNS Dictionary
+    # Number of surviving words containing each letter not yet guessed
+    def letter_counts(self,p_pattern, p_excluded=""):
+        guessed = self.letters_mask(p_pattern.replace("_", "") + p_excluded)
+        totals = {}
+        for number in self.candidates(p_pattern, p_excluded):
+            mask = self.masks[number]
+            if mask not in totals:
+                totals[mask] = 0
+            totals[mask] += 1
+        output = {}
+        for letter, bit in LETTER_BITS.items():
+            if bit & guessed or letter == " ":
+                continue
+            count = 0
+            for mask, words in totals.items():
+                if mask & bit:
+                    count += words
+            if count:
+                output[letter] = count
+        return output
+
+# FUNCTION word_difficulty(String p_word) RETURNS String
+# Few different letters are found quickly, rare letters are guessed late
+def word_difficulty(p_word):
+    letters = set(p_word) - {" "}
+    score = len(letters) + 2 * len(letters & RARE_LETTERS)
+    if score <= 4:
+        output = DIFFICULTIES[0]
+    elif score <= 6:
+        output = DIFFICULTIES[1]
+    else:
+        output = DIFFICULTIES[2]
+    return output
+
+# CLASS Dictionary(String p_name, Boolean p_use_mmap)
+# A word list that is not read from disk until a word is first needed
+# With p_use_mmap the file is memory mapped and each word is decoded when asked for
+#   buckets -> Dictionary of length, difficulty or (length, difficulty) to array of word numbers
+class Dictionary():
+    def __init__(self,p_name, p_use_mmap=False):
+        self.name = p_name
+        if os.path.dirname(p_name) or p_name.endswith(".txt"):
+            self.path = p_name
+        else:
+            self.path = os.path.join(DICTIONARY_PATH, p_name + ".txt")
+        self.use_mmap = p_use_mmap
+        self.loaded = False
+        self.lock = threading.Lock()
+        self.words = None
+        self.data = None
+        self.starts = None
+        self.ends = None
+        self.buckets = {}
+        self.word_index = None
+        self.sorted = None
+
+    # PROCEDURE load()
+    # Lines are split on "\n" and trimmed of WORD_SPACE in both modes, so they hold the same words
+    # Raises ValueError if the file has no words
+    def load(self):
+        if self.loaded:
+            return
+        with self.lock:
+            if self.loaded:
+                return
+            if self.use_mmap:
+                space = WORD_SPACE.encode("ascii")
+                with open(self.path, "rb") as f:
+                    if os.fstat(f.fileno()).st_size == 0:
+                        data = b""
+                    else:
+                        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                starts = array("q")
+                ends = array("q")
+                position = 0
+                size = len(data)
+                while position < size:
+                    end = data.find(b"\n", position)
+                    if end == -1:
+                        end = size
+                    line_start = position
+                    line_end = end
+                    while line_start < line_end and data[line_start] in space:
+                        line_start += 1
+                    while line_end > line_start and data[line_end - 1] in space:
+                        line_end -= 1
+                    if line_end > line_start:
+                        starts.append(line_start)
+                        ends.append(line_end)
+                    position = end + 1
+                count = len(starts)
+                if count == 0 and size > 0:
+                    data.close()
+            else:
+                with open(self.path, "r", encoding="utf-8", newline="\n") as f:
+                    words = [line.strip(WORD_SPACE + "\n").lower() for line in f]
+                words = [word for word in words if word != ""]
+                count = len(words)
+            if count == 0:
+                raise ValueError("Dictionary {0} has no words".format(self.name))
+            if self.use_mmap:
+                self.data = data
+                self.starts = starts
+                self.ends = ends
+            else:
+                self.words = words
+            buckets = {}
+            for number in range(count):
+                word = self.word_at(number)
+                length = len(word)
+                difficulty = word_difficulty(word)
+                for key in (length, difficulty, (length, difficulty)):
+                    if key not in buckets:
+                        buckets[key] = array("i")
+                    buckets[key].append(number)
+            self.buckets = buckets
+            self.count = count
+            self.loaded = True
+
+    # FUNCTION word(Integer p_number) RETURNS String
+    def word(self,p_number):
+        self.load()
+        return self.word_at(p_number)
+
+    # FUNCTION word_at(Integer p_number) RETURNS String
+    def word_at(self,p_number):
+        if self.words != None:
+            output = self.words[p_number]
+        else:
+            output = self.data[self.starts[p_number]:self.ends[p_number]].decode("utf-8").lower()
+        return output
+
+    def __len__(self):
+        self.load()
+        return self.count
+
+    def __iter__(self):
+        for number in range(len(self)):
+            yield self.word(number)
+
+    # FUNCTION random_word(Integer p_length, String p_difficulty, Random p_rng) RETURNS String
+    # Uniform over one bucket, or over every word if neither is given
+    # Returns None if no word has that length and difficulty
+    def random_word(self,p_length=None, p_difficulty=None, p_rng=None):
+        self.load()
+        if p_length == None and p_difficulty == None:
+            bucket = range(self.count)
+        elif p_length == None:
+            bucket = self.buckets.get(p_difficulty)
+        elif p_difficulty == None:
+            bucket = self.buckets.get(p_length)
+        else:
+            bucket = self.buckets.get((p_length, p_difficulty))
+        if not bucket:
+            output = None
+        elif p_rng == None:
+            output = self.word(bucket[randrange(len(bucket))])
+        else:
+            output = self.word(bucket[p_rng.randrange(len(bucket))])
+        return output
+
+    # FUNCTION sorted_words() RETURNS List
+    # Built once on first use and shared by every picker
+    def sorted_words(self):
+        self.load()
+        with self.lock:
+            if self.sorted == None:
+                self.sorted = sorted(self.word_at(number) for number in range(self.count))
+        return self.sorted
+
+    # FUNCTION prefix_range(String p_prefix) RETURNS Tuple
+    # (start, end) slice of sorted_words() that begins with p_prefix
+    def prefix_range(self,p_prefix):
+        words = self.sorted_words()
+        start = bisect_left(words, p_prefix)
+        end = bisect_left(words, p_prefix + "\U0010ffff", start)
+        return (start, end)
+
+    # FUNCTION index() RETURNS WordIndex
+    def index(self):
+        self.load()
+        with self.lock:
+            if self.word_index == None:
+                self.word_index = WordIndex(self)
+        return self.word_index
+
+# CLASS RoundState(String p_secret_word, Integer p_lives)
+# Everything about one round, small enough to keep thousands of them
+#   guessed    -> Bitmask of every letter guessed so far
+#   remaining  -> Bitmask of letters in the word that are still hidden
+#   hidden     -> Number of positions still shown as "_"
+#   incorrect  -> String of wrong guesses in the order they were made
+#   masked     -> List of the word as the player sees it
+# Spaces, and anything that is not in ALPHABET, are shown from the start
+class RoundState():
+    __slots__ = ("secret", "lives", "guessed", "remaining", "hidden", "incorrect", "masked")
+
+    def __init__(self,p_secret_word, p_lives):
+        self.secret = p_secret_word
+        self.lives = p_lives
+        self.guessed = LETTER_BITS[" "]
+        self.remaining = 0
+        self.hidden = 0
+        self.incorrect = ""
+        self.masked = []
+        for letter in p_secret_word:
+            bit = LETTER_BITS.get(letter, 0)
+            if bit & self.guessed or bit == 0:
+                self.masked.append(letter)
+            else:
+                self.masked.append("_")
+                self.remaining |= bit
+                self.hidden += 1
+
+    # FUNCTION has_guessed(String p_letter) RETURNS Boolean
+    def has_guessed(self,p_letter):
+        return bool(self.guessed & LETTER_BITS[p_letter])
+
+    # FUNCTION guess_error(String p_guess) RETURNS String
+    # Why p_guess cannot be played, or None if it can
+    def guess_error(self,p_guess):
+        if len(p_guess) != 1 or p_guess not in ALPHABET or p_guess == " ":
+            output = "Please enter a single lowercase letter"
+        elif self.has_guessed(p_guess):
+            output = "You have already guessed \'{0:s}\', try again".format(p_guess)
+        else:
+            output = None
+        return output
+
+    # FUNCTION found_letter(String p_letter) RETURNS Boolean
+    # True if the letter is in the word and not yet revealed
+    def found_letter(self,p_letter):
+        return bool(self.remaining & LETTER_BITS[p_letter])
+
+    # FUNCTION guess(String p_letter) RETURNS Boolean
+    # Only a correct guess touches the word, and only to reveal that letter
+    def guess(self,p_letter):
+        bit = LETTER_BITS[p_letter]
+        self.guessed |= bit
+        if self.remaining & bit:
+            self.remaining &= ~bit
+            for position, letter in enumerate(self.secret):
+                if letter == p_letter:
+                    self.masked[position] = letter
+                    self.hidden -= 1
+            output = True
+        else:
+            self.incorrect += p_letter
+            output = False
+        return output
+
+    # FUNCTION has_won() RETURNS Boolean
+    def has_won(self):
+        return self.hidden == 0
+
+    # FUNCTION has_lost() RETURNS Boolean
+    def has_lost(self):
+        return len(self.incorrect) >= self.lives
+
+    # FUNCTION lives_left() RETURNS Integer
+    def lives_left(self):
+        return self.lives - len(self.incorrect)
+
+    # FUNCTION masked_word() RETURNS String
+    def masked_word(self):
+        return "".join(self.masked)
+
+    # FUNCTION snapshot() RETURNS Tuple
+    # Plain values only, so it can be pickled or stored as it is
+    def snapshot(self):
+        return (self.secret, self.lives, self.guessed, self.remaining, self.hidden, self.incorrect, "".join(self.masked))
+
+    # FUNCTION restore(Tuple p_snapshot) RETURNS RoundState
+    @classmethod
+    def restore(cls,p_snapshot):
+        output = cls.__new__(cls)
+        output.secret, output.lives, output.guessed, output.remaining, output.hidden, output.incorrect, masked = p_snapshot
+        output.masked = list(masked)
+        return output
+
+# DICTIONARIES -> Dictionary of name to Dictionary, shared by every game in the process
+DICTIONARIES = {}
+DICTIONARIES_LOCK = threading.Lock()
+
+# FUNCTION get_dictionary(String p_name, Boolean p_use_mmap) RETURNS Dictionary
+# Cheap to call at startup, the words are only read when first used
+def get_dictionary(p_name=DEFAULT_DICTIONARY, p_use_mmap=False):
+    with DICTIONARIES_LOCK:
+        if p_name not in DICTIONARIES:
+            DICTIONARIES[p_name] = Dictionary(p_name, p_use_mmap)
+        output = DICTIONARIES[p_name]
+    return output
+
+# FUNCTION __getattr__(String p_name) RETURNS List
+# WORDS -> List of words in the default dictionary, as it was before word lists moved to files
+# Only read when first used, then kept as an ordinary module attribute
+def __getattr__(p_name):
+    if p_name != "WORDS":
+        raise AttributeError("module {0!r} has no attribute {1!r}".format(__name__, p_name))
+    output = list(get_dictionary())
+    globals()["WORDS"] = output
+    return output
+
+# FUNCTION dictionary_name_bytes(String p_dictionary_name) RETURNS bytes
+# Raises ValueError if the name does not fit the one byte length in a snapshot or log header
+def dictionary_name_bytes(p_dictionary_name):
+    output = p_dictionary_name.encode()
+    if len(output) > 255:
+        raise ValueError("Dictionary name is longer than 255 bytes")
+    return output
+
+# FUNCTION encode_round(RoundState p_state, String p_dictionary_name) RETURNS bytes
+# The word is stored as its place in the sorted dictionary, or as text if it is a custom word
+# After the header come the dictionary name, the wrong guesses in order and any custom word
+def encode_round(p_state, p_dictionary_name=DEFAULT_DICTIONARY):
+    name = dictionary_name_bytes(p_dictionary_name)
+    words = get_dictionary(p_dictionary_name).sorted_words()
+    word_id = bisect_left(words, p_state.secret)
+    if word_id == len(words) or words[word_id] != p_state.secret:
+        word_id = -1
+    incorrect = p_state.incorrect.encode()
+    output = ROUND_HEADER.pack(ROUND_MAGIC, ROUND_VERSION, p_state.lives, p_state.guessed, word_id, len(name)) + name
+    output += bytes([len(incorrect)]) + incorrect
+    if word_id == -1:
+        secret = p_state.secret.encode()
+        output += struct.pack("<H", len(secret)) + secret
+    return output
+
+# FUNCTION decode_round(bytes p_data) RETURNS RoundState
+def decode_round(p_data):
+    magic, version, lives, guessed, word_id, name_size = ROUND_HEADER.unpack_from(p_data)
+    if magic != ROUND_MAGIC or version != ROUND_VERSION:
+        raise ValueError("Not a version {0} Hangman snapshot".format(ROUND_VERSION))
+    position = ROUND_HEADER.size
+    name = p_data[position:position + name_size].decode()
+    position += name_size
+    incorrect = p_data[position + 1:position + 1 + p_data[position]].decode()
+    position += 1 + p_data[position]
+    if word_id == -1:
+        size = struct.unpack_from("<H", p_data, position)[0]
+        secret = p_data[position + 2:position + 2 + size].decode()
+    else:
+        secret = get_dictionary(name).sorted_words()[word_id]
+    output = RoundState(secret, lives)
+    for letter in incorrect:
+        output.guess(letter)
+    for letter, bit in LETTER_BITS.items():
+        if guessed & bit and not output.guessed & bit:
+            output.guess(letter)
+    return output
+
+# FUNCTION seeded_round(Integer p_seed, Integer p_lives, String p_dictionary_name) RETURNS RoundState
+# The same seed and dictionary always give the same word
+def seeded_round(p_seed, p_lives, p_dictionary_name=DEFAULT_DICTIONARY):
+    return RoundState(get_dictionary(p_dictionary_name).random_word(p_rng=Random(p_seed)), p_lives)
+
+# CLASS RoundLog(file p_file, Integer p_seed, Integer p_lives, String p_dictionary_name)
+# Append-only log of a round from seeded_round(), a header then one byte per guess
+# finish() adds a 0 byte, 1 for won or 2 for lost, and the number of wrong guesses
+# With no seed, p_file is an existing log opened for appending to carry on a paused round
+class RoundLog():
+    def __init__(self,p_file, p_seed=None, p_lives=None, p_dictionary_name=DEFAULT_DICTIONARY):
+        self.file = p_file
+        if p_seed == None:
+            return
+        name = dictionary_name_bytes(p_dictionary_name)
+        words = get_dictionary(p_dictionary_name).sorted_words()
+        state = seeded_round(p_seed, p_lives, p_dictionary_name)
+        p_file.write(LOG_HEADER.pack(LOG_MAGIC, LOG_VERSION, p_seed, p_lives, bisect_left(words, state.secret), len(name)) + name)
+
+    # FUNCTION guess(RoundState p_state, String p_letter) RETURNS Boolean
+    def guess(self,p_state, p_letter):
+        self.file.write(p_letter.encode())
+        return p_state.guess(p_letter)
+
+    # PROCEDURE finish(RoundState p_state)
+    def finish(self,p_state):
+        if p_state.has_won():
+            outcome = 1
+        else:
+            outcome = 2
+        self.file.write(bytes([0, outcome, len(p_state.incorrect)]))
+        self.file.flush()
+
+# FUNCTION replay_round(bytes p_data) RETURNS RoundState
+# Raises ValueError if the word or the logged ending do not match the replay
+def replay_round(p_data):
+    magic, version, seed, lives, word_id, name_size = LOG_HEADER.unpack_from(p_data)
+    if magic != LOG_MAGIC or version != LOG_VERSION:
+        raise ValueError("Not a version {0} Hangman log".format(LOG_VERSION))
+    position = LOG_HEADER.size
+    name = p_data[position:position + name_size].decode()
+    position += name_size
+    output = seeded_round(seed, lives, name)
+    if get_dictionary(name).sorted_words()[word_id] != output.secret:
+        raise ValueError("The dictionary has changed since the round was logged")
+    end = p_data.find(b"\0", position)
+    if end == -1:
+        end = len(p_data)
+    for letter in p_data[position:end].decode():
+        output.guess(letter)
+    if end < len(p_data):
+        outcome, incorrect = p_data[end + 1], p_data[end + 2]
+        if outcome != (1 if output.has_won() else 2) or incorrect != len(output.incorrect):
+            raise ValueError("Replay did not end the way the log says")
+    return output
+
 # This program WILL NOT RUN until you have added all the specified sub-programs
 # Ensure that you test them first!
 
 debug_mode = False
+dictionary_name = DEFAULT_DICTIONARY
 
 class Main():
     def __init__(self):
         again = True
         while again:
             game_over = False
-            correct_letters = " "
-            incorrect_letters = ""
             
             players = self.get_players()
             lives = self.get_lives()
             secret_word = self.get_word(players)
+            state = RoundState(secret_word, lives)
             
             if debug_mode == True:
                 print(secret_word) # For testing purposes only
 
             while not game_over:
-                self.display_board(secret_word, correct_letters, incorrect_letters,lives)
-                guess = self.get_guess(correct_letters + incorrect_letters)
-                if self.found_letter(guess, secret_word):
-                    correct_letters = correct_letters + guess
-                else:
-                    incorrect_letters = incorrect_letters + guess
-                game_over = self.has_won(secret_word, correct_letters)
+                self.display_board(state)
+                guess = self.get_guess(state)
+                state.guess(guess)
+                game_over = self.has_won(state)
                 if not game_over:
-                    game_over = self.has_lost(incorrect_letters,lives)
+                    game_over = self.has_lost(state)
                 if game_over:
-                    self.display_board(secret_word, correct_letters, incorrect_letters,lives)
+                    self.display_board(state)
             again = self.play_again()
 
-    #PROCEDURE display_board(String: p_secret_word, String p_correct_letters, String p_incorrect_letters)
-    def display_board(self,p_secret_word, p_correct_letters, p_incorrect_letters, p_lives):
-        index = (len(HANGMAN)-1-p_lives)+len(p_incorrect_letters)
-        lives_left = p_lives - len(p_incorrect_letters)
+    #PROCEDURE display_board(RoundState p_state)
+    def display_board(self,p_state):
+        index = (len(HANGMAN)-1-p_state.lives)+len(p_state.incorrect)
         print(HANGMAN[index])
-        print("Incorrect guesses: {0:s}".format(p_incorrect_letters))
-        word = ""
-        for letter in p_secret_word:
-            if letter in p_correct_letters:
-                word += letter
-            else:
-                word += "_"
-            word += " "
-        print(word)
-        if self.has_won(p_secret_word, p_correct_letters):
+        print("Incorrect guesses: {0:s}".format(p_state.incorrect))
+        print(" ".join(p_state.masked) + " ")
+        if self.has_won(p_state):
             print("Well done, you guessed it!")
-        elif self.has_lost(p_incorrect_letters,p_lives):
+        elif self.has_lost(p_state):
             print("Game over, you have run out of guesses!")
-            print("The word was \'{0:s}\'".format(p_secret_word))
+            print("The word was \'{0:s}\'".format(p_state.secret))
         else:
-            print("Lives left: {0}".format(lives_left))
+            print("Lives left: {0}".format(p_state.lives_left()))
             
-    # FUNCTION get_guess(String p_guessed_letters) RETURNS String
-    def get_guess(self,p_guessed_letters):
+    # FUNCTION get_guess(RoundState p_state) RETURNS String
+    def get_guess(self,p_state):
         input_ok = False
         while input_ok == False:
             output = input("Guess a letter: ")
             output = output.lower()
-            if output not in ALPHABET:
-                print("Please enter a single lowercase letter")
-            elif len(output) != 1:
-                print("Please enter a single lowercase letter")
-            elif output == " ":
-                print("Please enter a single lowercase letter")
-            elif output in p_guessed_letters:
-                print("You have already guessed \'{0:s}\', try again".format(output))
+            error = p_state.guess_error(output)
+            if error != None:
+                print(error)
             else:
                 input_ok = True
         return output        
 
-    # FUNCTION found_letter(String p_letter, String: p_search_string) RETURNS Boolean
-    def found_letter(self,p_letter, p_search_string):
-        if p_letter in p_search_string:
-            output = True
-        else:
-            output = False
-        return output
+    # FUNCTION found_letter(String p_letter, RoundState p_state) RETURNS Boolean
+    def found_letter(self,p_letter, p_state):
+        return p_state.found_letter(p_letter)
 
-    # FUNCTION has_lost(p_incorrect_letters) RETURNS Boolean
-    def has_lost(self,p_incorrect_letters, p_lives):
-        if len(p_incorrect_letters) >= p_lives:
-            output = True
-        else:
-            output = False
-        return output
+    # FUNCTION has_lost(RoundState p_state) RETURNS Boolean
+    def has_lost(self,p_state):
+        return p_state.has_lost()
 
-    # FUNCTION has_won(String p_secret, String p_correct) RETURNS Boolean
-    def has_won(self,p_secret_word, p_correct_letters):
-        output = True
-        for letter in p_secret_word:
-            if letter not in p_correct_letters:
-                output = False
-        return output
+    # FUNCTION has_won(RoundState p_state) RETURNS Boolean
+    def has_won(self,p_state):
+        return p_state.has_won()
 
     # FUNCTION get_word(string p_players) RETURNS string
+    # Asks for a custom word if the dictionary cannot be read or has no words
     def get_word(self,p_players):
-        if p_players == "1":
-            index = randint(0,len(WORDS)-1)
-            output = WORDS[index]
+        words = get_dictionary(dictionary_name)
+        try:
+            words.load()
+        except (OSError, ValueError) as error:
+            print(error)
+            p_players = None
+        if p_players == None:
+            output = self.get_custom_word()
+        elif p_players == "1":
+            output = words.random_word()
         elif p_players == "2":
-            index = 0
-            while len(WORDS)%4 != 0:
-                WORDS.append("")
-            while index < (len(WORDS)/4):
-                mult = 0
-                while mult < 4:
-                    if mult == 3:
-                        if WORDS[int(index + mult*(len(WORDS)/4))] == "":
-                            print("")
-                        else:
-                            print("{0:>2}: {1:10}".format(int(index + mult*(len(WORDS)/4) + 1), WORDS[int(index + mult*(len(WORDS)/4))]))
-                    else:
-                        if WORDS[int(index + mult*(len(WORDS)/4))] == "":
-                            print("\t")
-                        else:
-                            print("{0:>2}: {1:10}".format(int(index + mult*(len(WORDS)/4) + 1), WORDS[int(index + mult*(len(WORDS)/4))]), end="\t")                    
-                    mult += 1
-                index += 1
-            input_ok = False
-            print(" 0: Custom word")
-            while input_ok == False:
-                try:
-                    output = int(input("Please choose a word using the numbers above: "))
-                    if output == 0:
-                        word_ok = False
-                        while word_ok == False:
-                            output = input("Enter a word: ")
-                            output = output.lower()
-                            word_ok = True
-                            for each in output:
-                                if each not in ALPHABET:
-                                    print("Please enter a word made up of lowercase letters only")
-                                    word_ok = False
-                                    break
-                        input_ok = True
-                    else:
-                        output = WORDS[output-1]
-                        input_ok = True
-                except:
-                    print("Please enter a valid number")
+            output = self.pick_word(words)
         else:
             output = None
         return output
 
+    # FUNCTION pick_word(Dictionary p_words) RETURNS String
+    # Shows one page at a time, typing letters narrows the list to words starting with them
+    def pick_word(self,p_words):
+        words = p_words.sorted_words()
+        start = 0
+        end = len(words)
+        page = 0
+        output = None
+        while output == None:
+            pages = max(1, (end - start + PAGE_SIZE - 1) // PAGE_SIZE)
+            first = start + page*PAGE_SIZE
+            self.display_page(words, first, min(first + PAGE_SIZE, end), start)
+            print("Page {0} of {1}".format(page + 1, pages))
+            print("  0: Custom word")
+            answer = input("Choose a number, type the start of a word to search, > or < to change page, or nothing to list all: ")
+            answer = answer.strip().lower()
+            if answer == ">":
+                if page + 1 < pages:
+                    page += 1
+                else:
+                    print("This is the last page")
+            elif answer == "<":
+                if page > 0:
+                    page -= 1
+                else:
+                    print("This is the first page")
+            elif answer == "":
+                start = 0
+                end = len(words)
+                page = 0
+            elif answer.isdigit():
+                number = int(answer)
+                if number == 0:
+                    output = self.get_custom_word()
+                elif number <= end - start:
+                    output = words[start + number - 1]
+                else:
+                    print("Please enter a valid number")
+            else:
+                found = p_words.prefix_range(answer)
+                if found[0] == found[1]:
+                    print("No words start with \'{0:s}\'".format(answer))
+                else:
+                    start, end = found
+                    page = 0
+        return output
+
+    # PROCEDURE display_page(List p_words, Integer p_first, Integer p_last, Integer p_start)
+    # Four columns, numbered from p_start so numbers stay the same between pages
+    def display_page(self,p_words, p_first, p_last, p_start):
+        rows = (p_last - p_first + 3) // 4
+        for row in range(rows):
+            line = ""
+            for column in range(4):
+                number = p_first + row + column*rows
+                if number < p_last:
+                    line += "{0:>3}: {1:10}\t".format(number - p_start + 1, p_words[number])
+            print(line.rstrip())
+
+    # FUNCTION get_custom_word() RETURNS String
+    def get_custom_word(self):
+        word_ok = False
+        while word_ok == False:
+            output = input("Enter a word: ")
+            output = output.lower()
+            if output.strip() == "" or not WORD_CHARACTERS.issuperset(output):
+                print("Please enter a word made up of lowercase letters only")
+            else:
+                word_ok = True
+        return output
+
     # FUNCTION play_again() RETURNS boolean
     def play_again(self):
         input_ok = False
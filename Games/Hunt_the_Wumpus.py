@@ -1,14 +1,24 @@
 import random
 import re
+import io
 import os
-import queue
+import sys
+import json
+import time
+import atexit
+import mmap
+import struct
+from array import array
 try:
-    from graphviz import Digraph
+    from graphviz import Digraph, Source
 except ImportError:
     Digraph = False
+    Source = False
 
 ROOM_CONTENTS = 0
 ROOM_LINKS = 1
+## Scratch fields of the old [contents, links, reversed, visited] rooms form, only
+## used by the deprecated transpose(), connected() and reset_visited()
 ROOM_REVERSED = 2
 ROOM_VISITED = 3
 WUMPUS = "Wumpus"
@@ -20,6 +30,114 @@ BATS = "Bats"
 SECTION_BREAK = "###############################################################"
 LINE_BREAK = "==============================================================="
 FILE_PATH = os.path.dirname(__file__)
+SEARCH_CACHE_SIZE = 256
+## Spacing, in SVG units, of the built in layout used when Graphviz is not installed
+SVG_SPACING = 90
+SVG_RADIUS = 30
+## Percept bits, what a player can sense from a room
+PERCEPT_BREEZE = 1
+PERCEPT_FLAPPING = 2
+PERCEPT_SMELL = 4
+PERCEPT_GLITTER = 8
+PERCEPT_LIGHT = 16
+PERCEPT_ARROW = 32
+## Bits set by items in the room itself, and by items in linked rooms
+PERCEPT_HERE = {GOLD:PERCEPT_GLITTER,EXIT:PERCEPT_LIGHT,ARROW:PERCEPT_ARROW}
+PERCEPT_NEAR = {PIT:PERCEPT_BREEZE,BATS:PERCEPT_FLAPPING,WUMPUS:PERCEPT_SMELL}
+## Percept bits in the order they are reported
+PERCEPT_EVENTS = ((PERCEPT_GLITTER,"glitter"),(PERCEPT_LIGHT,"light"),(PERCEPT_ARROW,"arrow"),
+                  (PERCEPT_FLAPPING,"flapping"),(PERCEPT_BREEZE,"breeze"),(PERCEPT_SMELL,"smell"))
+## Player actions for step(), e.g. (MOVE, 5), (SHOOT, 5), (GRAB, GOLD), (DROP,)
+MOVE = "move"
+SHOOT = "shoot"
+GRAB = "grab"
+DROP = "drop"
+## Text for the (kind, value) events step() returns, None for silent events
+EVENT_TEXT = {
+    "walked":"You walked into room {0}",
+    "dropped":"You dropped into room {0}",
+    "carried":"Bats carried you to room {0}",
+    "bats_stayed":"The bats could not find anywhere to take you",
+    "invalid_move":"Invalid room id {0}",
+    "invalid_action":"Invalid input",
+    "picked_gold":"You picked up a sack of gold",
+    "picked_arrow":"You picked up an arrow",
+    "nothing_found":"You did not find anything",
+    "dropped_gold":"You dropped a sack of gold",
+    "no_gold":"You are not carrying any gold",
+    "no_arrows":"You have no arrows",
+    "fired":"You fire an arrow",
+    "scream":"You hear a scream",
+    "missed":"Nothing happens",
+    "wumpus_moved":None,
+    "eaten":"You have been eaten by the wumpus",
+    "jumped":"The wumpus jumped on you",
+    "pit":"You have fallen in a pit",
+    "escaped":"You have killed the Wumpus and escaped with the gold",
+    "game_over":"The game is over",
+    "glitter":"You see a glitter",
+    "light":"You see a light",
+    "arrow":"You see an arrow in the floor",
+    "flapping":"You hear flapping",
+    "breeze":"You feel a breeze",
+    "smell":"You smell a wumpus",
+    }
+## Binary map layout, all little-endian:
+##   header   magic, version, unused, rooms, tunnels, contents, item table bytes
+##   items    newline separated item names, padded to 4 bytes
+##   int32    ids[rooms], offsets[rooms+1], targets[tunnels], content offsets[rooms+1]
+##   uint32   flags[rooms], bit n set when the room holds item n
+##   uint8    contents[contents], item numbers in room order
+MAP_MAGIC = b"WMAP"
+MAP_VERSION = 1
+MAP_HEADER = struct.Struct("<4sHHIIII")
+MAP_EXTENSION = ".wmap"
+## Game snapshot layout, all little-endian:
+##   header   magic, version, flags, status, rng kind, location, turns, arrows, map rooms,
+##            map name bytes, changed rooms, item table bytes
+##   name     map name, utf-8
+##   items    newline separated item names, utf-8, as in binary maps
+##   rng      a uint64 for SmallRandom, or 625 uint32 and a double for random.Random
+##   rooms    per changed room: int32 room id, uint8 item count, uint8 item numbers
+SNAPSHOT_MAGIC = b"WSNP"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct("<4sHBBBiIHIBHH")
+SNAPSHOT_ROOM = struct.Struct("<iB")
+SNAPSHOT_STATUS = ["alive","eaten","pit","escaped","jumped"]
+RNG_SMALL = 1
+RNG_MERSENNE = 2
+MASK_64 = (1 << 64)-1
+## Action log layout, all little-endian:
+##   header   magic, version, seed, start location, map rooms, map name bytes, contents,
+##            item table bytes
+##   name     map name, utf-8
+##   items    newline separated item names, utf-8, as in binary maps
+##   contents int32 room id and uint8 item number per item, in get_contents() order
+##   actions  uint8 kind and int32 argument per action, a room id or for a grab its
+##            place in LOG_GRABS
+##   end      three action sized records: kind 0 with the location, then flags
+##            (gold, wumpus killed, status << 2) with the turns, then 0 with the arrows
+LOG_MAGIC = b"WLOG"
+LOG_VERSION = 1
+LOG_HEADER = struct.Struct("<4sHQiIBIH")
+LOG_CONTENTS = struct.Struct("<iB")
+LOG_RECORD = struct.Struct("<Bi")
+LOG_KINDS = [None,"move","shoot","grab","drop"]
+## Only gold and arrows can be picked up, a grab of anything else is logged as None
+LOG_GRABS = [None,GOLD,ARROW]
+## Opt-in counters for the graph methods and player actions, see instrument()
+## WUMPUS_INSTRUMENT=1 turns them on at import, and WUMPUS_INSTRUMENT_FILE names a
+## JSON lines file to dump them to every WUMPUS_INSTRUMENT_INTERVAL seconds
+INSTRUMENT_ENV = "WUMPUS_INSTRUMENT"
+INSTRUMENT_FILE_ENV = "WUMPUS_INSTRUMENT_FILE"
+INSTRUMENT_INTERVAL_ENV = "WUMPUS_INSTRUMENT_INTERVAL"
+INSTRUMENT_ON = ("1","true","yes","on")
+INSTRUMENT_OFF = ("","0","false","no","off")
+INSTRUMENT_INTERVAL = 60.0
+## name -> [calls, seconds, max seconds, rooms visited, edges visited], None while off
+stats = None
+## Code flag of generator functions, as inspect.CO_GENERATOR, without importing inspect
+CO_GENERATOR = 0x20
 
 def yesno(prompt):
     input_ok = False
@@ -32,24 +150,172 @@ def yesno(prompt):
             print("Please enter Y or N.")
     return output
 
+def map_path(cave_name,extension=".txt"):
+    ## A map file path, or the name of a map in the Data/Wumpus/Maps folder
+    if os.path.isfile(cave_name) or os.path.dirname(cave_name) or cave_name.endswith((".txt",MAP_EXTENSION)):
+        return cave_name
+    return os.path.join(FILE_PATH,"Data","Wumpus","Maps",cave_name+extension)
+
+def int_block(buffer,start,count):
+    ## count little-endian int32 values from buffer, without copying if possible
+    block = memoryview(buffer)[start:start+4*count]
+    if sys.byteorder == "little":
+        return block.cast("i")
+    values = array("i",block.tobytes())
+    values.byteswap()
+    return values
+
+def int_bytes(values):
+    values = array("i",values)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values.tobytes()
+
+def convert_map(source,target):
+    ## Convert a map between the .txt and binary formats
+    ## Text is read with the same tunnel rules as load(), so a map plays the same
+    ## in either format, with every link list in the same order
+    cave = CaveSystem()
+    cave.load(source)
+    cave.save(target)
+    return cave
+
+def graph_topology(graph):
+    ## Give every vertex a dense index and pack the edges into offsets/targets arrays
+    vertices = graph[0]
+    edges = graph[1]
+    index = {}
+    for vertex in vertices:
+        if vertex not in index:
+            index[vertex] = len(index)
+    successors = [[] for vertex in index]
+    for parent,child in edges:
+        try:
+            successors[index[parent]].append(index[child])
+        except KeyError:
+            ## Edge to or from a vertex missing from the vertex list
+            for vertex in (parent,child):
+                if vertex not in index:
+                    index[vertex] = len(index)
+                    successors.append([])
+            successors[index[parent]].append(index[child])
+    offsets = array("i",[0])
+    targets = array("i")
+    for links in successors:
+        targets.extend(links)
+        offsets.append(len(targets))
+    return CaveTopology(list(index),offsets,targets,index)
+
+def rooms_topology(rooms):
+    ## Pack the tunnels of a rooms dict into offsets/targets arrays
+    index = {}
+    for room_id in rooms:
+        index[room_id] = len(index)
+    offsets = array("i",[0])
+    targets = array("i")
+    for room_data in rooms.values():
+        targets.extend([index[link] for link in room_data[ROOM_LINKS]])
+        offsets.append(len(targets))
+    return CaveTopology(list(index),offsets,targets,index)
+
+def strong_components(offsets,targets):
+    ## Iterative Tarjan over dense indices, linear in rooms + tunnels
+    ## Returns the component number of each index and the number of components
+    ## Components are numbered in reverse topological order (sinks first)
+    n = len(offsets)-1
+    order = [-1]*n
+    low = [0]*n
+    position = list(offsets)
+    limit = position[1:]
+    component = [-1]*n
+    stack = []
+    work = []
+    push = stack.append
+    pop = stack.pop
+    counter = 0
+    count = 0
+    for root in range(n):
+        if order[root] != -1:
+            continue
+        order[root] = low[root] = counter
+        counter += 1
+        push(root)
+        work.append(root)
+        while work:
+            vertex = work[-1]
+            i = position[vertex]
+            if i < limit[vertex]:
+                position[vertex] = i+1
+                link = targets[i]
+                if order[link] == -1:
+                    order[link] = low[link] = counter
+                    counter += 1
+                    push(link)
+                    work.append(link)
+                elif component[link] == -1 and order[link] < low[vertex]:
+                    low[vertex] = order[link]
+                continue
+            work.pop()
+            if work and low[vertex] < low[work[-1]]:
+                low[work[-1]] = low[vertex]
+            if low[vertex] == order[vertex]:
+                link = pop()
+                component[link] = count
+                while link != vertex:
+                    link = pop()
+                    component[link] = count
+                count += 1
+    return component,count
+
+def scc_index(graph):
+    ## Strongly connected components as {root: [rooms]} plus a room -> root lookup
+    ## graph is a (V,E) tuple from create_graph or an already built CaveTopology
+    if isinstance(graph,CaveTopology):
+        topology = graph
+    else:
+        topology = graph_topology(graph)
+    return topology.scc_index()
+
+def scc(graph):
+    return scc_index(graph)[0]
+
+## Deprecated: the graph helpers validate() used before strong_components(), kept
+## for callers that still import them and now built on CaveTopology
+
 def transpose(cave):
-    for room_id,room_data in cave.items():
-        for link in room_data[ROOM_LINKS]:
-            cave[link][ROOM_REVERSED].append(room_id)
+    ## Append to the reversed list of each room in an old rooms dict the rooms
+    ## linking to it, CaveTopology.predecessors() gives the same without the dict
+    topology = rooms_topology(cave)
+    offsets,sources = topology.predecessors()
+    ids = topology.ids
+    for i,room_data in enumerate(cave.values()):
+        room_data[ROOM_REVERSED].extend([ids[j] for j in sources[offsets[i]:offsets[i+1]]])
     return cave
 
 def connected(cave,room_id,reverse=False):
-    cave[room_id][ROOM_VISITED] = True
-    if not reverse:
-        for link in cave[room_id][ROOM_LINKS]:
-            if cave[link][ROOM_VISITED] == False:
-                cave = connected(cave,link,reverse)
-        return cave
+    ## Set the visited flag of every room in an old rooms dict that room_id can walk
+    ## to, or with reverse that can walk to room_id, without entering rooms already
+    ## flagged visited
+    ## The walk keeps its own visited set and a stack, so it does not recurse per
+    ## room, and reverse walks no longer need transpose() first
+    topology = rooms_topology(cave)
     if reverse:
-        for link in cave[room_id][ROOM_REVERSED]:
-            if cave[link][ROOM_VISITED] == False:
-                cave = connected(cave,link,reverse)
-        return cave
+        offsets,targets = topology.predecessors()
+    else:
+        offsets,targets = topology.offsets,topology.targets
+    ids = topology.ids
+    start = topology.index[room_id]
+    visited = {start}
+    stack = [start]
+    while stack:
+        i = stack.pop()
+        for j in targets[offsets[i]:offsets[i+1]]:
+            if j not in visited and cave[ids[j]][ROOM_VISITED] == False:
+                visited.add(j)
+                stack.append(j)
+    for i in visited:
+        cave[ids[i]][ROOM_VISITED] = True
+    return cave
 
 def reset_visited(cave):
     for room_id,room_data in cave.items():
@@ -57,54 +323,9 @@ def reset_visited(cave):
     return cave
 
 def create_graph(rooms):
-    V = []
-    E = []
-    for room_id,room_data in rooms.items():
-        V.append(room_id)
-        for link in room_data[ROOM_LINKS]:
-            edge = (room_id,link)
-            E.append(edge)
-    graph = (V,E)
-    return graph
-
-def scc(graph):
-    vertices = graph[0]
-    edges = graph[1]
-    visited = []
-    L = []
-    components = {}
-
-    def recur_visit(vertex):
-        if vertex not in visited:
-            visited.append(vertex)
-            for edge in edges:
-                if edge[0] == vertex:
-                    recur_visit(edge[1])
-            L.append(vertex)
-
-    def recur_assign(u,root):
-        found = False
-        for id,component in components.items():
-            if u in component:
-                found = True
-        if not found:
-            if root not in components:
-                components[root] = []
-            components[root].append(u)
-            for edge in edges:
-                if edge[1] == u:
-                    recur_assign(edge[0],root)
-    
-    for vertex in vertices:
-        recur_visit(vertex)
-
-    i = 0
-    for each in reversed(L):
-        i+=1
-        recur_assign(each,each)
+    ## (V,E) lists of room ids and (parent, child) tunnels
+    return rooms_topology(rooms).create_graph()
 
-    return components
-        
 class Main():
     def __init__(self):
         print("Main Loop Under Construction")
@@ -116,17 +337,681 @@ class Main():
     ##   Load Existing
     ## Game play loop
 
+class CaveTopology():
+    ## Compact, read-only tunnel layout of a cave
+    ## Rooms are dense indices 0..n-1, ids[i] is the room id of index i and the
+    ## links of index i are targets[offsets[i]:offsets[i+1]]
+    def __init__(self,ids,offsets,targets,index=None):
+        self.ids = ids
+        self.room_index = index
+        self.reverse = None
+        self.offsets = offsets
+        self.targets = targets
+        self.view = memoryview(targets)
+
+    @property
+    def index(self):
+        ## room id -> index, only built when first needed
+        if self.room_index == None:
+            self.room_index = {room_id:i for i,room_id in enumerate(self.ids)}
+        return self.room_index
+
+    def __len__(self):
+        return len(self.ids)
+
+    def edge_count(self):
+        return len(self.targets)
+
+    def predecessors(self):
+        ## Reverse layout as (offsets, sources), the rooms linking to index i are
+        ## sources[offsets[i]:offsets[i+1]]
+        if self.reverse == None:
+            n = len(self.ids)
+            counts = [0]*(n+1)
+            for j in self.targets:
+                counts[j+1] += 1
+            for i in range(n):
+                counts[i+1] += counts[i]
+            offsets = array("i",counts)
+            position = counts[:n]
+            sources = array("i",bytes(4*len(self.targets)))
+            targets = self.targets
+            for i in range(n):
+                for k in range(self.offsets[i],self.offsets[i+1]):
+                    j = targets[k]
+                    sources[position[j]] = i
+                    position[j] += 1
+            self.reverse = (offsets,sources)
+        return self.reverse
+
+    def neighbours(self,i):
+        ## Zero-copy slice of the link indices of index i
+        return self.view[self.offsets[i]:self.offsets[i+1]]
+
+    def get_tunnel(self,room_id):
+        ids = self.ids
+        return [ids[j] for j in self.neighbours(self.index[room_id])]
+
+    def create_graph(self):
+        ids = self.ids
+        offsets = self.offsets
+        targets = self.targets
+        E = []
+        for i,room_id in enumerate(ids):
+            for j in range(offsets[i],offsets[i+1]):
+                E.append((room_id,ids[targets[j]]))
+        return (list(ids),E)
+
+    def components(self):
+        return strong_components(self.offsets,self.targets)
+
+    def scc_index(self):
+        ## {root: [rooms]} plus a room -> root lookup
+        ## The root of each component is the first of its rooms in index order
+        component,count = self.components()
+        roots = [None]*count
+        components = {}
+        lookup = {}
+        for i,room_id in enumerate(self.ids):
+            c = component[i]
+            root = roots[c]
+            if root == None:
+                root = roots[c] = room_id
+                components[root] = []
+            components[root].append(room_id)
+            lookup[room_id] = root
+        return components,lookup
+
+    def condensation(self):
+        return Condensation(self)
+
+    def thaw(self,cave=None):
+        ## Expand back into the editable rooms dict form, keeping any contents
+        ## the cave already holds for rooms that still exist
+        if cave == None:
+            cave = CaveSystem()
+        ids = self.ids
+        offsets = self.offsets
+        targets = self.targets
+        rooms = {}
+        for i,room_id in enumerate(ids):
+            if room_id in cave.rooms:
+                contents = cave.rooms[room_id][ROOM_CONTENTS]
+            else:
+                contents = []
+            rooms[room_id] = [contents,[ids[j] for j in targets[offsets[i]:offsets[i+1]]]]
+        cave.rooms = rooms
+        cave.index_contents()
+        cave.touch(True)
+        cave.topology = self
+        return cave
+
+def file_identity(status):
+    return (status.st_dev,status.st_ino,status.st_size,status.st_mtime_ns)
+
+class MappedCave():
+    ## Read-only view of a binary map file, memory mapped so large maps open at
+    ## once and worker processes share the same pages
+    ## source is a file path or a bytes-like object holding a binary map
+    def __init__(self,source):
+        self.map = None
+        self.path = None
+        if isinstance(source,(bytes,bytearray,memoryview)):
+            buffer = source
+        else:
+            self.path = source
+            ## The map keeps its own handle on the file, so it can be closed straight away
+            with open(source,"rb") as f:
+                self.identity = file_identity(os.fstat(f.fileno()))
+                self.map = mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+            buffer = self.map
+        magic,version,unused,n,m,k,t = MAP_HEADER.unpack_from(buffer,0)
+        if magic != MAP_MAGIC:
+            raise ValueError("Not a binary cave map")
+        if version != MAP_VERSION:
+            raise ValueError("Unsupported binary map version " + str(version))
+        position = MAP_HEADER.size
+        table = bytes(buffer[position:position+t]).decode("utf-8")
+        self.items = table.split("\n") if table != "" else []
+        position += t + (-t)%4
+        ids = int_block(buffer,position,n)
+        position += 4*n
+        offsets = int_block(buffer,position,n+1)
+        position += 4*(n+1)
+        targets = int_block(buffer,position,m)
+        position += 4*m
+        self.content_offsets = int_block(buffer,position,n+1)
+        position += 4*(n+1)
+        self.flags = int_block(buffer,position,n)
+        if isinstance(self.flags,memoryview):
+            self.flags = self.flags.cast("B").cast("I")
+        position += 4*n
+        self.codes = memoryview(buffer)[position:position+k]
+        self.topology = CaveTopology(ids,offsets,targets)
+
+    def __len__(self):
+        return len(self.topology)
+
+    def contents(self,room_id):
+        i = self.topology.index[room_id]
+        return [self.items[code] for code in self.codes[self.content_offsets[i]:self.content_offsets[i+1]]]
+
+    def rooms_with(self,item):
+        ## Room ids holding item, read from the flags block
+        if item not in self.items:
+            return set()
+        bit = 1 << self.items.index(item)
+        ids = self.topology.ids
+        return {ids[i] for i,flags in enumerate(self.flags) if flags & bit}
+
+    def unchanged(self):
+        ## Whether the file at path is still the one mapped, not since replaced
+        try:
+            return file_identity(os.stat(self.path)) == self.identity
+        except OSError:
+            return False
+
+    def occupied(self):
+        ## Room ids holding anything, in room order
+        ids = self.topology.ids
+        return [ids[i] for i,flags in enumerate(self.flags) if flags]
+
+    def attach(self,cave=None):
+        ## Play and validate cave straight from the mapped arrays, rooms are only
+        ## read from the map when something looks them up
+        if cave == None:
+            cave = CaveSystem()
+        cave.rooms = MappedRooms(self)
+        cave.touch(True)
+        cave.topology = self.topology
+        cave.contents_index = {}
+        for room_id in self.occupied():
+            for item in cave.rooms[room_id][ROOM_CONTENTS]:
+                if item not in cave.contents_index:
+                    cave.contents_index[item] = set()
+                cave.contents_index[item].add(room_id)
+        cave.rooms.topology_version = cave.topology_version
+        cave.rooms.contents = cave.get_contents()
+        return cave
+
+    def thaw(self,cave=None):
+        ## Expand into an editable CaveSystem
+        if cave == None:
+            cave = CaveSystem()
+        cave.rooms = {}
+        self.topology.thaw(cave)
+        items = self.items
+        codes = self.codes
+        content_offsets = self.content_offsets
+        for i,room_data in enumerate(cave.rooms.values()):
+            start = content_offsets[i]
+            end = content_offsets[i+1]
+            if start != end:
+                room_data[ROOM_CONTENTS].extend([items[code] for code in codes[start:end]])
+        cave.index_contents()
+        ## The arrays live in the memory map, keep a private copy of the layout
+        cave.topology = None
+        return cave
+
+    def close(self):
+        if self.map != None:
+            self.topology = None
+            self.flags = None
+            self.codes = None
+            self.content_offsets = None
+            self.map.close()
+            self.map = None
+
+class MappedRooms(dict):
+    ## The rooms dict of a cave attached to a MappedCave
+    ## A room becomes an ordinary [contents, links] entry the first time it is
+    ## looked up, so a game or a validation only reads the rooms it uses
+    ## Anything that walks or removes rooms expands every room first, in room order,
+    ## after which this is a plain dict
+    ## Every dict method that reads more than one room is overridden here, the dict
+    ## versions would only see the rooms looked up so far
+    def __init__(self,mapped,links=None):
+        dict.__init__(self)
+        self.mapped = mapped
+        ## Link lists shared with copies, as CaveSystem.copy() shares them
+        self.links = {} if links == None else links
+        self.expanded = False
+        self.added = 0
+        ## Tunnel version and contents the cave had when attached, while both still
+        ## match it pickles as the map's path, see CaveSystem.__getstate__
+        self.topology_version = None
+        self.contents = None
+
+    def __missing__(self,room_id):
+        if self.expanded:
+            raise KeyError(room_id)
+        topology = self.mapped.topology
+        i = topology.index[room_id]
+        links = self.links.get(room_id)
+        if links == None:
+            ids = topology.ids
+            links = self.links[room_id] = [ids[j] for j in topology.targets[topology.offsets[i]:topology.offsets[i+1]]]
+        room_data = [self.mapped.contents(room_id),links]
+        dict.__setitem__(self,room_id,room_data)
+        return room_data
+
+    def __contains__(self,room_id):
+        return dict.__contains__(self,room_id) or (not self.expanded and room_id in self.mapped.topology.index)
+
+    def __len__(self):
+        if self.expanded:
+            return dict.__len__(self)
+        return len(self.mapped)+self.added
+
+    def __setitem__(self,room_id,room_data):
+        if not self.expanded and room_id not in self:
+            self.added += 1
+        dict.__setitem__(self,room_id,room_data)
+
+    def get(self,room_id,default=None):
+        if room_id in self:
+            return self[room_id]
+        return default
+
+    def copy_contents(self):
+        ## Rooms for CaveSystem.copy(), with their own contents and the same links
+        rooms = MappedRooms(self.mapped,self.links)
+        rooms.added = self.added
+        rooms.topology_version = self.topology_version
+        rooms.contents = self.contents
+        for room_id,room_data in dict.items(self):
+            dict.__setitem__(rooms,room_id,[list(room_data[ROOM_CONTENTS]),room_data[ROOM_LINKS]])
+        if self.expanded:
+            rooms.expand()
+        return rooms
+
+    def expand(self):
+        if self.expanded:
+            return
+        rooms = {}
+        for room_id in self.mapped.topology.ids:
+            rooms[room_id] = self[room_id]
+        for room_id,room_data in dict.items(self):
+            if room_id not in rooms:
+                rooms[room_id] = room_data
+        dict.clear(self)
+        dict.update(self,rooms)
+        self.expanded = True
+
+    def __iter__(self):
+        self.expand()
+        return dict.__iter__(self)
+
+    def __reversed__(self):
+        self.expand()
+        return dict.__reversed__(self)
+
+    def keys(self):
+        self.expand()
+        return dict.keys(self)
+
+    def values(self):
+        self.expand()
+        return dict.values(self)
+
+    def items(self):
+        self.expand()
+        return dict.items(self)
+
+    def __delitem__(self,room_id):
+        self.expand()
+        dict.__delitem__(self,room_id)
+
+    def pop(self,*args):
+        self.expand()
+        return dict.pop(self,*args)
+
+    def popitem(self):
+        self.expand()
+        return dict.popitem(self)
+
+    def setdefault(self,room_id,default=None):
+        self.expand()
+        return dict.setdefault(self,room_id,default)
+
+    def update(self,*args,**kwargs):
+        self.expand()
+        dict.update(self,*args,**kwargs)
+
+    def clear(self):
+        self.expand()
+        dict.clear(self)
+
+    def copy(self):
+        self.expand()
+        return dict(dict.items(self))
+
+    @classmethod
+    def fromkeys(cls,room_ids,value=None):
+        ## A plain dict, as there is no map behind it
+        return dict.fromkeys(room_ids,value)
+
+    def __or__(self,other):
+        if not isinstance(other,dict):
+            return NotImplemented
+        output = self.copy()
+        output.update(other)
+        return output
+
+    def __ror__(self,other):
+        if not isinstance(other,dict):
+            return NotImplemented
+        output = dict(other)
+        output.update(self.items())
+        return output
+
+    def __ior__(self,other):
+        self.update(other)
+        return self
+
+    def __eq__(self,other):
+        self.expand()
+        if isinstance(other,MappedRooms):
+            other.expand()
+        return dict.__eq__(self,other)
+
+    def __ne__(self,other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        self.expand()
+        return dict.__repr__(self)
+
+    def __reduce__(self):
+        ## Pickled as the plain dict it stands for
+        self.expand()
+        return (dict,(dict(dict.items(self)),))
+
+def write_binary_map(cave,f):
+    ## Write cave to an open binary file in the layout described by MAP_HEADER
+    items = []
+    flags = []
+    codes = bytearray()
+    content_offsets = [0]
+    for room_data in cave.rooms.values():
+        room_flags = 0
+        for item in room_data[ROOM_CONTENTS]:
+            if item == ARROW:
+                continue
+            if item not in items:
+                if len(items) == 32:
+                    raise ValueError("Binary maps hold at most 32 kinds of item")
+                items.append(item)
+            code = items.index(item)
+            codes.append(code)
+            room_flags |= 1 << code
+        flags.append(room_flags)
+        content_offsets.append(len(codes))
+    topology = rooms_topology(cave.rooms)
+    table = "\n".join(items).encode("utf-8")
+    f.write(MAP_HEADER.pack(MAP_MAGIC,MAP_VERSION,0,len(topology),topology.edge_count(),len(codes),len(table)))
+    f.write(table + bytes((-len(table))%4))
+    f.write(int_bytes(topology.ids))
+    f.write(int_bytes(topology.offsets))
+    f.write(int_bytes(topology.targets))
+    f.write(int_bytes(content_offsets))
+    f.write(int_bytes([flag - (1 << 32) if flag >= 1 << 31 else flag for flag in flags]))
+    f.write(codes)
+
+class Condensation():
+    ## DAG of the strongly connected components of a topology
+    ## Components are numbered in reverse topological order, so every DAG edge
+    ## goes from a higher to a lower component number
+    def __init__(self,topology):
+        self.topology = topology
+        component,count = topology.components()
+        self.component = component
+        self.count = count
+        ids = topology.ids
+        offsets = topology.offsets
+        targets = topology.targets
+        self.members = [[] for c in range(count)]
+        links = [set() for c in range(count)]
+        for i in range(len(ids)):
+            c = component[i]
+            self.members[c].append(ids[i])
+            for j in targets[offsets[i]:offsets[i+1]]:
+                links[c].add(component[j])
+        self.successors = []
+        in_degree = [0]*count
+        for c in range(count):
+            ## Tunnels inside a component are not DAG edges
+            links[c].discard(c)
+            self.successors.append(sorted(links[c],reverse=True))
+            for d in links[c]:
+                in_degree[d] += 1
+        self.sources = [c for c in range(count) if in_degree[c] == 0]
+        self.sinks = [c for c in range(count) if self.successors[c] == []]
+
+    def __len__(self):
+        return self.count
+
+    def order(self):
+        ## Components in topological order, sources first
+        return list(range(self.count-1,-1,-1))
+
+    def component_of(self,room_id):
+        return self.component[self.topology.index[room_id]]
+
+    def root(self,c):
+        ## First room of component c in room order
+        return self.members[c][0]
+
+    def partitions(self):
+        ## {root: [rooms]} in room order, as returned by scc()
+        partitions = {}
+        for c in sorted(range(self.count),key=lambda c: self.topology.index[self.members[c][0]]):
+            partitions[self.members[c][0]] = self.members[c]
+        return partitions
+
+    def reaches_all(self):
+        ## True if some room can reach every room, i.e. the DAG has one source
+        return len(self.sources) == 1
+
+class LandingPools():
+    ## Rooms bats can safely drop a player in, grouped by partition
+    ## Rooms sit in slots ordered by partition and then room order, with a Fenwick
+    ## tree counting the safe slots, so the safe rooms of every other partition are
+    ## the two runs of slots either side of the player's partition
+    ## Adding, removing and sampling are O(log rooms), not O(1), as a constant time
+    ## sample would need pools whose order depends on the edit history, and a
+    ## sample depends only on which rooms are safe, not on the order they were
+    ## added and removed in
+    ## A sample is from another partition whenever one has a safe room, and only
+    ## when none does falls back to the player's own partition, never their own room,
+    ## so bats still move the player in a cave that is one partition
+    def __init__(self,component,count,safe=()):
+        n = len(component)
+        self.component = component
+        self.order = sorted(range(n),key=component.__getitem__)
+        self.slot = [0]*n
+        for s,i in enumerate(self.order):
+            self.slot[i] = s
+        self.start = [0]*(count+1)
+        for c in component:
+            self.start[c+1] += 1
+        for c in range(count):
+            self.start[c+1] += self.start[c]
+        self.top = 1 << (n.bit_length()-1) if n else 0
+        self.safe = bytearray(n)
+        self.tree = [0]*(n+1)
+        self.size = 0
+        ## Linear build from the starting rooms
+        tree = self.tree
+        for i in safe:
+            if not self.safe[i]:
+                self.safe[i] = 1
+                tree[self.slot[i]+1] = 1
+                self.size += 1
+        for k in range(1,n+1):
+            parent = k+(k & -k)
+            if parent <= n:
+                tree[parent] += tree[k]
+
+    def __len__(self):
+        return self.size
+
+    def copy(self):
+        pools = LandingPools.__new__(LandingPools)
+        pools.component = self.component
+        pools.order = self.order
+        pools.slot = self.slot
+        pools.start = self.start
+        pools.top = self.top
+        pools.safe = bytearray(self.safe)
+        pools.tree = list(self.tree)
+        pools.size = self.size
+        return pools
+
+    def change(self,i,step):
+        tree = self.tree
+        n = len(tree)-1
+        k = self.slot[i]+1
+        while k <= n:
+            tree[k] += step
+            k += k & -k
+        self.size += step
+
+    def add(self,i):
+        if not self.safe[i]:
+            self.safe[i] = 1
+            self.change(i,1)
+
+    def remove(self,i):
+        if self.safe[i]:
+            self.safe[i] = 0
+            self.change(i,-1)
+
+    def count_before(self,s):
+        ## Safe rooms in slots before s
+        tree = self.tree
+        total = 0
+        while s > 0:
+            total += tree[s]
+            s &= s-1
+        return total
+
+    def select(self,r):
+        ## Index of the room in the r-th safe slot, counting from 0
+        tree = self.tree
+        n = len(tree)-1
+        position = 0
+        step = self.top
+        while step:
+            k = position+step
+            if k <= n and tree[k] <= r:
+                position = k
+                r -= tree[k]
+            step >>= 1
+        return self.order[position]
+
+    def indices(self):
+        ## Safe indices in room order
+        return [i for i,safe in enumerate(self.safe) if safe]
+
+    def sample(self,i,rng):
+        ## A safe index in another partition to index i, or if no other
+        ## partition has one any safe index but i, or None
+        n = self.size
+        c = self.component[i]
+        before = self.count_before(self.start[c])
+        own = self.count_before(self.start[c+1])-before
+        others = n-own
+        if others > 0:
+            r = rng.randrange(others)
+            if r >= before:
+                r += own
+            return self.select(r)
+        if not self.safe[i]:
+            if n == 0:
+                return None
+            return self.select(rng.randrange(n))
+        if n == 1:
+            return None
+        r = rng.randrange(n-1)
+        if r >= self.count_before(self.slot[i]):
+            r += 1
+        return self.select(r)
+
 class CaveSystem():
+    def __getstate__(self):
+        ## Only the rooms and name are pickled, caches are rebuilt on demand
+        ## A binary map whose tunnels and contents are still as loaded is sent as its
+        ## path, so worker processes map the same file and share its pages
+        rooms = self.rooms
+        if (isinstance(rooms,MappedRooms) and rooms.mapped.path != None and
+                rooms.topology_version == self.topology_version and rooms.contents == self.get_contents() and
+                rooms.mapped.unchanged()):
+            return {"map":rooms.mapped.path,"name":self.name}
+        return {"rooms":rooms,"name":self.name}
+
+    def __setstate__(self,state):
+        self.__init__(state["name"])
+        if "map" in state:
+            MappedCave(state["map"]).attach(self)
+            return
+        self.rooms = state["rooms"]
+        self.index_contents()
+
     def __init__(self,name=""):
         self.rooms = {}
         self.name = name
+        self.topology = None
+        self.contents_index = {}
+        ## version counts every edit, topology_version only room and tunnel edits
+        self.version = 0
+        self.topology_version = 0
+        self.graph_checks = None
+        self.validation = None
+        self.dag = None
+        self.searches = {}
+        self.percept_masks = None
+        self.landing = None
+        self.drawing = None
+
+    def copy(self,name=None):
+        ## A cave with its own contents that shares this cave's tunnel lists and
+        ## compact topology, cheap enough to make one per game being played
+        ## Tunnel edits after copying are unsupported, on either cave: the copy keeps
+        ## the topology, percepts and bat landing pools built for the tunnels as they
+        ## were, which would no longer match the shared link lists
+        ## Content edits are fine on both, each keeps its own caches up to date
+        cave = CaveSystem(self.name if name == None else name)
+        if isinstance(self.rooms,MappedRooms):
+            cave.rooms = self.rooms.copy_contents()
+        else:
+            cave.rooms = {room_id:[list(room_data[ROOM_CONTENTS]),room_data[ROOM_LINKS]] for room_id,room_data in self.rooms.items()}
+        cave.contents_index = {item:set(room_ids) for item,room_ids in self.contents_index.items()}
+        cave.version = self.version
+        cave.topology_version = self.topology_version
+        cave.topology = self.topology
+        cave.dag = self.dag
+        if self.percept_masks != None:
+            cave.percept_masks = list(self.percept_masks)
+        if self.landing != None:
+            cave.landing = self.landing.copy()
+        return cave
         
     def add_room(self,id):
+        if id in self.rooms:
+            for item in self.rooms[id][ROOM_CONTENTS]:
+                self.contents_index[item].discard(id)
         self.rooms[id] = [[],[]]
+        self.touch(True)
         
     def remove_room(self,id):
         self.remove_tunnel(id)
+        for item in self.rooms[id][ROOM_CONTENTS]:
+            self.contents_index[item].discard(id)
         del self.rooms[id]
+        self.touch(True)
         
     def get_room(self,id=None):
         if id == None:
@@ -135,6 +1020,7 @@ class CaveSystem():
             return self.rooms[id]
         
     def add_tunnel(self,parent_id,child_id,one_way=False):
+        self.touch(True)
         if child_id not in self.rooms[parent_id][ROOM_LINKS]:
            self.rooms[parent_id][ROOM_LINKS].append(child_id)
         if not one_way:
@@ -142,6 +1028,7 @@ class CaveSystem():
                 self.rooms[child_id][ROOM_LINKS].append(parent_id)
             
     def remove_tunnel(self,parent_id,child_id=None,one_way=False):
+        self.touch(True)
         if child_id == None:
             for key in self.rooms:
                 if parent_id in self.rooms[key][ROOM_LINKS]:
@@ -158,12 +1045,216 @@ class CaveSystem():
                 for room in self.rooms[key][ROOM_LINKS]:
                     yield [key,room]
 
+    def touch(self,topology=False):
+        ## Mark the cave as edited so cached analysis is recomputed
+        self.version += 1
+        if topology:
+            self.topology_version += 1
+            self.topology = None
+            self.percept_masks = None
+            self.landing = None
+
+    def freeze(self):
+        ## Compact topology of the current tunnels, rebuilt after any edit
+        if self.topology == None:
+            self.topology = rooms_topology(self.rooms)
+            if stats != None:
+                count_visits("CaveSystem.freeze",len(self.topology),self.topology.edge_count())
+        return self.topology
+
+    def thaw(self,topology):
+        ## Replace the tunnels with those of a compact topology
+        topology.thaw(self)
+
+    def condensation(self):
+        ## Condensation DAG of the current tunnels, rebuilt after any edit
+        if self.dag == None or self.dag[0] != self.topology_version:
+            topology = self.freeze()
+            self.dag = (self.topology_version,topology.condensation())
+            if stats != None:
+                count_visits("CaveSystem.condensation",len(topology),topology.edge_count())
+        return self.dag[1]
+
+    def bat_paths(self):
+        ## For each room, a bat room it can walk to without crossing a pit, or None
+        ## Found by walking tunnels backwards from every bat room at once
+        topology = self.freeze()
+        ids = topology.ids
+        index = topology.index
+        offsets,sources = topology.predecessors()
+        n = len(ids)
+        pit_rooms = self.contents_index.get(PIT,())
+        found = [None]*n
+        stack = []
+        for room_id in self.in_room_order(self.contents_index.get(BATS,())):
+            i = index[room_id]
+            found[i] = room_id
+            stack.append(i)
+        while stack:
+            i = stack.pop()
+            ## A walk can start in a pit room but never enter one
+            if ids[i] in pit_rooms:
+                continue
+            for j in sources[offsets[i]:offsets[i+1]]:
+                if found[j] == None:
+                    found[j] = found[i]
+                    stack.append(j)
+        if stats != None:
+            count_visits("CaveSystem.bat_paths",n,len(sources))
+        return found
+
     def add_contents(self,item,room_id):
         self.rooms[room_id][ROOM_CONTENTS].append(item)
+        if item not in self.contents_index:
+            self.contents_index[item] = set()
+        self.contents_index[item].add(room_id)
+        self.touch()
+        if self.percept_masks != None and (item in PERCEPT_HERE or item in PERCEPT_NEAR):
+            self.update_percepts(room_id)
+        if self.landing != None and item in PERCEPT_NEAR:
+            self.update_landing(room_id)
 
     def remove_contents(self,item,room_id):
         if item in self.rooms[room_id][ROOM_CONTENTS]:
             self.rooms[room_id][ROOM_CONTENTS].remove(item)
+            ## A room can hold more than one of an item, e.g. arrows
+            if item not in self.rooms[room_id][ROOM_CONTENTS]:
+                self.contents_index[item].discard(room_id)
+            self.touch()
+            if self.percept_masks != None and (item in PERCEPT_HERE or item in PERCEPT_NEAR):
+                self.update_percepts(room_id)
+            if self.landing != None and item in PERCEPT_NEAR:
+                self.update_landing(room_id)
+
+    def clear_contents(self):
+        ## Empty every room, keeping the tunnels
+        for room_data in self.rooms.values():
+            room_data[ROOM_CONTENTS].clear()
+        self.contents_index = {}
+        self.touch()
+        self.percept_masks = None
+        self.landing = None
+
+    def get_contents(self):
+        ## Every item in the cave as a list of (item, room_id) pairs, in room order
+        ## Only rooms holding something are read
+        room_ids = set()
+        for item_rooms in self.contents_index.values():
+            room_ids.update(item_rooms)
+        return [(item,room_id) for room_id in self.in_room_order(room_ids) for item in self.rooms[room_id][ROOM_CONTENTS]]
+
+    def set_contents(self,contents):
+        ## Replace the contents with (item, room_id) pairs from get_contents
+        ## Only rooms holding something are emptied first
+        changed = set()
+        for item_rooms in self.contents_index.values():
+            for room_id in item_rooms:
+                self.rooms[room_id][ROOM_CONTENTS].clear()
+                changed.add(room_id)
+        self.contents_index = {}
+        for item,room_id in contents:
+            self.rooms[room_id][ROOM_CONTENTS].append(item)
+            if item not in self.contents_index:
+                self.contents_index[item] = set()
+            self.contents_index[item].add(room_id)
+            changed.add(room_id)
+        self.touch()
+        if self.percept_masks != None:
+            for room_id in changed:
+                self.update_percepts(room_id)
+        if self.landing != None:
+            for room_id in changed:
+                self.update_landing(room_id)
+
+    def index_contents(self):
+        ## Rebuild the item -> room ids index from scratch
+        self.contents_index = {}
+        for room_id,room_data in self.rooms.items():
+            for item in room_data[ROOM_CONTENTS]:
+                if item not in self.contents_index:
+                    self.contents_index[item] = set()
+                self.contents_index[item].add(room_id)
+        self.touch()
+        self.percept_masks = None
+        self.landing = None
+
+    def landing_pools(self):
+        ## Safe bat landing rooms per partition, built once per layout and then
+        ## kept up to date as wumpus, pits and bats are added and removed
+        if self.landing == None:
+            topology = self.freeze()
+            dag = self.condensation()
+            unsafe = set()
+            for item in PERCEPT_NEAR:
+                unsafe.update(self.contents_index.get(item,()))
+            safe = [i for i,room_id in enumerate(topology.ids) if room_id not in unsafe]
+            self.landing = LandingPools(dag.component,dag.count,safe)
+            if stats != None:
+                count_visits("CaveSystem.landing_pools",len(topology),0)
+        return self.landing
+
+    def update_landing(self,room_id):
+        i = self.freeze().index[room_id]
+        for item in self.rooms[room_id][ROOM_CONTENTS]:
+            if item in PERCEPT_NEAR:
+                self.landing.remove(i)
+                return
+        self.landing.add(i)
+
+    def percepts(self,room_id):
+        ## Bitmask of PERCEPT_ flags for a player standing in room_id
+        ## Built once, then kept up to date as contents are added and removed
+        topology = self.freeze()
+        if self.percept_masks == None:
+            ## Built out from the rooms holding something, no other room is read
+            masks = [0]*len(topology)
+            index = topology.index
+            offsets,sources = topology.predecessors()
+            visited = 0
+            edges = 0
+            for item,room_ids in self.contents_index.items():
+                here = PERCEPT_HERE.get(item,0)
+                near = PERCEPT_NEAR.get(item,0)
+                if here == 0 and near == 0:
+                    continue
+                for i in room_ids:
+                    i = index[i]
+                    masks[i] |= here
+                    visited += 1
+                    if near:
+                        edges += offsets[i+1]-offsets[i]
+                        for j in sources[offsets[i]:offsets[i+1]]:
+                            masks[j] |= near
+            self.percept_masks = masks
+            if stats != None:
+                count_visits("CaveSystem.percepts",visited,edges)
+        return self.percept_masks[topology.index[room_id]]
+
+    def percept_mask(self,i):
+        topology = self.freeze()
+        ids = topology.ids
+        rooms = self.rooms
+        mask = 0
+        for item in rooms[ids[i]][ROOM_CONTENTS]:
+            mask |= PERCEPT_HERE.get(item,0)
+        for j in topology.neighbours(i):
+            for item in rooms[ids[j]][ROOM_CONTENTS]:
+                mask |= PERCEPT_NEAR.get(item,0)
+        return mask
+
+    def update_percepts(self,room_id):
+        ## Contents of room_id changed, refresh it and every room linking to it
+        topology = self.freeze()
+        offsets,sources = topology.predecessors()
+        i = topology.index[room_id]
+        masks = self.percept_masks
+        masks[i] = self.percept_mask(i)
+        for j in sources[offsets[i]:offsets[i+1]]:
+            masks[j] = self.percept_mask(j)
+
+    def rooms_with(self,item):
+        ## Set of room ids holding at least one of item
+        return set(self.contents_index.get(item,()))
             
     def display(self):
         print(LINE_BREAK)
@@ -192,80 +1283,90 @@ class CaveSystem():
         ##           = 1 -> Output 'Map Failed' error and boolean 'valid' 
         ##           = 2 -> Output all errors or 'Map Ok' and boolean 'valid'
         ##           = 3 -> Output all
+        valid,messages = self.check()
+        for level,message in messages:
+            if verbosity >= level: yield message
+        if valid:
+            if verbosity >= 2: yield "Map Ok"
+            if verbosity >= 0: yield True
+        else:
+            if verbosity >= 1: yield "Map Failed"
+            if verbosity >= 0: yield False
+
+    def check(self):
+        ## Validation result as (valid, [(verbosity, message), ...])
+        ## Cached until the next edit, graph analysis is only redone after
+        ## room or tunnel edits
+        if self.validation != None and self.validation[0] == self.version:
+            return self.validation[1]
+        if self.graph_checks == None or self.graph_checks[0] != self.topology_version:
+            self.graph_checks = (self.topology_version,self.check_graph())
+        is_connected,partitions = self.graph_checks[1]
+        result = self.check_items(is_connected,partitions)
+        self.validation = (self.version,result)
+        return result
+
+    def check_graph(self):
+        ## Check graph is connected, i.e. some room can reach every other room
+        ## Find Strongly Connected Components
+        ##  See Tarjan's Algorithm
+        dag = self.condensation()
+        is_connected = len(self.rooms) > 0 and dag.reaches_all()
+        partitions = None
+        if is_connected:
+            partitions = dag.partitions()
+        return is_connected,partitions
+
+    def check_items(self,is_connected,partitions):
         valid = True
-        
-        ## Add visited status
-        ## Transpose graph
-        cave_1 = self.rooms
-        for room_id,room_data in cave_1.items():
-            room_data.append([])
-            room_data.append(False)
-        cave_1 = transpose(cave_1)
+        messages = []
         
         ## Check one wumpus exists
         ## Check one gold exists
         ## Check at least one exit exists
         ## Check exit nodes only contain an exit
-        wumpus_found = 0
-        gold_found = 0
-        exit_found = 0
-        bats_found = 0
+        wumpus_found = len(self.contents_index.get(WUMPUS,()))
+        gold_found = len(self.contents_index.get(GOLD,()))
+        exit_found = len(self.contents_index.get(EXIT,()))
         exit_valid = False
+        for room_id in self.contents_index.get(EXIT,()):
+            if self.rooms[room_id][ROOM_CONTENTS] == [EXIT]:
+                exit_valid = True
         check_wumpus = None
         check_gold = None
-        for room_id,room_data in cave_1.items():
-            if WUMPUS in room_data[ROOM_CONTENTS]:
-                wumpus_found += 1
-            if GOLD in room_data[ROOM_CONTENTS]:
-                gold_found += 1
-            if EXIT in room_data[ROOM_CONTENTS]:
-                if room_data[ROOM_CONTENTS] == [EXIT]:
-                    exit_valid = True
-                exit_found += 1
-            if BATS in room_data[ROOM_CONTENTS]:
-                bats_found += 1
-
-        ## Check graph is connected
-        is_connected = False
-        for room_id in cave_1:
-            cave_1 = reset_visited(cave_1)
-            check = connected(cave_1,room_id,False)
-            temp_connected = True
-            for room_id,room_data in check.items():
-                if room_data[ROOM_VISITED] == False:
-                    temp_connected = False
-            if temp_connected == True:
-                is_connected = True
-                break
-        
-        if is_connected:        
-            ## Find Strongly Connected Components
-            ##  See Kosaraju's Algorithm
-            partitions = scc(create_graph(self.rooms))
-                    
+
+        if is_connected:
             ## Make sure each SCC contains a bat if there is more than one
             if len(partitions) > 1:
+                bat_rooms = self.contents_index.get(BATS,())
+                index = self.freeze().index
+                bat_paths = None
                 for id,partition in partitions.items():
                     bats_found = False
                     for room in partition:
-                        if BATS in self.rooms[room][ROOM_CONTENTS]:
+                        if room in bat_rooms:
                             bats_found = True
+                            break
                     if bats_found:
-                        if verbosity >= 3: yield "Bats Ok in partition " + str(partition)
+                        messages.append((3,"Bats Ok in partition " + str(partition)))
                     else:
             ## If no bats in partition make sure you can move to one with bats
+                        if bat_paths == None:
+                            bat_paths = self.bat_paths()
                         for room in partition:
-                            bats_found = self.df_walk(room,BATS)
-                            if bats_found[0] != None: break
-                        if bats_found[0] != None:
-                            if verbosity >= 3: yield "Path from partition " + str(partition) + " to Bats in room " + str(bats_found) + " found"
+                            bats_found = bat_paths[index[room]]
+                            if bats_found != None: break
+                        if bats_found != None:
+                            messages.append((3,"Path from partition " + str(partition) + " to Bats in room " + str(bats_found) + " found"))
                         else:
                             valid = False
-                            if verbosity >= 2: yield "Bats Missing from partition " + str(partition)
+                            messages.append((2,"Bats Missing from partition " + str(partition)))
 
             ## Check wumpus and gold is accessible
-            check_wumpus = self.df_walk(self.find_exit(),WUMPUS)
-            check_gold = self.df_walk(self.find_exit(),GOLD)
+            exit_room = self.find_exit()
+            if exit_room != None:
+                check_wumpus = self.reachable(exit_room,WUMPUS)
+                check_gold = self.reachable(exit_room,GOLD)
             
             ## If multiple SCC's
             ##   No pits next to wumpus or gold
@@ -278,413 +1379,1562 @@ class CaveSystem():
         ## Output validation statements
         if check_wumpus == None:
             valid = False
-            if verbosity >= 2: yield "Unable to reach Wumpus"
+            messages.append((2,"Unable to reach Wumpus"))
         else:
-            if verbosity >= 3: yield "Wumpus reached in room " + str(check_wumpus)
+            messages.append((3,"Wumpus reached in room " + str(check_wumpus)))
             
         if check_gold == None:
             valid = False
-            if verbosity >= 2: yield "Unable to reach Gold"
+            messages.append((2,"Unable to reach Gold"))
         else:
-            if verbosity >= 3: yield "Gold reached in room " + str(check_gold)
+            messages.append((3,"Gold reached in room " + str(check_gold)))
             
         if not is_connected:
             valid = False
-            if verbosity >= 2: yield "Not Connected"
+            messages.append((2,"Not Connected"))
         else:
-            if verbosity >= 3: yield "Connected"
+            messages.append((3,"Connected"))
             
         if wumpus_found == 0:
             valid = False
-            if verbosity >= 2: yield WUMPUS+" Missing"
+            messages.append((2,WUMPUS+" Missing"))
         elif wumpus_found > 2:
             valid = False
-            if verbosity >= 2: yield WUMPUS+" Count Too High"
+            messages.append((2,WUMPUS+" Count Too High"))
         else:
-            if verbosity >= 3: yield WUMPUS+" Count Ok"
+            messages.append((3,WUMPUS+" Count Ok"))
             
         if gold_found == 0:
             valid = False
-            if verbosity >= 2: yield GOLD+" Missing"
+            messages.append((2,GOLD+" Missing"))
         elif gold_found > 1:
             valid = False
-            if verbosity >= 2: yield GOLD+" Count Too High"
+            messages.append((2,GOLD+" Count Too High"))
         else:
-            if verbosity >= 3: yield GOLD+" Count Ok"
+            messages.append((3,GOLD+" Count Ok"))
             
         if exit_found == 0:
             valid = False
-            if verbosity >= 2: yield EXIT+" Missing"
+            messages.append((2,EXIT+" Missing"))
         else:
-            if verbosity >= 3: yield EXIT+" Count Ok"
+            messages.append((3,EXIT+" Count Ok"))
 
         if not exit_valid:
             valid = False
-            if verbosity >= 2: yield "Exit Invalid"
+            messages.append((2,"Exit Invalid"))
         else:
-            if verbosity >= 3: yield "Exit Valid"
+            messages.append((3,"Exit Valid"))
 
-        if valid:
-            if verbosity >= 2: yield "Map Ok"
-            if verbosity >= 0: yield True
-        else:
-            if verbosity >= 1: yield "Map Failed"
-            if verbosity >= 0: yield False
-        
+        return valid,messages
 
     def edit(self):
         ## map edit/create loop, including validation
         pass
 
-    def load(self,cave_name):
-        ## import map saved in .txt format, including validation
-        f = open(FILE_PATH + "\\Data\\Wumpus\\Maps\\" + cave_name + ".txt","r")
-        for line in f:
-            temp = line.split(";")
-            temp_id = temp[0]
-            self.add_room(int(temp_id))
-        f.close()
-            
-        f = open(FILE_PATH + "\\Data\\Wumpus\\Maps\\" + cave_name + ".txt","r")
-        for line in f:
-            temp = line.split(";")
-            temp_id = temp[0]
-            try:
-                temp_links = temp[1]
-            except:
-                temp_links = ""
-            try:
-                temp_contents = temp[2]
-            except:
-                temp_contents = ""
-            temp_links = temp_links.split(",")
-            temp_contents = temp_contents.split(",")
-            for link in temp_links:
-                self.add_tunnel(int(temp_id),int(link))
-            for item in temp_contents:
-                self.add_contents(item.strip("\n"),int(temp_id))
-        f.close()
-        
-        self.name = cave_name
+    def load(self,cave_name,one_way=False):
+        ## import map saved in .txt or binary format
+        ## cave_name is a map name, a file path or an open text or binary file
+        ## Each text line is id;links;contents, tunnels are resolved once every room
+        ## is known so links may point forward, and are two way unless one_way
+        ## Binary maps always load exactly as saved, and stay memory mapped with each
+        ## room only read when it is used, see MappedCave.attach()
+        if hasattr(cave_name,"read"):
+            f = cave_name
+            name = getattr(f,"name","")
+            if not isinstance(f,io.TextIOBase):
+                MappedCave(f.read()).attach(self)
+                ## Named as if loaded from its path, a file opened from a descriptor
+                ## has an int name
+                self.name = os.path.splitext(os.path.basename(name))[0] if isinstance(name,str) else ""
+                return
+        else:
+            path = map_path(cave_name)
+            if not os.path.isfile(path) and os.path.isfile(map_path(cave_name,MAP_EXTENSION)):
+                path = map_path(cave_name,MAP_EXTENSION)
+            name = cave_name
+            if path.endswith(MAP_EXTENSION):
+                MappedCave(path).attach(self)
+                self.name = os.path.splitext(os.path.basename(name))[0]
+                return
+            f = open(path,"r")
+        room_ids = []
+        room_links = []
+        rooms = {}
+        try:
+            for line in f:
+                temp = line.split(";")
+                if len(temp) == 1:
+                    if temp[0].strip() == "":
+                        continue
+                    links = []
+                    contents = []
+                else:
+                    links = temp[1].split(",") if temp[1].strip() != "" else []
+                    contents = []
+                    if len(temp) > 2:
+                        contents = [item.strip() for item in temp[2].split(",")]
+                        if "" in contents:
+                            contents = [item for item in contents if item != ""]
+                room_id = int(temp[0])
+                rooms[room_id] = [contents,[]]
+                room_ids.append(room_id)
+                room_links.append(links)
+        finally:
+            if f is not cave_name:
+                f.close()
 
-    def save(self,cave_name):
-        ## save map as .txt
-        f = open(FILE_PATH + "\\Data\\Wumpus\\Maps\\" + cave_name + ".txt","w")
-        for room_id,room_data in self.rooms.items():
-            file_line = str(room_id) + ";"
-            for link in room_data[ROOM_LINKS]:
-                file_line += str(link) + ","
-            file_line = file_line[:-1]
-            file_line += ";"
-            for item in room_data[ROOM_CONTENTS]:
-                if item != ARROW:
-                    file_line += str(item) + ","
-            file_line = file_line[:-1]
-            file_line += "\n"
-            f.write(file_line)
-        f.close()
-        self.name = cave_name
+        ## Add the tunnels in file order, as add_tunnel would, then drop repeats
+        ## once per room keeping the first of each, so hub rooms with very many
+        ## links are not searched again for every link
+        for room_id,links in zip(room_ids,room_links):
+            parent_links = rooms[room_id][ROOM_LINKS]
+            for link in links:
+                link = int(link)
+                try:
+                    child_links = rooms[link][ROOM_LINKS]
+                except KeyError:
+                    raise ValueError("Room " + str(room_id) + " links to missing room " + str(link))
+                parent_links.append(link)
+                if not one_way:
+                    child_links.append(room_id)
+        for room_data in rooms.values():
+            links = room_data[ROOM_LINKS]
+            if len(links) > 1:
+                unique = dict.fromkeys(links)
+                if len(unique) != len(links):
+                    room_data[ROOM_LINKS] = list(unique)
+
+        self.rooms = rooms
+        self.index_contents()
+        self.touch(True)
+        if isinstance(name,str) and name.endswith(".txt"):
+            name = os.path.splitext(os.path.basename(name))[0]
+        self.name = name
+
+    def save(self,cave_name,binary=False):
+        ## save map as .txt, or in the binary format if binary or the path ends .wmap
+        ## cave_name is a map name, a file path or an open text or binary file
+        if hasattr(cave_name,"write"):
+            if not isinstance(cave_name,io.TextIOBase):
+                write_binary_map(self,cave_name)
+                return
+            f = cave_name
+        else:
+            if binary:
+                path = map_path(cave_name,MAP_EXTENSION)
+                if not path.endswith(MAP_EXTENSION):
+                    ## A path given as is, e.g. with a folder, still gets the binary extension
+                    path = (path[:-4] if path.endswith(".txt") else path)+MAP_EXTENSION
+            else:
+                path = map_path(cave_name)
+            if path.endswith(MAP_EXTENSION):
+                ## Written beside the target and moved over it, never truncated in
+                ## place, as this cave or a worker process may have it memory mapped
+                ## and would crash reading a truncated map
+                temp = path+".tmp"+str(os.getpid())
+                try:
+                    with open(temp,"wb") as f:
+                        write_binary_map(self,f)
+                    os.replace(temp,path)
+                finally:
+                    if os.path.exists(temp):
+                        os.remove(temp)
+                self.name = os.path.splitext(os.path.basename(cave_name))[0]
+                return
+            f = open(path,"w")
+        try:
+            for room_id,room_data in self.rooms.items():
+                file_line = str(room_id) + ";" + ",".join(str(link) for link in room_data[ROOM_LINKS])
+                contents = [str(item) for item in room_data[ROOM_CONTENTS] if item != ARROW]
+                if contents:
+                    file_line += ";" + ",".join(contents)
+                elif not room_data[ROOM_LINKS]:
+                    file_line = str(room_id)
+                f.write(file_line + "\n")
+        finally:
+            if f is not cave_name:
+                f.close()
+        if isinstance(cave_name,str):
+            self.name = os.path.splitext(os.path.basename(cave_name))[0]
+
+    def in_room_order(self,room_ids):
+        ## room_ids as a list in the order the rooms were added, as a walk over
+        ## self.rooms would find them
+        if len(room_ids) <= 1:
+            return list(room_ids)
+        return sorted(room_ids,key=self.freeze().index.__getitem__)
+
+    def find_item(self,item):
+        ## First room holding item in room order, or None
+        room_ids = self.contents_index.get(item,())
+        if len(room_ids) <= 1:
+            for room_id in room_ids:
+                return room_id
+            return None
+        return min(room_ids,key=self.freeze().index.__getitem__)
 
     def find_exit(self):
-        for room_id,room_data in self.rooms.items():
-            if EXIT in room_data[ROOM_CONTENTS]:
-                break
-        return room_id
+        return self.find_item(EXIT)
 
     def find_wumpus(self):
-        for room_id,room_data in self.rooms.items():
-            if WUMPUS in room_data[ROOM_CONTENTS]:
-                break
-        return room_id
+        return self.find_item(WUMPUS)
 
     def find_gold(self):
-        for room_id,room_data in self.rooms.items():
-            if GOLD in room_data[ROOM_CONTENTS]:
-                break
-        return room_id
+        return self.find_item(GOLD)
     
     def find_bats(self,room_ids=None):
-        for room_id,room_data in self.rooms.items():
-            if room_ids == None:
-                if BATS in room_data[ROOM_CONTENTS]:
-                    yield room_id
-            else:
-                if BATS in room_data[ROOM_CONTENTS] and room_id in room_ids:
-                    yield room_id
+        for room_id in self.in_room_order(self.contents_index.get(BATS,())):
+            if room_ids == None or room_id in room_ids:
+                yield room_id
     
     def find_pits(self,room_ids=None):
-        for room_id,room_data in self.rooms.items():
-            if room_ids == None:
-                if PIT in room_data[ROOM_CONTENTS]:
-                    yield room_id
-            else:
-                if PIT in room_data[ROOM_CONTENTS] and room_id in room_ids:
-                    yield room_id
+        for room_id in self.in_room_order(self.contents_index.get(PIT,())):
+            if room_ids == None or room_id in room_ids:
+                yield room_id
+
+    def renderer(self):
+        ## The cave's CaveRenderer, which keeps the drawn tunnels between calls
+        if self.drawing == None:
+            self.drawing = CaveRenderer(self)
+        return self.drawing
 
-    def render(self,file_name=None,show_player=False,player_location=None):
+    def render(self,file_name=None,show_player=False,player_location=None,view=True,format=None):
+        ## format "dot", "svg" or "ascii" writes that text to file_name and returns it,
+        ## without Graphviz or a viewer. With no format the cave is rendered through
+        ## Graphviz as before, or drawn as SVG by the built in renderer if it is missing
+        if not show_player:
+            player_location = None
+        renderer = self.renderer()
+        if format == None and Source:
+            if file_name == None:
+                file_name = self.name+".gv"
+            Source(renderer.dot(player_location)).render(file_name,view=view)
+            return None
+        if format == None:
+            format = "svg"
         if file_name == None:
-            file_name = self.name+".gv"
-        if Digraph:
-            dot = Digraph(comment=self.name)
-            for room_id,room_data in self.rooms.items():
-                cont = ""
-                for item in room_data[ROOM_CONTENTS]:
-                    cont += item+", "
-                if show_player and room_id == player_location:
-                    cont += "Player, "
-                if cont == "":
-                    cont = "Empty, "
-                cont = cont[:-2]
-                dot.node(str(room_id),str(room_id)+"\n"+str(cont))
-            for room_id,room_data in self.rooms.items():
-                for link in room_data[ROOM_LINKS]:
-                    dot.edge(str(room_id),str(link))
-            dot.render(file_name,view=True)
+            file_name = self.name+"."+("gv" if format == "dot" else format)
+        text = renderer.text(format,player_location)
+        with open(file_name,"w") as f:
+            f.write(text)
+        return text
+
+    def search(self,start,avoid=None,bats=False):
+        ## Breadth first search from start, cached until the cave is next edited
+        ## Rooms holding avoid are never entered, though the search may start in one
+        ## With bats, a bat room leads to every safe landing room instead of its links
+        ## Returns (distance, parent) lists over topology indices, -1 where unreached
+        if avoid == None and not bats:
+            tag = ("topology",self.topology_version)
         else:
-            print("Graphviz not installed")
+            tag = ("contents",self.version)
+        key = (start,avoid,bats)
+        if key in self.searches and self.searches[key][0] == tag:
+            return self.searches[key][1]
+        topology = self.freeze()
+        ids = topology.ids
+        offsets = topology.offsets
+        targets = topology.targets
+        n = len(ids)
+        avoid_rooms = self.contents_index.get(avoid,())
+        bat_rooms = ()
+        landing = []
+        if bats:
+            bat_rooms = self.contents_index.get(BATS,())
+            if bat_rooms:
+                landing = self.landing_rooms()
+        distance = [-1]*n
+        parent = [-1]*n
+        s = topology.index[start]
+        distance[s] = 0
+        queue = [s]
+        for i in queue:
+            if bat_rooms and ids[i] in bat_rooms:
+                ## The first bat room reached is the nearest, so the landing
+                ## rooms only need adding once
+                links = landing
+                landing = []
+            else:
+                links = targets[offsets[i]:offsets[i+1]]
+            d = distance[i]+1
+            for j in links:
+                if distance[j] == -1 and ids[j] not in avoid_rooms:
+                    distance[j] = d
+                    parent[j] = i
+                    queue.append(j)
+        if stats != None:
+            count_visits("CaveSystem.search",len(queue),sum(offsets[i+1]-offsets[i] for i in queue))
+        if len(self.searches) >= SEARCH_CACHE_SIZE:
+            self.searches = {}
+        self.searches[key] = (tag,(distance,parent))
+        return distance,parent
 
-    def df_walk(self,start,item):
-        graph = create_graph(self.rooms)
-        vertices = graph[0]
-        edges = graph[1]
-        visited = [start]
-        order = [start]
+    def landing_rooms(self):
+        ## Indices of rooms bats can drop a player in, i.e. without wumpus, pit or bats
+        return self.landing_pools().indices()
+
+    def bat_landing(self,room_id,rng=random):
+        ## A safe room for bats to drop a player from room_id in, or None
+        ## Rooms in another partition are used when there are any
+        topology = self.freeze()
+        i = self.landing_pools().sample(topology.index[room_id],rng)
+        if i == None:
+            return None
+        return topology.ids[i]
+
+    def reachable(self,start,item,avoid=PIT,bats=True):
+        ## Nearest room holding item that can be walked to from start, or None
+        ## Rooms the same distance away are taken in room order, as find_item does
+        distance = self.search(start,avoid,bats)[0]
+        index = self.freeze().index
         found = None
-        
-        q = queue.LifoQueue()
-        q.put(start)
-        while not q.empty() and found == None:
-            node = q.get()
-            if item in self.rooms[node][ROOM_CONTENTS]:
-                found = node
-            else:
-                for edge in edges:
-                    if edge[0] == node:
-                        if BATS in self.rooms[edge[0]][ROOM_CONTENTS]:
-                            room_found = False
-                            while not room_found:
-                                move_to = random.choice(list(self.rooms.keys()))
-                                if WUMPUS not in self.rooms[move_to][ROOM_CONTENTS] and PIT not in self.rooms[move_to][ROOM_CONTENTS] and BATS not in self.rooms[move_to][ROOM_CONTENTS]:
-                                    room_found = True
-                            visited = [move_to]
-                            order.append("->")
-                            order.append(move_to)
-                            q = queue.LifoQueue()
-                            q.put(move_to)
-                        elif edge[1] not in visited and PIT not in self.rooms[edge[1]][ROOM_CONTENTS]:
-                            q.put(edge[1])
-                            visited.append(edge[1])
-                            order.append(edge[1])
-        
-        return found,order
+        best = None
+        for room_id in self.contents_index.get(item,()):
+            d = distance[index[room_id]]
+            if d != -1 and (best == None or (d,index[room_id]) < best):
+                found = room_id
+                best = (d,index[room_id])
+        return found
+
+    def path_to(self,start,target,avoid=None,bats=False):
+        ## Shortest list of rooms from start to target, or None if unreachable
+        parent = self.search(start,avoid,bats)[1]
+        topology = self.freeze()
+        ids = topology.ids
+        i = topology.index[target]
+        s = topology.index[start]
+        if i != s and parent[i] == -1:
+            return None
+        path = [target]
+        while i != s:
+            i = parent[i]
+            path.append(ids[i])
+        path.reverse()
+        return path
+
+    def distance_map(self,start,avoid=None,bats=False):
+        ## {room_id: number of moves from start} for every reachable room
+        distance = self.search(start,avoid,bats)[0]
+        ids = self.freeze().ids
+        return {ids[i]:d for i,d in enumerate(distance) if d != -1}
+
+    def df_walk(self,start,item):
+        ## Kept for older callers, returns the nearest room holding item and the
+        ## path to it, walking round pits and letting bats carry the player
+        found = self.reachable(start,item)
+        if found == None:
+            return None,[start]
+        return found,self.path_to(start,found,PIT,True)
     
-class Player():
-    def __init__(self,room_id,cave):
-        self.location = room_id
+class CaveRenderer():
+    ## Draws a cave as DOT, SVG or ASCII text without running Graphviz
+    ## The tunnels, a layout and every room's label are drawn once per layout
+    ## and contents, each frame only redraws the rooms that have changed since
+    ## then and the player's room, on top of the cached drawing
+    def __init__(self,cave):
+        self.cave = cave
+        self.topology_version = None
+        self.base = {} # Room id -> contents when the cached drawing was made
+        self.static = {} # Format -> cached drawing
+        self.positions = None
+        self.frames = []
+
+    def refresh(self):
+        ## Start again if the tunnels changed, cached drawings and frames no longer fit
+        cave = self.cave
+        if self.topology_version != cave.topology_version:
+            self.topology_version = cave.topology_version
+            self.base = {room_id:tuple(room_data[ROOM_CONTENTS]) for room_id,room_data in cave.rooms.items() if room_data[ROOM_CONTENTS]}
+            self.static = {}
+            self.positions = None
+            self.frames = []
+
+    def changes(self,player_location=None):
+        ## {room_id: contents} for rooms that differ from the cached drawing,
+        ## plus the player's room, looking only at rooms that hold something
+        self.refresh()
+        cave = self.cave
+        room_ids = set(self.base)
+        for item_rooms in cave.contents_index.values():
+            room_ids.update(item_rooms)
+        changed = {}
+        for room_id in room_ids:
+            contents = tuple(cave.rooms[room_id][ROOM_CONTENTS])
+            if contents != self.base.get(room_id,()):
+                changed[room_id] = contents
+        if player_location != None:
+            changed[player_location] = tuple(cave.rooms[player_location][ROOM_CONTENTS])+("Player",)
+        return changed
+
+    def label(self,contents):
+        if not contents:
+            return "Empty"
+        return ", ".join(contents)
+
+    def layout(self):
+        ## Rooms in rows by distance from the first room, for SVG without Graphviz
+        if self.positions == None:
+            topology = self.cave.freeze()
+            n = len(topology)
+            depth = [-1]*n
+            rows = []
+            for start in range(n):
+                if depth[start] != -1:
+                    continue
+                first_row = len(rows)
+                depth[start] = 0
+                level = [start]
+                while level:
+                    rows.append(level)
+                    next_level = []
+                    for i in level:
+                        for j in topology.neighbours(i):
+                            if depth[j] == -1:
+                                depth[j] = len(rows)-first_row
+                                next_level.append(j)
+                    level = next_level
+            self.positions = [None]*n
+            for row,level in enumerate(rows):
+                for column,i in enumerate(level):
+                    self.positions[i] = ((column+1)*SVG_SPACING,(row+1)*SVG_SPACING)
+            self.size = ((max(len(level) for level in rows)+1)*SVG_SPACING if rows else SVG_SPACING,(len(rows)+1)*SVG_SPACING)
+        return self.positions
+
+    def dot_string(self,text):
+        ## Text for inside a quoted DOT string
+        return str(text).replace("\\","\\\\").replace('"','\\"')
+
+    def dot_node(self,room_id,contents,highlight=False):
+        line = '\t{0} [label="{0}\\n{1}"'.format(room_id,self.dot_string(self.label(contents)))
+        if highlight:
+            line += " style=filled fillcolor=lightblue"
+        return line+"]\n"
+
+    def svg_node(self,i,room_id,contents,highlight=False):
+        ## Only imported for drawing, as nothing else in the game needs xml
+        from xml.sax.saxutils import escape
+        x,y = self.positions[i]
+        return ('<circle cx="{0}" cy="{1}" r="{2}" fill="{3}" stroke="black"/>'
+                '<text x="{0}" y="{4}" text-anchor="middle">{5}</text>'
+                '<text x="{0}" y="{6}" text-anchor="middle" font-size="9">{7}</text>\n').format(
+                    x,y,SVG_RADIUS,"lightblue" if highlight else "white",y-4,escape(str(room_id)),y+10,escape(self.label(contents)))
+
+    def ascii_node(self,room_id,contents,links,highlight=False):
+        marker = "*" if highlight else " "
+        return "{0}{1:>6}  {2:<24} -> {3}\n".format(marker,room_id,self.label(contents),", ".join(str(link) for link in links))
+
+    def static_text(self,format):
+        ## Cached drawing of every room and tunnel, without the closing line
+        self.refresh()
+        if format in self.static:
+            return self.static[format]
+        cave = self.cave
+        parts = []
+        if format == "dot":
+            parts.append('digraph "{0}" {{\n'.format(self.dot_string(cave.name)))
+            for room_id,room_data in cave.rooms.items():
+                parts.append(self.dot_node(room_id,self.base.get(room_id,())))
+            for room_id,room_data in cave.rooms.items():
+                for link in room_data[ROOM_LINKS]:
+                    parts.append("\t{0} -> {1}\n".format(room_id,link))
+        elif format == "svg":
+            topology = cave.freeze()
+            positions = self.layout()
+            parts.append('<svg xmlns="http://www.w3.org/2000/svg" width="{0}" height="{1}" font-family="sans-serif" font-size="11">\n'.format(*self.size))
+            parts.append('<defs><marker id="head" markerWidth="8" markerHeight="8" refX="8" refY="4" orient="auto">'
+                         '<path d="M0,0 L8,4 L0,8 z"/></marker></defs>\n')
+            for i in range(len(topology)):
+                x1,y1 = positions[i]
+                for j in topology.neighbours(i):
+                    two_way = i in topology.neighbours(j)
+                    if two_way and j < i:
+                        continue
+                    x2,y2 = positions[j]
+                    ## Stop the line at the edge of the room's circle so the arrow head shows
+                    dx = x2-x1
+                    dy = y2-y1
+                    length = max((dx*dx+dy*dy)**0.5,1)
+                    x2 -= dx*SVG_RADIUS/length
+                    y2 -= dy*SVG_RADIUS/length
+                    parts.append('<line x1="{0}" y1="{1}" x2="{2:.1f}" y2="{3:.1f}" stroke="gray"{4}/>\n'.format(
+                        x1,y1,x2,y2,"" if two_way else ' marker-end="url(#head)"'))
+            for i,room_id in enumerate(topology.ids):
+                parts.append(self.svg_node(i,room_id,self.base.get(room_id,())))
+        elif format == "ascii":
+            parts.append("{0}\n".format(cave.name if cave.name != "" else "Unnamed Cave"))
+            for room_id,room_data in cave.rooms.items():
+                parts.append(self.ascii_node(room_id,self.base.get(room_id,()),room_data[ROOM_LINKS]))
+        else:
+            raise ValueError("Unknown render format "+str(format))
+        self.static[format] = "".join(parts)
+        return self.static[format]
+
+    def overlay(self,format,changed,player_location=None):
+        ## Text drawn after the cached drawing for rooms in changed
+        cave = self.cave
+        parts = []
+        if format == "dot":
+            for room_id,contents in changed.items():
+                parts.append(self.dot_node(room_id,contents,room_id == player_location))
+            parts.append("}\n")
+        elif format == "svg":
+            index = cave.freeze().index
+            for room_id,contents in changed.items():
+                parts.append(self.svg_node(index[room_id],room_id,contents,room_id == player_location))
+            parts.append("</svg>\n")
+        else:
+            ## Text cannot be drawn over, so changed rooms are listed again below the map
+            if changed:
+                parts.append("Changed:\n")
+            for room_id,contents in changed.items():
+                parts.append(self.ascii_node(room_id,contents,cave.rooms[room_id][ROOM_LINKS],room_id == player_location))
+        return "".join(parts)
+
+    def text(self,format="dot",player_location=None):
+        ## One frame of the cave as it is now, with the player's room highlighted
+        static = self.static_text(format)
+        return static+self.overlay(format,self.changes(player_location),player_location)
+
+    def dot(self,player_location=None):
+        return self.text("dot",player_location)
+
+    def svg(self,player_location=None):
+        return self.text("svg",player_location)
+
+    def ascii(self,player_location=None):
+        return self.text("ascii",player_location)
+
+    def capture(self,player_location=None):
+        ## Record a frame for export(), keeping only what changed since the cached drawing
+        ## changes() first, as a tunnel edit starts a new list of frames
+        changed = self.changes(player_location)
+        self.frames.append((changed,player_location))
+
+    def export(self,file_name,format="dot"):
+        ## Write every captured frame, returns the files written
+        ## DOT frames go in one file of consecutive graphs that "dot -Tsvg -O" renders
+        ## in a single process, SVG and ASCII frames go in one file each
+        if format == "dot":
+            static = self.static_text(format)
+            with open(file_name,"w") as f:
+                for changed,player_location in self.frames:
+                    f.write(static)
+                    f.write(self.overlay(format,changed,player_location))
+            return [file_name]
+        base,extension = os.path.splitext(file_name)
+        if extension == "":
+            extension = "."+format
+        static = self.static_text(format)
+        written = []
+        for number,(changed,player_location) in enumerate(self.frames):
+            path = "{0}_{1:05d}{2}".format(base,number,extension)
+            with open(path,"w") as f:
+                f.write(static)
+                f.write(self.overlay(format,changed,player_location))
+            written.append(path)
+        return written
+
+    def clear_frames(self):
+        self.frames = []
+
+class CaveGenerator():
+    ## Places cave contents on a fixed tunnel layout
+    ## Every room used is empty and, with spacing, not next to a used room
+    ## The exit is put in the source partition so every room can be walked to,
+    ## and pits and bats are kept off the walks from the exit to the wumpus and
+    ## gold, so every generated cave passes validate() without retries
+    ## The exit, wumpus and gold are only kept once every end partition still has
+    ## a room for its bats, otherwise the next choice is tried, so a layout only
+    ## fails when no choice at all leaves room for them
+    def __init__(self,cave,pits=4,bats=2,exits=1,spacing=True,seed=None):
+        if isinstance(cave,CaveSystem):
+            cave = cave.freeze()
+        self.topology = cave
+        self.pits = pits
+        self.bats = bats
+        self.exits = exits
+        self.spacing = spacing
+        self.random = random.Random(seed)
+        self.dag = cave.condensation()
+        if len(cave) == 0 or not self.dag.reaches_all():
+            raise ValueError("Cave is not connected")
+        ## Rooms linked to each room in either direction
+        offsets = cave.offsets
+        targets = cave.targets
+        self.nearby = [set() for i in range(len(cave))]
+        for i in range(len(cave)):
+            for j in targets[offsets[i]:offsets[i+1]]:
+                self.nearby[i].add(j)
+                self.nearby[j].add(i)
+        index = cave.index
+        self.sources = [index[room_id] for room_id in self.dag.members[self.dag.sources[0]]]
+        self.sinks = []
+        if len(self.dag) > 1:
+            for c in self.dag.sinks:
+                self.sinks.append([index[room_id] for room_id in self.dag.members[c]])
+        self.parents = {}
+
+    def seed(self,seed):
+        self.random.seed(seed)
+
+    def walk(self,start):
+        ## Breadth first parent list from start, kept for later caves
+        if start not in self.parents:
+            offsets = self.topology.offsets
+            targets = self.topology.targets
+            parent = [-1]*len(self.topology)
+            parent[start] = start
+            queue = [start]
+            for i in queue:
+                for j in targets[offsets[i]:offsets[i+1]]:
+                    if parent[j] == -1:
+                        parent[j] = i
+                        queue.append(j)
+            self.parents[start] = parent
+        return self.parents[start]
+
+    def generate(self,cave=None):
+        ## Fill cave, or a new cave with this layout, and return it
+        topology = self.topology
+        ids = topology.ids
+        n = len(ids)
+        if cave == None:
+            cave = topology.thaw()
+        else:
+            cave.clear_contents()
+        shuffle = self.random.shuffle
+        ## Number of placed rooms stopping each room being used, so a choice can be undone
+        blocked = [0]*n
+        protected = bytearray(n)
+
+        def cover(i,step):
+            blocked[i] += step
+            if self.spacing:
+                for j in self.nearby[i]:
+                    blocked[j] += step
+
+        def place(item,i):
+            cave.add_contents(item,ids[i])
+            cover(i,1)
+
+        def place_from(item,candidates,count,skip_protected):
+            placed = []
+            for i in candidates:
+                if len(placed) == count:
+                    break
+                if not blocked[i] and not (skip_protected and protected[i]):
+                    place(item,i)
+                    placed.append(i)
+            return placed
+
+        def walk_to(start,i):
+            ## Rooms on the walk from start to i
+            parent = self.walk(start)
+            rooms = [start]
+            while i != start:
+                rooms.append(i)
+                i = parent[i]
+            return rooms
+
+        def bat_room(sink,walks,wumpus):
+            ## Whether sink still has a room for bats, off the walks and not
+            ## next to the wumpus, as bats would carry the player past it
+            for i in sink:
+                if not blocked[i] and i not in walks and (wumpus == None or i not in self.nearby[wumpus]):
+                    return True
+            return False
+
+        def bats_fit(walks,wumpus=None):
+            for sink in self.sinks:
+                if not bat_room(sink,walks,wumpus):
+                    return False
+            return True
+
+        def choose(exits,order):
+            ## First exit, wumpus and gold, in shuffled order, leaving room for
+            ## bats in every end partition, placed in the cave, or None
+            for start in exits:
+                if blocked[start]:
+                    continue
+                cover(start,1)
+                if bats_fit((start,)):
+                    for wumpus in order:
+                        if blocked[wumpus]:
+                            continue
+                        walks = set(walk_to(start,wumpus))
+                        cover(wumpus,1)
+                        if bats_fit(walks,wumpus):
+                            for gold in order:
+                                if blocked[gold]:
+                                    continue
+                                cover(gold,1)
+                                if bats_fit(walks.union(walk_to(start,gold)),wumpus):
+                                    for i in (start,wumpus,gold):
+                                        cover(i,-1)
+                                    place(EXIT,start)
+                                    place(WUMPUS,wumpus)
+                                    place(GOLD,gold)
+                                    return start,wumpus,gold
+                                cover(gold,-1)
+                        cover(wumpus,-1)
+                cover(start,-1)
+            return None
+
+        if len(self.sinks) > self.bats:
+            raise ValueError("Need at least " + str(len(self.sinks)) + " bats, one per end partition")
+        exits = self.sources[:]
+        shuffle(exits)
+        order = list(range(n))
+        shuffle(order)
+        chosen = choose(exits,order)
+        if chosen == None:
+            raise ValueError("Cave too small to place an exit, wumpus and gold with bats in every end partition")
+        start,wumpus,gold = chosen
+
+        ## Keep pits and bats off the walks from the exit to the wumpus and gold
+        for i in walk_to(start,wumpus)+walk_to(start,gold):
+            protected[i] = 1
+
+        ## Every partition must lead to bats, each one reaches a sink partition
+        for sink in self.sinks:
+            candidates = [i for i in sink if i not in self.nearby[wumpus]]
+            shuffle(candidates)
+            place_from(BATS,candidates,1,True)
+        place_from(BATS,order,self.bats-len(self.sinks),True)
+
+        ## Further exits where they fit, each with its own walks kept clear
+        bat_rooms = cave.contents_index.get(BATS,())
+        for i in exits:
+            if len(cave.contents_index.get(EXIT,())) == self.exits:
+                break
+            if blocked[i]:
+                continue
+            walks = walk_to(i,wumpus)+walk_to(i,gold)
+            if all(ids[j] not in bat_rooms for j in walks):
+                place(EXIT,i)
+                for j in walks:
+                    protected[j] = 1
+
+        if len(self.sinks) == 0:
+            place_from(PIT,order,self.pits,True)
+        else:
+            ## A pit could cut a partition off from the bats, check each one
+            placed = 0
+            for i in order:
+                if placed == self.pits:
+                    break
+                if blocked[i] or protected[i]:
+                    continue
+                cave.add_contents(PIT,ids[i])
+                bat_paths = cave.bat_paths()
+                cave.remove_contents(PIT,ids[i])
+                covered = True
+                for members in self.dag.members:
+                    if all(bat_paths[topology.index[room_id]] == None for room_id in members):
+                        covered = False
+                        break
+                if covered:
+                    place(PIT,i)
+                    placed += 1
+                else:
+                    protected[i] = 1
+        return cave
+
+def validate_map(path):
+    ## Load and validate one map file, for use in a worker process
+    result = {"map":path,"valid":False,"errors":[]}
+    try:
+        start = time.perf_counter()
+        cave = CaveSystem()
+        cave.load(path)
+        loaded = time.perf_counter()
+        for message in cave.validate(2):
+            if isinstance(message,bool):
+                result["valid"] = message
+            elif message not in ("Map Ok","Map Failed"):
+                result["errors"].append(message)
+        result["load_seconds"] = loaded-start
+        result["validate_seconds"] = time.perf_counter()-loaded
+    except Exception as error:
+        result["errors"].append(type(error).__name__+": "+str(error))
+    return result
+
+def find_maps(paths):
+    ## Map files named directly or found under the given folders
+    for path in paths:
+        if os.path.isdir(path):
+            for folder,sub_folders,file_names in os.walk(path):
+                sub_folders.sort()
+                for file_name in sorted(file_names):
+                    if file_name.endswith((".txt",MAP_EXTENSION)):
+                        yield os.path.join(folder,file_name)
+        else:
+            yield path
+
+def validate_maps(paths,workers=None,chunk_size=16):
+    ## Validate many map files across a process pool, yielding each result
+    ## dict as soon as it is ready (not in input order)
+    if workers == 1:
+        for path in paths:
+            yield validate_map(path)
+        return
+    ## Only imported for bulk work, it doubles the time it takes to import this module
+    import multiprocessing
+    with multiprocessing.Pool(workers) as pool:
+        for result in pool.imap_unordered(validate_map,paths,chunk_size):
+            yield result
+
+class SmallRandom(random.Random):
+    ## random.Random on a 64 bit splitmix generator, so the whole state is one integer
+    ## and a game snapshot needs 8 bytes for it instead of 2.5KB
+    def seed(self,a=None,version=2):
+        if a == None:
+            a = int.from_bytes(os.urandom(8),"little")
+        elif not isinstance(a,int):
+            a = int.from_bytes(str(a).encode(),"little")
+        self.state = a & MASK_64
+        self.gauss_next = None
+
+    def next64(self):
+        self.state = (self.state+0x9E3779B97F4A7C15) & MASK_64
+        z = self.state
+        z = ((z^(z >> 30))*0xBF58476D1CE4E5B9) & MASK_64
+        z = ((z^(z >> 27))*0x94D049BB133111EB) & MASK_64
+        return z^(z >> 31)
+
+    def random(self):
+        return (self.next64() >> 11)*(1.0/9007199254740992)
+
+    def getrandbits(self,k):
+        if k <= 64:
+            return self.next64() >> (64-k)
+        value = 0
+        for shift in range(0,k,64):
+            value |= self.next64() << shift
+        return value & ((1 << k)-1)
+
+    def getstate(self):
+        return self.state
+
+    def setstate(self,state):
+        self.state = state
+
+class GameState():
+    ## Everything about one game apart from the cave layout
+    ## The cave is shared and its contents change as the game goes on
+    __slots__ = ("cave","location","gold","arrows","status","wumpus_killed","turns","rng")
+
+    def __init__(self,cave,location=None,seed=None,rng=None):
+        if location == None:
+            location = cave.find_exit()
+        if rng == None:
+            rng = SmallRandom(seed)
+        self.cave = cave
+        self.location = location
         self.gold = False
         self.arrows = 1
-        self.cave = cave
-        self.links = self.cave.rooms[self.location][ROOM_LINKS]
-        self.room = self.cave.rooms[self.location][ROOM_CONTENTS]
         self.status = "alive"
         self.wumpus_killed = False
+        self.turns = 0
+        self.rng = rng
+
+def step(state,action):
+    ## Apply one action and return (state, events), nothing is printed
+    ## state is updated in place, events are (kind, value) tuples from EVENT_TEXT
+    events = []
+    if state.status != "alive":
+        events.append(("game_over",state.status))
+        return state,events
+    cave = state.cave
+    room = cave.rooms[state.location]
+    kind = action[0]
+    if kind == MOVE:
+        room_id = action[1]
+        if room_id not in room[ROOM_LINKS]:
+            events.append(("invalid_move",room_id))
+            return state,events
+        ## A one-way tunnel, with no link back, is a drop rather than a walk
+        if state.location in cave.rooms[room_id][ROOM_LINKS]:
+            events.append(("walked",room_id))
+        else:
+            events.append(("dropped",room_id))
+        state.location = room_id
+    elif kind == SHOOT:
+        room_id = action[1]
+        if room_id not in room[ROOM_LINKS]:
+            events.append(("invalid_move",room_id))
+            return state,events
+        if state.arrows == 0:
+            events.append(("no_arrows",None))
+        else:
+            state.arrows -= 1
+            events.append(("fired",room_id))
+            if WUMPUS in cave.rooms[room_id][ROOM_CONTENTS]:
+                events.append(("scream",room_id))
+                state.wumpus_killed = True
+                cave.remove_contents(WUMPUS,room_id)
+            else:
+                events.append(("missed",room_id))
+                cave.add_contents(ARROW,room_id)
+    elif kind == GRAB:
+        item = action[1]
+        if item in room[ROOM_CONTENTS] and item in (GOLD,ARROW):
+            if item == GOLD:
+                state.gold = True
+                events.append(("picked_gold",state.location))
+            else:
+                state.arrows += 1
+                events.append(("picked_arrow",state.location))
+            cave.remove_contents(item,state.location)
+        else:
+            events.append(("nothing_found",item))
+    elif kind == DROP:
+        if state.gold:
+            state.gold = False
+            cave.add_contents(GOLD,state.location)
+            events.append(("dropped_gold",state.location))
+        else:
+            events.append(("no_gold",None))
+    else:
+        events.append(("invalid_action",kind))
+        return state,events
+    state.turns += 1
+    resolve(state,events)
+    return state,events
+
+def resolve(state,events):
+    ## Work out what the room the player is in does to them
+    cave = state.cave
+    rooms = cave.rooms
+    while True:
+        room = rooms[state.location]
+        contents = room[ROOM_CONTENTS]
+        links = room[ROOM_LINKS]
+        if WUMPUS in contents:
+            if state.gold:
+                state.status = "eaten"
+            else:
+                ## The wumpus wakes and either moves to a linked room or eats you
+                choice = state.rng.randrange(len(links)+1)
+                if choice < len(links):
+                    cave.remove_contents(WUMPUS,state.location)
+                    cave.add_contents(WUMPUS,links[choice])
+                    events.append(("wumpus_moved",links[choice]))
+                    state.status = "alive"
+                else:
+                    state.status = "eaten"
+        elif PIT in contents:
+            state.status = "pit"
+        elif EXIT in contents and state.gold and state.wumpus_killed:
+            state.status = "escaped"
+        elif BATS in contents:
+            move_to = cave.bat_landing(state.location,state.rng)
+            if move_to == None:
+                state.status = "alive"
+                events.append(("bats_stayed",state.location))
+            else:
+                state.location = move_to
+                events.append(("carried",move_to))
+                continue
+        else:
+            state.status = "alive"
+            if state.gold and cave.percepts(state.location) & PERCEPT_SMELL:
+                state.status = "jumped"
+        break
+    if state.status != "alive":
+        events.append((state.status,state.location))
+    return state
+
+def content_changes(base,cave):
+    ## (room_id, contents) for every room whose contents differ from base
+    ## Only rooms that hold something in either cave are compared
+    room_ids = set()
+    for index in (base.contents_index,cave.contents_index):
+        for item_rooms in index.values():
+            room_ids.update(item_rooms)
+    changes = []
+    for room_id in sorted(room_ids):
+        contents = cave.rooms[room_id][ROOM_CONTENTS]
+        if contents != base.rooms[room_id][ROOM_CONTENTS]:
+            changes.append((room_id,contents))
+    return changes
+
+def item_table(items):
+    ## Item names and their numbers, in the order first seen, for snapshots and logs
+    numbers = {}
+    for item in items:
+        if item not in numbers:
+            if len(numbers) == 256:
+                raise ValueError("Snapshots and logs hold at most 256 kinds of item")
+            numbers[item] = len(numbers)
+    return "\n".join(numbers).encode("utf-8"),numbers
+
+def read_item_table(data):
+    table = bytes(data).decode("utf-8")
+    return table.split("\n") if table != "" else []
+
+def snapshot_game(state,base):
+    ## Compact bytes for a game in progress, holding only how its cave differs from base
+    ## base is the unplayed cave the game's cave was copied from
+    rng = state.rng
+    if isinstance(rng,SmallRandom):
+        rng_kind = RNG_SMALL
+        rng_data = struct.pack("<Q",rng.state)
+    else:
+        rng_kind = RNG_MERSENNE
+        version,internal,gauss_next = rng.getstate()
+        rng_data = struct.pack("<625I",*internal)+struct.pack("<d",float("nan") if gauss_next == None else gauss_next)
+    changes = content_changes(base,state.cave)
+    name = base.name.encode()
+    table,numbers = item_table(item for room_id,contents in changes for item in contents)
+    flags = (1 if state.gold else 0)|(2 if state.wumpus_killed else 0)
+    parts = [SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC,SNAPSHOT_VERSION,flags,SNAPSHOT_STATUS.index(state.status),rng_kind,
+                                  state.location,state.turns,state.arrows,len(base.rooms),len(name),len(changes),len(table)),
+             name,table,rng_data]
+    for room_id,contents in changes:
+        parts.append(SNAPSHOT_ROOM.pack(room_id,len(contents)))
+        parts.append(bytes(numbers[item] for item in contents))
+    return b"".join(parts)
+
+def snapshot_map(data):
+    ## Name of the map a snapshot was taken on, to find its base cave
+    header = SNAPSHOT_HEADER.unpack_from(data)
+    return data[SNAPSHOT_HEADER.size:SNAPSHOT_HEADER.size+header[9]].decode()
+
+def restore_game(data,base):
+    ## GameState from snapshot_game bytes, playing on a fresh copy of base
+    magic,version,flags,status,rng_kind,location,turns,arrows,rooms,name_size,change_count,table_size = SNAPSHOT_HEADER.unpack_from(data)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        raise ValueError("Not a version {0} game snapshot".format(SNAPSHOT_VERSION))
+    if rooms != len(base.rooms):
+        raise ValueError("Snapshot was taken on a different map")
+    position = SNAPSHOT_HEADER.size+name_size
+    items = read_item_table(data[position:position+table_size])
+    position += table_size
+    if rng_kind == RNG_SMALL:
+        rng = SmallRandom(struct.unpack_from("<Q",data,position)[0])
+        position += 8
+    else:
+        rng = random.Random()
+        internal = struct.unpack_from("<625I",data,position)
+        gauss_next = struct.unpack_from("<d",data,position+2500)[0]
+        rng.setstate((3,internal,None if gauss_next != gauss_next else gauss_next))
+        position += 2508
+    cave = base.copy()
+    for change in range(change_count):
+        room_id,count = SNAPSHOT_ROOM.unpack_from(data,position)
+        position += SNAPSHOT_ROOM.size
+        for item in list(cave.rooms[room_id][ROOM_CONTENTS]):
+            cave.remove_contents(item,room_id)
+        for code in data[position:position+count]:
+            cave.add_contents(items[code],room_id)
+        position += count
+    state = GameState(cave,location,rng=rng)
+    state.gold = bool(flags & 1)
+    state.wumpus_killed = bool(flags & 2)
+    state.status = SNAPSHOT_STATUS[status]
+    state.turns = turns
+    state.arrows = arrows
+    return state
+
+class ActionLog():
+    ## Append-only log of one game, enough to play it again exactly with replay_log()
+    ## state must be a new game made with GameState(cave,location,seed) and an integer seed
+    ## With no state, f is an existing log opened for appending to carry on a game
+    ## from restore_game(), which carries on exactly as the game would have
+    def __init__(self,f,state=None,seed=None):
+        self.f = f
+        if state == None:
+            return
+        cave = state.cave
+        contents = cave.get_contents()
+        name = cave.name.encode()
+        table,numbers = item_table(item for item,room_id in contents)
+        parts = [LOG_HEADER.pack(LOG_MAGIC,LOG_VERSION,seed & MASK_64,state.location,len(cave.rooms),len(name),len(contents),len(table)),
+                 name,table]
+        for item,room_id in contents:
+            parts.append(LOG_CONTENTS.pack(room_id,numbers[item]))
+        f.write(b"".join(parts))
+
+    def record(self,action):
+        ## Kind 0 marks the final state, so only real kinds may be written
+        if action[0] not in LOG_KINDS[1:]:
+            raise ValueError("Cannot log an action of kind {0!r}".format(action[0]))
+        kind = LOG_KINDS.index(action[0])
+        if action[0] == GRAB:
+            argument = LOG_GRABS.index(action[1]) if action[1] in LOG_GRABS else 0
+        elif action[0] == DROP:
+            argument = 0
+        else:
+            argument = action[1]
+        self.f.write(LOG_RECORD.pack(kind,argument))
+
+    def step(self,state,action):
+        ## step() that logs the action first
+        ## Invalid kinds, and moves or shots down tunnels that are not there, are not
+        ## logged, step() changes nothing for them and their room need not fit a record
+        if action[0] in LOG_KINDS[1:]:
+            if action[0] not in (MOVE,SHOOT) or action[1] in state.cave.rooms[state.location][ROOM_LINKS]:
+                self.record(action)
+        return step(state,action)
+
+    def finish(self,state):
+        ## Final state for replay_log() to check against
+        flags = (1 if state.gold else 0)|(2 if state.wumpus_killed else 0)|(SNAPSHOT_STATUS.index(state.status) << 2)
+        self.f.write(LOG_RECORD.pack(0,state.location)+LOG_RECORD.pack(flags,state.turns)+LOG_RECORD.pack(0,state.arrows))
+        self.f.flush()
+
+def log_map(data):
+    ## Name of the map a log was played on, to find its base cave
+    header = LOG_HEADER.unpack_from(data)
+    return bytes(data[LOG_HEADER.size:LOG_HEADER.size+header[5]]).decode()
+
+def replay_log(data,base):
+    ## Play a log again on a copy of base, returns (state, finished, actions)
+    ## finished is False for a log with no final state, or only part of one, e.g.
+    ## after a crash
+    ## Raises ValueError if the replay does not end in the logged final state, or
+    ## the log is cut off before its first action
+    data = memoryview(data)
+    if len(data) < LOG_HEADER.size:
+        raise ValueError("Action log is cut off in its header")
+    magic,version,seed,location,rooms,name_size,content_count,table_size = LOG_HEADER.unpack_from(data)
+    if magic != LOG_MAGIC or version != LOG_VERSION:
+        raise ValueError("Not a version {0} action log".format(LOG_VERSION))
+    if rooms != len(base.rooms):
+        raise ValueError("Log was played on a different map")
+    position = LOG_HEADER.size+name_size
+    end = position+table_size+content_count*LOG_CONTENTS.size
+    if len(data) < end:
+        raise ValueError("Action log is cut off in its starting contents")
+    items = read_item_table(data[position:position+table_size])
+    position += table_size
+    cave = base.copy()
+    cave.set_contents([(items[code],room_id) for room_id,code in LOG_CONTENTS.iter_unpack(data[position:end])])
+    state = GameState(cave,location,seed)
+    records = data[end:len(data)-(len(data)-end)%LOG_RECORD.size]
+    actions = {}
+    final = None
+    records = LOG_RECORD.iter_unpack(records)
+    count = 0
+    for kind,argument in records:
+        if kind == 0:
+            final = (argument,next(records,None),next(records,None))
+            if None in final:
+                ## Cut off part way through the final state
+                final = None
+            break
+        ## Records repeat a lot, so each distinct one is decoded once
+        action = actions.get((kind,argument))
+        if action == None:
+            if kind == 3:
+                action = (GRAB,LOG_GRABS[argument])
+            elif kind == 4:
+                action = (DROP,)
+            else:
+                action = (LOG_KINDS[kind],argument)
+            actions[(kind,argument)] = action
+        step(state,action)
+        count += 1
+    if final == None:
+        return state,False,count
+    location,(flags,turns),(zero,arrows) = final
+    expected = (location,bool(flags & 1),bool(flags & 2),SNAPSHOT_STATUS[flags >> 2],turns,arrows)
+    found = (state.location,state.gold,state.wumpus_killed,state.status,state.turns,state.arrows)
+    if found != expected:
+        raise ValueError("Replay ended in {0}, the log says {1}".format(found,expected))
+    return state,True,count
+
+def parse_action(text):
+    ## Action tuple for step() from a typed command such as "move 5", or None
+    if re.match(r"(shoot\s)(\d\d*)",text):
+        return (SHOOT,int(re.match(r"(shoot\s)(\d*)",text).group(2)))
+    if re.match(r"(grab\s)(\w\w*)",text):
+        item = re.match(r"(grab\s)(\w*)",text).group(2)
+        if item == "gold":
+            return (GRAB,GOLD)
+        if item == "arrow":
+            return (GRAB,ARROW)
+        return None
+    if text == "drop":
+        return (DROP,)
+    if re.match(r"(move\s)(\d\d*)",text):
+        return (MOVE,int(re.match(r"(move\s)(\d*)",text).group(2)))
+    return None
+
+def status_lines(state):
+    ## Where the player is, what they carry and what they can sense, as text
+    links = state.cave.rooms[state.location][ROOM_LINKS]
+    yield "You are in room {0}".format(state.location)
+    available = ", ".join(str(each) for each in links)
+    available = " & ".join(available.rsplit(", ",1))
+    if len(links) == 1:
+        yield "You can move to room {0}".format(available)
+    elif len(links) == 0:
+        yield "You are unable to move"
+    else:
+        yield "You can move to rooms {0}".format(available)
+    if state.gold:
+        yield "You are carrying a sack of gold"
+    else:
+        yield "You have not found any gold"
+    if state.arrows == 0:
+        yield "You have no arrows remaining"
+    elif state.arrows == 1:
+        yield "You have 1 arrow left"
+    else:
+        yield "You have {0} arrows left".format(state.arrows)
+    for text in describe(percepts(state)):
+        yield text
+
+def percepts(state):
+    ## What the player can see, hear and smell, as (kind, None) events
+    mask = state.cave.percepts(state.location)
+    return [(kind,None) for bit,kind in PERCEPT_EVENTS if mask & bit]
+
+def describe(events):
+    ## Text for a list of events, skipping silent ones
+    for kind,value in events:
+        text = EVENT_TEXT[kind]
+        if text != None:
+            yield text.format(value)
+
+def random_policy(state,rng):
+    ## Grab anything useful, otherwise wander, now and then firing blind
+    room = state.cave.rooms[state.location]
+    if GOLD in room[ROOM_CONTENTS]:
+        return (GRAB,GOLD)
+    links = room[ROOM_LINKS]
+    if links == []:
+        return (DROP,)
+    if state.arrows > 0 and rng.random() < 0.1:
+        return (SHOOT,rng.choice(links))
+    return (MOVE,rng.choice(links))
+
+def greedy_policy(state,rng):
+    ## Knows the map: shoot the wumpus, fetch the gold, then head for the exit,
+    ## always on a shortest walk that avoids pits
+    cave = state.cave
+    room = cave.rooms[state.location]
+    links = room[ROOM_LINKS]
+    if GOLD in room[ROOM_CONTENTS]:
+        return (GRAB,GOLD)
+    if ARROW in room[ROOM_CONTENTS] and not state.wumpus_killed:
+        return (GRAB,ARROW)
+    target = None
+    if not state.wumpus_killed:
+        target = cave.find_wumpus()
+        if target in links and state.arrows > 0:
+            return (SHOOT,target)
+        if state.arrows == 0:
+            target = None
+    elif not state.gold:
+        target = cave.find_gold()
+    else:
+        target = cave.find_exit()
+    if target != None:
+        path = cave.path_to(state.location,target,PIT)
+        if path != None and len(path) > 1 and path[1] != cave.find_wumpus():
+            return (MOVE,path[1])
+    if links == []:
+        return (DROP,)
+    return (MOVE,rng.choice(links))
+
+POLICIES = {"random":random_policy,"greedy":greedy_policy}
+
+def play_game(cave,policy,rng,max_turns=1000):
+    ## Play one game on cave with policy, returns (outcome, turns)
+    ## The outcome is a final status, or "timeout" after max_turns
+    state = GameState(cave,rng=rng)
+    while state.status == "alive" and state.turns < max_turns:
+        step(state,policy(state,rng))
+    if state.status == "alive":
+        return "timeout",state.turns
+    return state.status,state.turns
+
+def simulate_games(cave,games,policy,seed,max_turns=1000):
+    ## Play games on cave from the same starting contents, returns
+    ## ({outcome: count}, {turns: count})
+    rng = random.Random(seed)
+    contents = cave.get_contents()
+    outcomes = {}
+    turns = {}
+    for game in range(games):
+        cave.set_contents(contents)
+        outcome,count = play_game(cave,policy,rng,max_turns)
+        outcomes[outcome] = outcomes.get(outcome,0)+1
+        turns[count] = turns.get(count,0)+1
+    cave.set_contents(contents)
+    return outcomes,turns
+
+def simulate_shard(job):
+    ## Worker process entry point for simulate()
+    return simulate_games(*job)
+
+def simulate(cave,games,policy=random_policy,seed=0,workers=None,max_turns=1000,shards=None):
+    ## Monte Carlo run of games on cave, split into shards over a process pool
+    ## Each shard has its own RNG seeded from seed, so results are repeatable
+    ## policy(state, rng) returns an action and must be picklable for workers
+    import multiprocessing
+    if workers == None:
+        workers = multiprocessing.cpu_count()
+    if shards == None:
+        shards = workers*4 if workers > 1 else 1
+    shards = max(1,min(shards,games))
+    jobs = []
+    for shard in range(shards):
+        count = games//shards + (1 if shard < games%shards else 0)
+        jobs.append((cave,count,policy,seed*1000003+shard,max_turns))
+    start = time.perf_counter()
+    if workers == 1:
+        results = map(simulate_shard,jobs)
+    else:
+        pool = multiprocessing.Pool(workers)
+        results = pool.imap_unordered(simulate_shard,jobs)
+    outcomes = {}
+    turns = {}
+    try:
+        for shard_outcomes,shard_turns in results:
+            for outcome,count in shard_outcomes.items():
+                outcomes[outcome] = outcomes.get(outcome,0)+count
+            for turn,count in shard_turns.items():
+                turns[turn] = turns.get(turn,0)+count
+    finally:
+        if workers != 1:
+            pool.close()
+            pool.join()
+    total_turns = sum(turn*count for turn,count in turns.items())
+    return {
+        "games":games,
+        "outcomes":outcomes,
+        "turns":dict(sorted(turns.items())),
+        "mean_turns":total_turns/games if games else 0,
+        "seconds":time.perf_counter()-start,
+        }
+
+def state_property(name):
+    return property(lambda self: getattr(self.state,name),lambda self,value: setattr(self.state,name,value))
+
+class Player():
+    ## Text front end for the headless engine in step()
+    location = state_property("location")
+    gold = state_property("gold")
+    arrows = state_property("arrows")
+    status = state_property("status")
+    wumpus_killed = state_property("wumpus_killed")
+    cave = state_property("cave")
+
+    def __init__(self,room_id,cave):
+        self.state = GameState(cave,room_id)
+
+    @property
+    def links(self):
+        return self.cave.rooms[self.location][ROOM_LINKS]
+
+    @property
+    def room(self):
+        return self.cave.rooms[self.location][ROOM_CONTENTS]
+
+    def act(self,action):
+        events = step(self.state,action)[1]
+        for text in describe(events):
+            print(text)
+        return events
         
     def choose_action(self):
         print("Choose an action:")
         print("'shoot <room_id>', 'grab <gold/arrow>', 'drop', 'move <room_id>'")
         input_ok = False
         while not input_ok:
-            action = input("")
-            if re.match("(shoot\s)(\d\d*)",action):
-                move = int(re.match("(shoot\s)(\d*)",action).group(2))
-                if move in self.links:
-                    input_ok = True
-                    self.shoot(move)
-                else:
-                    print("Invalid input")
-            elif re.match("(grab\s)(\w\w*)",action):
-                move = re.match("(grab\s)(\w*)",action).group(2)
-                if move == "gold":
-                    input_ok = True
-                    self.grab(GOLD)
-                elif move == "arrow":
-                    input_ok = True
-                    self.grab(ARROW)
-                else:
-                    print("Invalid input")
-            elif action == "drop":
-                self.drop()
-                input_ok = True
-            elif re.match("(move\s)(\d\d*)",action):
-                move = int(re.match("(move\s)(\d*)",action).group(2))
-                if move in self.links:
-                    input_ok = True
-                    self.move(move)
-                else:
-                    print("Invalid input")
-            else:
+            action = parse_action(input(""))
+            if action == None:
                 print("Invalid input")
+            elif action[0] in (MOVE,SHOOT) and action[1] not in self.links:
+                print("Invalid input")
+            else:
+                input_ok = True
+                self.act(action)
                 
     def move(self,room_id):
-        if room_id in self.cave.rooms:
-            old_room = self.location
-            new_room = room_id
-            self.links = self.cave.rooms[self.location][ROOM_LINKS]
-            self.room = self.cave.rooms[self.location][ROOM_CONTENTS]
-            self.location = room_id
-            self.links = self.cave.rooms[self.location][ROOM_LINKS]
-            self.room = self.cave.rooms[self.location][ROOM_CONTENTS]
-            if self.status != "carried":
-                if old_room in self.cave.rooms[new_room][ROOM_LINKS]:
-                    print("You walked into room",room_id)
-                else:
-                    print("You dropped into room",room_id)
-            else:
-                print("Bats carried you to room",room_id)
-            self.update_status()
-        else:
-            print("Invalid room id",room_id)
+        self.act((MOVE,room_id))
 
     def grab(self,item):
-        if item in self.room:
-            if item == GOLD:
-                print("You picked up a sack of gold")
-                self.gold = True
-            if item == ARROW:
-                print("You picked up an arrow")
-                self.arrows += 1
-            self.cave.remove_contents(item,self.location)
-        else:
-            print("You did not find anything")
-        self.update_status()
+        self.act((GRAB,item))
 
     def drop(self):
-        if self.gold:
-            print("Yout dropped a sack of gold")
-            self.cave.add_contents(GOLD,self.location)
-        else:
-            print("You are not carrying any gold")
-        self.update_status()
+        self.act((DROP,))
 
     def shoot(self,room_id):
-        if self.arrows == 0:
-            print("You have no arrows")
-        else:
-            self.arrows -= 1
-            print("You fire an arrow")
-            if WUMPUS in self.cave.rooms[room_id][ROOM_CONTENTS]:
-                print("You hear a scream")
-                self.wumpus_killed = True
-                self.cave.remove_contents(WUMPUS,room_id)
-            else:
-                print("Nothing happens")
-                self.cave.add_contents(ARROW,room_id)
-        self.update_status()
+        self.act((SHOOT,room_id))
 
     def display_info(self):
-        self.update_status(False)
         if self.status == "alive":
             print(SECTION_BREAK)
-            print("You are in room",self.location)
-            available = ""
-            for each in self.links:
-                available += str(each)+", "
-            available = available[:-2]
-            temp = available.rsplit(", ",1)
-            available = " & ".join(temp)
-            if len(self.links) == 1:
-                print("You can move to room",available)
-            elif len(self.links) == 0:
-                print("You are unable to move")
-            else:
-                print("You can move to rooms",available)
-            if self.gold:
-                print("You are carrying a sack of gold")
-            else:
-                print("You have not found any gold")
-            if self.arrows == 0:
-                print("You have no arrows remaining")
-            elif self.arrows == 1:
-                print("You have 1 arrow left")
-            else:
-                print("You have",self.arrows,"arrows left")
-            if GOLD in self.room:
-                print("You see a glitter")
-            if EXIT in self.room:
-                print("You see a light")
-            if ARROW in self.room:
-                print("You see an arrow in the floor")
-            found_bats = False
-            found_pit = False
-            found_wumpus = False
-            for id,data in self.cave.rooms.items():
-                if id in self.links and BATS in data[ROOM_CONTENTS] and found_bats == False:
-                    print("You hear flapping")
-                    found_bats = True
-                if id in self.links and PIT in data[ROOM_CONTENTS] and found_pit == False:
-                    print("You feel a breeze")
-                    found_pit = True
-                if id in self.links and WUMPUS in data[ROOM_CONTENTS] and found_wumpus == False:
-                    print("You smell a wumpus")
-                    found_wumpus = True
+            for text in status_lines(self.state):
+                print(text)
             print(LINE_BREAK)
 
     def get_status(self):
         return self.status
 
     def update_status(self,verbose=True):
-        self.links = self.cave.rooms[self.location][ROOM_LINKS]
-        self.room = self.cave.rooms[self.location][ROOM_CONTENTS]
-        if WUMPUS in self.room and self.gold:
-            self.status = "eaten"
-        elif WUMPUS in self.room and not self.gold:
-            wumpus_action = random.choice(self.links + ["stay"])
-            if wumpus_action != "stay":
-                self.cave.remove_contents(WUMPUS,self.location)
-                self.cave.add_contents(WUMPUS,wumpus_action)
-                self.status = "alive"
-            else:
-                self.status = "eaten"
-        elif PIT in self.room:
-            self.status = "pit"
-        elif EXIT in self.room and self.gold and self.wumpus_killed:
-            self.status = "escaped"
-        elif BATS in self.room:
-            self.status = "carried"
-        else:
-            found_wumpus = False
-            for id,data in self.cave.rooms.items():
-                if id in self.links and WUMPUS in data[ROOM_CONTENTS] and found_wumpus == False:
-                    found_wumpus = True
-            if found_wumpus and self.gold:
-                self.status = "jumped"
-            else:
-                self.status = "alive"
+        events = []
+        resolve(self.state,events)
         if verbose:
-            if self.status == "eaten":
-                print("You have been eaten by the wumpus")
-            elif self.status == "jumped":
-                print("The wumpus jumped on you")
-            elif self.status == "pit":
-                print("You have fallen in a pit")
-            elif self.status == "escaped":
-                print("You have killed the Wumpus and escaped with the gold")
-        if self.status == "carried":
-            found = False
-            while not found:
-                partitions = scc(create_graph(self.cave.rooms))
-                temp = partitions
-                for partition_root,partition in partitions:
-                    if self.location in parition:
-                        del temp[partition_root]
-                room_list = []
-                for partition_root,partition in temp:
-                    room_list += partition
-                move_to = random.choice(room_list)
-                if WUMPUS not in self.cave.rooms[move_to][ROOM_CONTENTS] and PIT not in self.cave.rooms[move_to][ROOM_CONTENTS] and BATS not in self.cave.rooms[move_to][ROOM_CONTENTS]:
-                    found = True
-                    self.move(move_to)
-                
+            for text in describe(events):
+                print(text)
+
+## Methods and functions timed while instrument() is on, as (owner, names)
+## Times include nested calls, e.g. df_walk includes its search, act includes step
+## and the printing, and choose_action includes waiting for input
+INSTRUMENTED = [
+    (CaveSystem,["validate","check","check_graph","condensation","bat_paths","search","reachable",
+                 "path_to","df_walk","bat_landing","landing_pools","percepts","freeze","load","save"]),
+    (Player,["act","choose_action","display_info","update_status"]),
+    (sys.modules[__name__],["step","resolve"]),
+    ]
+originals = {} ## (owner, name) -> function replaced by its timed version
+dump_path = None
+dump_interval = INSTRUMENT_INTERVAL
+next_dump = 0
+dump_registered = False
+
+def stats_record(name):
+    record = stats.get(name)
+    if record == None:
+        record = stats[name] = [0,0.0,0.0,0,0]
+    return record
+
+def count_visits(name,rooms,edges):
+    ## Rooms and edges a graph method walked, only called from the rebuild or search
+    ## itself, so cached results cost nothing and nothing is counted while off
+    record = stats_record(name)
+    record[3] += rooms
+    record[4] += edges
+
+def count_call(name,seconds):
+    global next_dump
+    if stats == None:
+        return
+    record = stats_record(name)
+    record[0] += 1
+    record[1] += seconds
+    if seconds > record[2]:
+        record[2] = seconds
+    ## Dumps are checked for here rather than on a timer thread, so a quiet game
+    ## writes its next line on its next call
+    if dump_path != None and time.perf_counter() >= next_dump:
+        next_dump = time.perf_counter()+dump_interval
+        dump_stats()
+
+def timed(name,function):
+    clock = time.perf_counter
+    if function.__code__.co_flags & CO_GENERATOR:
+        ## validate() is a generator, so only the time spent inside it is counted,
+        ## not the time its caller takes between messages
+        def wrapper(*args,**kwargs):
+            generator = function(*args,**kwargs)
+            seconds = 0.0
+            try:
+                while True:
+                    start = clock()
+                    try:
+                        value = next(generator)
+                    except StopIteration:
+                        return
+                    finally:
+                        seconds += clock()-start
+                    yield value
+            finally:
+                count_call(name,seconds)
+    else:
+        def wrapper(*args,**kwargs):
+            start = clock()
+            try:
+                return function(*args,**kwargs)
+            finally:
+                count_call(name,clock()-start)
+    wrapper.__name__ = function.__name__
+    wrapper.__wrapped__ = function
+    return wrapper
+
+def instrument(enabled=True,path=None,interval=INSTRUMENT_INTERVAL):
+    ## Turn the counters on or off, with path they are also appended to that file
+    ## as JSON lines every interval seconds and at exit
+    ## While off the original methods are in place, so the only cost left is a
+    ## 'stats != None' test each time a search or graph rebuild runs
+    ## Turning off returns the final snapshot
+    ## The timed versions are put in place with setattr on the classes and this
+    ## module, so code that did 'from Hunt_the_Wumpus import step' before turning
+    ## on keeps calling the untimed step(), method calls are always timed
+    global stats,dump_path,dump_interval,next_dump,dump_registered
+    if not enabled:
+        if stats == None:
+            return None
+        for (owner,name),function in originals.items():
+            setattr(owner,name,function)
+        originals.clear()
+        snapshot = instrument_stats()
+        if dump_path != None:
+            dump_stats()
+        stats = None
+        dump_path = None
+        return snapshot
+    if stats == None:
+        stats = {}
+        for owner,names in INSTRUMENTED:
+            prefix = owner.__name__+"." if isinstance(owner,type) else ""
+            for name in names:
+                function = getattr(owner,name)
+                originals[(owner,name)] = function
+                setattr(owner,name,timed(prefix+name,function))
+    dump_path = path
+    dump_interval = interval
+    next_dump = time.perf_counter()+interval
+    if path != None and not dump_registered:
+        atexit.register(dump_stats)
+        dump_registered = True
+    return instrument_stats()
+
+def instrument_stats(reset=False):
+    ## Snapshot of the counters, {} while off
+    ## {name: {calls, seconds, max_seconds, mean_seconds, rooms, edges}}
+    if stats == None:
+        return {}
+    snapshot = {}
+    for name,(calls,seconds,longest,rooms,edges) in sorted(stats.items()):
+        snapshot[name] = {"calls":calls,"seconds":seconds,"max_seconds":longest,
+                          "mean_seconds":seconds/calls if calls else 0.0,"rooms":rooms,"edges":edges}
+    if reset:
+        stats.clear()
+    return snapshot
+
+def dump_stats(path=None):
+    ## Append one JSON line with the time, process id and a snapshot
+    ## Simulation workers inherit the environment, so their lines share the file
+    path = path if path != None else dump_path
+    if path == None or stats == None:
+        return
+    line = json.dumps({"time":time.time(),"pid":os.getpid(),"stats":instrument_stats()})
+    with open(path,"a") as f:
+        f.write(line+"\n")
+
+def instrument_from_environment(environ=os.environ):
+    ## Turn the counters on if the environment asks for them, see INSTRUMENT_ENV
+    ## Only explicit on or off values are accepted, so a path left there from
+    ## before WUMPUS_INSTRUMENT_FILE is not taken for one
+    setting = environ.get(INSTRUMENT_ENV,"").strip().lower()
+    if setting in INSTRUMENT_OFF:
+        return False
+    if setting not in INSTRUMENT_ON:
+        raise ValueError("{0} must be one of {1}, not {2!r}, put a dump file in {3}".format(
+            INSTRUMENT_ENV,", ".join(INSTRUMENT_ON+INSTRUMENT_OFF[1:]),environ[INSTRUMENT_ENV],INSTRUMENT_FILE_ENV))
+    instrument(True,environ.get(INSTRUMENT_FILE_ENV) or None,
+               float(environ.get(INSTRUMENT_INTERVAL_ENV,INSTRUMENT_INTERVAL)))
+    return True
+
+instrument_from_environment()
+
 if __name__ == "__main__":
     while True:
         cave = CaveSystem()
@@ -742,67 +2992,12 @@ if __name__ == "__main__":
         cave.add_tunnel(18,19)
         cave.add_tunnel(19,20)
         cave.add_tunnel(16,20)
-        cave_ok = False
-        attempt = 0
-        print("Attempting to Generate Cave Contents...")
-        while not cave_ok:
-            attempt += 1
-            print("Attempt:",attempt)
-            cave.add_contents(EXIT,random.randint(1,20))
-            room_ok = False
-            while not room_ok:
-                test_room = random.randint(1,20)
-                if cave.rooms[test_room][ROOM_CONTENTS] == []:
-                    link_ok = True
-                    for link in cave.rooms[test_room][ROOM_LINKS]:
-                        if cave.rooms[link][ROOM_CONTENTS] != []:
-                            link_ok = False
-                    if link_ok:
-                        room_ok = True
-                        cave.add_contents(WUMPUS,test_room)
-            room_ok = False
-            while not room_ok:
-                test_room = random.randint(1,20)
-                if cave.rooms[test_room][ROOM_CONTENTS] == []:
-                    link_ok = True
-                    for link in cave.rooms[test_room][ROOM_LINKS]:
-                        if cave.rooms[link][ROOM_CONTENTS] != []:
-                            link_ok = False
-                    if link_ok:
-                        room_ok = True
-                        cave.add_contents(GOLD,test_room)
-            rooms_left = list(range(1,21))
-            counter = 0
-            while rooms_left != [] and counter < 4:
-                test_room = random.choice(rooms_left)
-                rooms_left.remove(test_room)
-                if cave.rooms[test_room][ROOM_CONTENTS] == []:
-                    link_ok = True
-                    for link in cave.rooms[test_room][ROOM_LINKS]:
-                        if cave.rooms[link][ROOM_CONTENTS] != []:
-                            link_ok = False
-                    if link_ok:
-                        cave.add_contents(PIT,test_room)
-                        counter += 1
-            rooms_left = list(range(1,21))
-            counter = 0
-            while rooms_left != [] and counter < 2:
-                test_room = random.choice(rooms_left)
-                rooms_left.remove(test_room)
-                if cave.rooms[test_room][ROOM_CONTENTS] == []:
-                    link_ok = True
-                    for link in cave.rooms[test_room][ROOM_LINKS]:
-                        if cave.rooms[link][ROOM_CONTENTS] != []:
-                            link_ok = False
-                    if link_ok:
-                        cave.add_contents(BATS,test_room)
-                        counter += 1
-
-            cave_ok = cave.validate(0)
-        print("Attempt Successful")
+        print("Generating Cave Contents...")
+        CaveGenerator(cave).generate(cave)
         cave.save("cave_1")
         #cave.display() # Only if debug
         #cave.render() # Only if debug
+        #cave.renderer().clear_frames() # Only if debug
         #validation = cave.validate(3) # Only if debug
         validation = cave.validate(2) # Only if not debug
         run_game = False
@@ -814,12 +3009,13 @@ if __name__ == "__main__":
         if run_game:
             player = Player(cave.find_exit(),cave)
             step_number = 0
-            #cave.render(cave.name+"_"+str(step_number)+".gv",True,player.location) # Only if debug
+            #cave.renderer().capture(player.location) # Only if debug
             step_number += 1
             player.display_info()
             while player.status == "alive":
                 player.choose_action()
-                #cave.render(cave.name+"_"+str(step_number)+".gv",True,player.location) # Only if debug
+                #cave.renderer().capture(player.location) # Only if debug
                 step_number += 1
                 player.display_info()
+            #cave.renderer().export(cave.name+"_steps.gv") # Only if debug, every step in one file
         input("Press enter to start again, Ctrl-C to quit")
@@ -1,4 +1,30 @@
 from os.path import dirname, basename, isfile
 import glob
+import importlib
+import threading
 modules = glob.glob(dirname(__file__)+"/*.py")
 __all__ = [ basename(f)[:-3] for f in modules if isfile(f)]
+
+class GameInfo(): # What the menu needs to know about a game, found without importing it
+    def __init__(self, module):
+        self.module = module # Module name inside the package, e.g. Hunt_the_Wumpus
+        self.path = __name__ + "." + module # Full import path
+        self.name = module.replace("_"," ") # Display name
+
+games = [GameInfo(module) for module in sorted(__all__) if module != "__init__"]
+loaded = {} # Import path -> imported module, so each game is only imported once
+loading = threading.Lock()
+
+def get_game(name): # Finds a game by module or display name
+    for game in games:
+        if name == game.module or name == game.name:
+            return game
+    raise KeyError(name)
+
+def load_game(game): # Imports a game the first time it is needed, takes a GameInfo or a name
+    if not isinstance(game, GameInfo):
+        game = get_game(game)
+    with loading:
+        if game.path not in loaded:
+            loaded[game.path] = importlib.import_module(game.path)
+    return loaded[game.path]
@@ -1,12 +1,8 @@
 import sys
 import os
-import importlib
 
 import Games
-games = []
-for module in Games.__all__:
-    if module != "__init__":
-        games.append(importlib.import_module("Games."+module,"Games"))
+games = Games.games # Names only, each game is imported by Games.load_game when it is chosen
 
 section_break = "######################################"
 line_break = "______________________________________"
@@ -48,7 +44,7 @@ class Main(): # Main class, runs the menu and game loops, run automatically when
                     print(section_break)
                     print("Select Game")
                     for i in range(0,len(games)):
-                        print(str(i+1) + ": " + games[i].__name__.split(".")[1].replace("_"," "))
+                        print(str(i+1) + ": " + games[i].name)
                     print("0: Back")
                     print(line_break)
                     valid_input_2 = False
@@ -71,9 +67,10 @@ class Main(): # Main class, runs the menu and game loops, run automatically when
                             
     def play_game(self, game): # Runs a specified game
         if game in range(1,len(games)+1):
-            games[game-1].Main()
+            Games.load_game(games[game-1]).Main()
             
     def debug(self):
         pass
 
-Main() # Runs the main program debug loop
+if __name__ == "__main__":
+    Main() # Runs the main program debug loop
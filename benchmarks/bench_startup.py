@@ -0,0 +1,69 @@
+# Launcher start up time against the number of installed games
+#   python benchmarks/bench_startup.py [--games 2 8 32 128] [--repeat 5]
+# Builds throw away copies of the Games package padded out with copies of Hunt_the_Wumpus,
+# then times a fresh interpreter listing the menu (lazy) and importing every game (the old eager start up)
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GAMES = os.path.join(ROOT,"Games")
+
+LAZY = "import Games; names = [game.name for game in Games.games]"
+EAGER = "import Games; modules = [Games.load_game(game) for game in Games.games]"
+
+def build_package(folder,count):
+    ## A Games package with count game modules, the real ones first
+    package = os.path.join(folder,"Games")
+    os.mkdir(package)
+    shutil.copy(os.path.join(GAMES,"__init__.py"),package)
+    real = sorted(name for name in os.listdir(GAMES) if name.endswith(".py") and name != "__init__.py")
+    for number in range(count):
+        if number < len(real):
+            shutil.copy(os.path.join(GAMES,real[number]),package)
+        else:
+            shutil.copy(os.path.join(GAMES,"Hunt_the_Wumpus.py"),os.path.join(package,"Game_{0}.py".format(number)))
+    return folder
+
+def time_start(folder,code,repeat):
+    ## Best of repeat runs, each a new interpreter so nothing is already imported
+    ## One untimed run first so every run reads the same compiled .pyc files
+    command = [sys.executable,"-c",code]
+    subprocess.run(command,cwd=folder,check=True)
+    best = None
+    for attempt in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command,cwd=folder,check=True)
+        seconds = time.perf_counter()-start
+        if best == None or seconds < best:
+            best = seconds
+    return best
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Launcher start up time against the number of games")
+    parser.add_argument("--games",type=int,nargs="+",default=[2,8,32,128],help="package sizes to try")
+    parser.add_argument("--repeat",type=int,default=5,help="runs per measurement, the fastest is kept")
+    args = parser.parse_args(argv)
+    baseline = time_start(ROOT,"pass",args.repeat)
+    results = []
+    for count in args.games:
+        folder = tempfile.mkdtemp()
+        try:
+            build_package(folder,count)
+            lazy = time_start(folder,LAZY,args.repeat)
+            eager = time_start(folder,EAGER,args.repeat)
+        finally:
+            shutil.rmtree(folder)
+        result = {"games":count,"lazy_ms":(lazy-baseline)*1000,"eager_ms":(eager-baseline)*1000}
+        results.append(result)
+        print(json.dumps(result),flush=True)
+    print(json.dumps({"interpreter_ms":baseline*1000,"results":results}),file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,274 @@
+# Benchmarks for the cave graph code in Hunt_the_Wumpus, from the 20 room dodecahedron to 10^6 rooms
+#   python benchmarks/bench_wumpus.py [--max-rooms 1000000] [--output results.json] [--compare old.json]
+# Records the best wall time and tracemalloc peak of each operation on each topology and size,
+# fits how time grows with rooms, and with --compare flags operations that got slower or scale worse
+import os
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import gc
+import argparse
+import platform
+import tempfile
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,ROOT)
+from Games import Hunt_the_Wumpus as wumpus
+
+SIZES = [20,100,1000,10000,100000,1000000]
+DODECAHEDRON = [(1,2),(1,5),(1,6),(2,8),(2,3),(3,10),(3,4),(4,12),(4,5),(5,14),(6,7),(7,8),(8,9),(9,10),(10,11),
+                (11,12),(12,13),(13,14),(14,15),(15,6),(7,17),(9,18),(11,19),(13,20),(15,16),(16,17),(17,18),
+                (18,19),(19,20),(16,20)]
+
+def two_way(links,a,b):
+    links[a].append(b)
+    links[b].append(a)
+
+def dodecahedron(n,rng):
+    if n != 20:
+        return None
+    links = {i:[] for i in range(1,21)}
+    for a,b in DODECAHEDRON:
+        two_way(links,a,b)
+    return links
+
+def ring(n,rng):
+    ## Two-way ring, the longest walks for its size
+    links = {i:[] for i in range(n)}
+    for i in range(n):
+        two_way(links,i,(i+1)%n)
+    return links
+
+def grid(n,rng):
+    ## Two-way square grid
+    side = max(2,int(math.sqrt(n)))
+    links = {i:[] for i in range(side*side)}
+    for i in range(side*side):
+        if i%side != side-1:
+            two_way(links,i,i+1)
+        if i+side < side*side:
+            two_way(links,i,i+side)
+    return links
+
+def random_one_way(n,rng):
+    ## One-way ring so every room reaches every other, plus 2 random one-way tunnels a room
+    links = {i:[(i+1)%n] for i in range(n)}
+    for i in range(n):
+        for j in rng.sample(range(n),2):
+            if j != i and j not in links[i]:
+                links[i].append(j)
+    return links
+
+def layered(n,rng):
+    ## Two-way rings of 10 rooms joined one way in a chain, so many partitions
+    links = {i:[] for i in range(n)}
+    for i in range(n):
+        block = i-i%10
+        size = min(10,n-block)
+        if size > 1:
+            j = block+(i-block+1)%size
+            if i not in links[j]:
+                two_way(links,i,j)
+        if i%10 == 9 and i+1 < n:
+            links[i].append(i+1)
+    return links
+
+TOPOLOGIES = {"dodecahedron":dodecahedron,"ring":ring,"grid":grid,"random":random_one_way,"layered":layered}
+
+def build_cave(links,name):
+    ## Straight into the rooms dict, add_tunnel would spend the time checking for duplicates
+    cave = wumpus.CaveSystem(name)
+    cave.rooms = {room_id:[[],room_links] for room_id,room_links in links.items()}
+    cave.touch(True)
+    return cave
+
+def old_format(cave):
+    ## Rooms in the [contents, links, reversed, visited] form transpose() and connected() use
+    return {room_id:[room_data[0],room_data[1],[],False] for room_id,room_data in cave.rooms.items()}
+
+def measure(run,setup=None,repeat=5,min_seconds=0.2,memory=True):
+    ## Best time of up to repeat runs, stopping early once min_seconds have been spent,
+    ## then one more run under tracemalloc for the peak memory
+    ## The garbage collector is off while timing, as in timeit, so its pauses do not land on one size
+    best = None
+    spent = 0
+    runs = 0
+    while runs < repeat and (runs == 0 or spent < min_seconds):
+        value = setup() if setup != None else None
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            run(value)
+            seconds = time.perf_counter()-start
+        finally:
+            gc.enable()
+        spent += seconds
+        runs += 1
+        if best == None or seconds < best:
+            best = seconds
+    peak = None
+    if memory:
+        value = setup() if setup != None else None
+        tracemalloc.start()
+        run(value)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return best,peak,runs
+
+def operations(cave,folder,n):
+    ## (name, run, setup) for each operation, run in this order on one cave
+    text_path = os.path.join(folder,"cave.txt")
+    binary_path = os.path.join(folder,"cave"+wumpus.MAP_EXTENSION)
+    graph = wumpus.create_graph(cave.rooms)
+    topology = wumpus.rooms_topology(cave.rooms)
+    first = next(iter(cave.rooms))
+    def generated():
+        ## The same tunnels with nothing in them and nothing cached
+        return build_cave({room_id:room_data[1] for room_id,room_data in cave.rooms.items()},cave.name)
+    def loaded():
+        ## A cave straight from its map file, with nothing cached
+        fresh = wumpus.CaveSystem()
+        fresh.load(text_path)
+        return fresh
+    ops = [
+        ("create_graph",lambda value: wumpus.create_graph(cave.rooms),None),
+        ("transpose",lambda rooms: wumpus.transpose(rooms),lambda: old_format(cave)),
+        ("connected",lambda rooms: wumpus.connected(rooms,first),lambda: old_format(cave)),
+        ("scc",lambda value: wumpus.scc(graph),None),
+        ("topology",lambda value: wumpus.rooms_topology(cave.rooms),None),
+        ("components",lambda value: wumpus.strong_components(topology.offsets,topology.targets),None),
+        ("predecessors",lambda fresh: fresh.predecessors(),lambda: wumpus.rooms_topology(cave.rooms)),
+        ("condensation",lambda value: wumpus.Condensation(topology),None),
+        ("freeze",lambda fresh: fresh.freeze(),generated),
+        ("generate",lambda fresh: wumpus.CaveGenerator(fresh,seed=1).generate(fresh),generated),
+        ("save_text",lambda value: cave.save(text_path),None),
+        ("save_binary",lambda value: cave.save(binary_path),None),
+        ("load_text",lambda fresh: fresh.load(text_path),lambda: wumpus.CaveSystem()),
+        ("load_binary",lambda fresh: fresh.load(binary_path),lambda: wumpus.CaveSystem()),
+        ("validate",lambda fresh: list(fresh.validate(2)),loaded),
+        ("df_walk",lambda fresh: fresh.df_walk(fresh.find_exit(),wumpus.GOLD),loaded),
+        ]
+    return ops
+
+def fit_exponent(points):
+    ## Least squares slope of log(seconds) against log(rooms), i.e. time ~ rooms^slope
+    ## Sizes under 1000 rooms are mostly fixed costs, so they are left out if there is enough else
+    large = [(n,s) for n,s in points if n >= 1000 and s > 0]
+    if len(large) < 2:
+        large = [(n,s) for n,s in points if s > 0]
+    if len(large) < 2:
+        return None
+    xs = [math.log(n) for n,s in large]
+    ys = [math.log(s) for n,s in large]
+    mean_x = sum(xs)/len(xs)
+    mean_y = sum(ys)/len(ys)
+    spread = sum((x-mean_x)**2 for x in xs)
+    if spread == 0:
+        return None
+    return sum((x-mean_x)*(y-mean_y) for x,y in zip(xs,ys))/spread
+
+def run_benchmarks(args):
+    results = []
+    folder = tempfile.mkdtemp()
+    try:
+        for name in args.topologies:
+            for size in args.sizes:
+                if size > args.max_rooms:
+                    continue
+                links = TOPOLOGIES[name](size,random.Random(args.seed))
+                if links == None:
+                    continue
+                cave = build_cave(links,name)
+                wumpus.CaveGenerator(cave,seed=args.seed).generate(cave)
+                n = len(cave.rooms)
+                tunnels = sum(len(room_data[1]) for room_data in cave.rooms.values())
+                for operation,run,setup in operations(cave,folder,n):
+                    if args.operations and operation not in args.operations:
+                        continue
+                    seconds,peak,runs = measure(run,setup,args.repeat,args.min_seconds,not args.no_memory)
+                    result = {"topology":name,"rooms":n,"tunnels":tunnels,"operation":operation,
+                              "seconds":seconds,"peak_bytes":peak,"runs":runs}
+                    results.append(result)
+                    print("{0:<13}{1:>9}{2:>14}{3:>12.6f}s{4:>14}".format(name,n,operation,seconds,
+                          "-" if peak == None else "{0:.1f}MB".format(peak/1e6)),file=sys.stderr,flush=True)
+    finally:
+        shutil.rmtree(folder)
+    return results
+
+def scaling(results):
+    ## Fitted exponent for each topology and operation
+    points = {}
+    for result in results:
+        points.setdefault((result["topology"],result["operation"]),[]).append((result["rooms"],result["seconds"]))
+    output = []
+    for (topology,operation),values in sorted(points.items()):
+        exponent = fit_exponent(values)
+        if exponent != None:
+            output.append({"topology":topology,"operation":operation,"exponent":exponent,"sizes":len(values)})
+    return output
+
+def compare(old,new,slower=1.5,exponent_rise=0.3):
+    ## Operations at least slower times slower than before, or whose exponent rose by exponent_rise
+    ## Timings under a millisecond are too noisy to compare
+    regressions = []
+    before = {(r["topology"],r["rooms"],r["operation"]):r for r in old["results"]}
+    for result in new["results"]:
+        key = (result["topology"],result["rooms"],result["operation"])
+        if key in before and before[key]["seconds"] >= 0.001:
+            ratio = result["seconds"]/before[key]["seconds"]
+            if ratio >= slower:
+                regressions.append({"topology":key[0],"rooms":key[1],"operation":key[2],"ratio":ratio})
+    before = {(s["topology"],s["operation"]):s["exponent"] for s in old["scaling"]}
+    for fit in new["scaling"]:
+        key = (fit["topology"],fit["operation"])
+        if key in before and fit["exponent"]-before[key] >= exponent_rise:
+            regressions.append({"topology":key[0],"operation":key[1],"exponent_before":before[key],"exponent":fit["exponent"]})
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks for Hunt the Wumpus cave graphs and map files")
+    parser.add_argument("--sizes",type=int,nargs="+",default=SIZES,help="room counts to try")
+    parser.add_argument("--max-rooms",type=int,default=max(SIZES),help="skip sizes above this")
+    parser.add_argument("--topologies",nargs="+",choices=sorted(TOPOLOGIES),default=sorted(TOPOLOGIES))
+    parser.add_argument("--operations",nargs="+",default=None,help="only these operations")
+    parser.add_argument("--repeat",type=int,default=5,help="most timed runs per measurement, the best is kept")
+    parser.add_argument("--min-seconds",type=float,default=0.2,help="stop repeating once this much time is spent")
+    parser.add_argument("--no-memory",action="store_true",help="skip the tracemalloc run")
+    parser.add_argument("--seed",type=int,default=0,help="seed for the random topologies and contents")
+    parser.add_argument("--output",default=None,help="JSON file to write the results to")
+    parser.add_argument("--compare",default=None,help="earlier results to check for regressions")
+    parser.add_argument("--slower",type=float,default=1.5,help="time ratio counted as a regression")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args)
+    report = {
+        "python":platform.python_version(),
+        "platform":platform.platform(),
+        "created":time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "seed":args.seed,
+        "results":results,
+        "scaling":scaling(results),
+        }
+    for fit in report["scaling"]:
+        print("{0:<13}{1:<14} time ~ rooms^{2:.2f}".format(fit["topology"],fit["operation"],fit["exponent"]),file=sys.stderr)
+    if args.output != None:
+        with open(args.output,"w") as f:
+            json.dump(report,f,indent=1)
+    else:
+        print(json.dumps(report))
+    if args.compare != None:
+        with open(args.compare) as f:
+            old = json.load(f)
+        regressions = compare(old,report,args.slower)
+        for regression in regressions:
+            print("REGRESSION "+json.dumps(regression),file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
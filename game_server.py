@@ -0,0 +1,519 @@
+# Line based TCP server hosting Hangman and Hunt the Wumpus games, one coroutine per connection
+#   python game_server.py serve [--port 7777] [--max-sessions 10000] [--idle-timeout 300]
+#   python game_server.py load [--sessions 2000] [--concurrency 200] [--game hangman|wumpus|mixed]
+# Every reply ends with a line holding only ">", and a finished game sends "END <outcome>"
+# In the lobby send "hangman [lives]", "wumpus [map]", "resume <token>" or "quit"
+# During a game "pause" parks it as a snapshot and replies "PAUSED <token>"
+# With --log-dir every game is logged and "python game_server.py replay <logs>" checks them
+import os
+import re
+import sys
+import secrets
+import json
+import time
+import random
+import struct
+import asyncio
+import argparse
+
+from Games import Hangman
+from Games import Hunt_the_Wumpus
+
+PROMPT = ">"
+DEFAULT_MAP = "cave_1"
+HANGMAN_LIVES = 5
+GUESS_ORDER = "etaoinshrdlucmfwypvbgkjqxz"
+
+def map_file(name):
+    ## The file load() would read for a map name, .txt first and then .wmap
+    path = Hunt_the_Wumpus.map_path(name)
+    if not os.path.isfile(path) and os.path.isfile(Hunt_the_Wumpus.map_path(name,Hunt_the_Wumpus.MAP_EXTENSION)):
+        path = Hunt_the_Wumpus.map_path(name,Hunt_the_Wumpus.MAP_EXTENSION)
+    return path
+
+def map_rooms(path):
+    ## Rooms in a map file without loading it, from a binary map's header or a
+    ## count of the text lines that are not blank
+    if path.endswith(Hunt_the_Wumpus.MAP_EXTENSION):
+        with open(path,"rb") as f:
+            header = f.read(Hunt_the_Wumpus.MAP_HEADER.size)
+        if len(header) < Hunt_the_Wumpus.MAP_HEADER.size:
+            raise ValueError("Map is not a binary cave map")
+        return Hunt_the_Wumpus.MAP_HEADER.unpack(header)[3]
+    with open(path,"rb") as f:
+        return sum(1 for line in f if line.strip())
+
+class ServerLimits():
+    ## Bounds that keep one session from holding the loop or memory
+    def __init__(self,max_sessions=10000,idle_timeout=300.0,max_line=256,max_turns=1000,max_rooms=10000,write_buffer=65536,max_parked=100000):
+        self.max_sessions = max_sessions # Connections beyond this are turned away
+        self.idle_timeout = idle_timeout # Seconds to wait for a line before closing
+        self.max_line = max_line # Longest line accepted, longer lines close the session
+        self.max_turns = max_turns # Turns a single Wumpus game may last
+        self.max_rooms = max_rooms # Largest map a session may copy
+        self.write_buffer = write_buffer # Bytes queued for a client before its session waits
+        self.max_parked = max_parked # Paused games kept waiting to be resumed
+
+class GameServer():
+    def __init__(self,limits=None,log_folder=None):
+        self.limits = limits if limits != None else ServerLimits()
+        self.log_folder = log_folder # Where each game's action log is written, or None
+        self.sessions = 0
+        self.started = 0
+        self.caves = {} # Map name -> loaded cave, copied for each game
+        self.loading = {} # Map name -> future of a load running in a worker thread
+        self.rejected = {} # Map name -> (file identity, reason) for maps that failed to load
+        self.parked = {} # Token -> (game, snapshot bytes, log path) for paused games
+        self.server = None
+
+    async def start(self,host="127.0.0.1",port=7777):
+        ## Load the shared data now so the first players do not wait for it
+        Hangman.get_dictionary().load()
+        await self.base_cave(DEFAULT_MAP)
+        ## A deep accept queue, so a burst of connections waits instead of being dropped
+        backlog = min(self.limits.max_sessions,4096)
+        self.server = await asyncio.start_server(self.handle,host,port,limit=self.limits.max_line,backlog=backlog)
+        return self.server
+
+    def port(self):
+        return self.server.sockets[0].getsockname()[1]
+
+    async def base_cave(self,name):
+        ## Maps are loaded once, in a worker thread so the loop keeps serving, with
+        ## percepts and bat pools built, then shared
+        ## Sessions asking for a map being loaded wait for the same load, and a map
+        ## that failed is not loaded again until its file changes
+        ## Raises OSError for a missing map and ValueError for one that cannot be played
+        if name in self.caves:
+            return self.caves[name]
+        path = map_file(name)
+        identity = os.stat(path)
+        identity = (identity.st_size,identity.st_mtime_ns)
+        if name in self.rejected and self.rejected[name][0] == identity:
+            raise ValueError(self.rejected[name][1])
+        if name not in self.loading:
+            self.loading[name] = asyncio.get_running_loop().run_in_executor(None,self.load_cave,name,path)
+        loading = self.loading[name]
+        try:
+            ## Shielded, so a session closing while it waits does not cancel the load
+            cave = await asyncio.shield(loading)
+        except ValueError as error:
+            self.rejected[name] = (identity,str(error))
+            raise
+        finally:
+            if self.loading.get(name) is loading:
+                del self.loading[name]
+        self.caves[name] = cave
+        return cave
+
+    def load_cave(self,name,path):
+        ## Runs in a worker thread, the room count is checked before the whole map is read
+        if map_rooms(path) > self.limits.max_rooms:
+            raise ValueError("Map {0} is too large".format(name))
+        cave = Hunt_the_Wumpus.CaveSystem()
+        cave.load(path)
+        if len(cave.rooms) > self.limits.max_rooms:
+            raise ValueError("Map {0} is too large".format(name))
+        if cave.find_exit() == None:
+            raise ValueError("Map {0} has no exit".format(name))
+        cave.percepts(cave.find_exit())
+        cave.landing_pools()
+        return cave
+
+    async def send(self,writer,lines):
+        ## Waits while the client is not reading, so a slow client only slows itself
+        writer.write(("\n".join(lines)+"\n"+PROMPT+"\n").encode())
+        await writer.drain()
+
+    async def read(self,reader):
+        ## Next line from the client, or None if it went quiet, left or sent too much
+        try:
+            line = await asyncio.wait_for(reader.readline(),self.limits.idle_timeout)
+        except (asyncio.TimeoutError,ValueError,ConnectionError):
+            return None
+        if line == b"":
+            return None
+        return line.decode(errors="replace").strip().lower()
+
+    async def handle(self,reader,writer):
+        writer.transport.set_write_buffer_limits(high=self.limits.write_buffer)
+        if self.sessions >= self.limits.max_sessions:
+            writer.write(b"BUSY\n")
+            writer.close()
+            return
+        self.sessions += 1
+        self.started += 1
+        try:
+            await self.lobby(reader,writer)
+        except ConnectionError:
+            pass
+        finally:
+            self.sessions -= 1
+            writer.close()
+
+    async def lobby(self,reader,writer):
+        await self.send(writer,["Welcome, type 'hangman [lives]', 'wumpus [map]', 'resume <token>' or 'quit'"])
+        while True:
+            line = await self.read(reader)
+            if line == None or line == "quit":
+                return
+            words = line.split()
+            if words and words[0] == "hangman":
+                lives = HANGMAN_LIVES
+                if len(words) > 1 and words[1].isdigit():
+                    lives = min(max(int(words[1]),1),len(Hangman.HANGMAN)-1)
+                seed = secrets.randbits(64)
+                state = Hangman.seeded_round(seed,lives)
+                log = self.open_log("hangman")
+                if log != None:
+                    log = Hangman.RoundLog(log,seed,lives)
+                if not await self.play_hangman(reader,writer,state,log):
+                    return
+            elif words and words[0] == "wumpus":
+                name = words[1] if len(words) > 1 else DEFAULT_MAP
+                if not re.match(r"^\w+$",name):
+                    await self.send(writer,["Unknown map"])
+                    continue
+                try:
+                    cave = await self.base_cave(name)
+                except OSError:
+                    ## Never the error itself, it holds the server's file path
+                    await self.send(writer,["Unknown map"])
+                    continue
+                except ValueError as error:
+                    await self.send(writer,[str(error)])
+                    continue
+                seed = secrets.randbits(64)
+                state = Hunt_the_Wumpus.GameState(cave.copy(),seed=seed)
+                log = self.open_log("wumpus")
+                if log != None:
+                    try:
+                        log = Hunt_the_Wumpus.ActionLog(log,state,seed)
+                    except (ValueError,struct.error) as error:
+                        log.close()
+                        await self.send(writer,[str(error)])
+                        continue
+                if not await self.play_wumpus(reader,writer,cave,state,log):
+                    return
+            elif len(words) == 2 and words[0] == "resume" and words[1] in self.parked:
+                ## A paused game carries on appending to the log it started
+                game,data,path = self.parked.pop(words[1])
+                try:
+                    if game == "hangman":
+                        state = Hangman.decode_round(data)
+                    else:
+                        cave = await self.base_cave(Hunt_the_Wumpus.snapshot_map(data))
+                        state = Hunt_the_Wumpus.restore_game(data,cave)
+                    log = open(path,"ab") if path != None else None
+                except OSError:
+                    ## Never the error itself, it holds the server's file path
+                    await self.send(writer,["Unable to resume, the game's map or log is missing"])
+                    continue
+                except (ValueError,struct.error) as error:
+                    await self.send(writer,[str(error)])
+                    continue
+                except LookupError:
+                    await self.send(writer,["Unable to resume, the game's map or dictionary has changed"])
+                    continue
+                if game == "hangman":
+                    log = Hangman.RoundLog(log) if log != None else None
+                    playing = self.play_hangman(reader,writer,state,log)
+                else:
+                    log = Hunt_the_Wumpus.ActionLog(log) if log != None else None
+                    playing = self.play_wumpus(reader,writer,cave,state,log)
+                if not await playing:
+                    return
+            else:
+                await self.send(writer,["Invalid option"])
+
+    def open_log(self,game):
+        ## A new log file for a game, or None if games are not being logged
+        if self.log_folder == None:
+            return None
+        return open(os.path.join(self.log_folder,"{0}-{1}.log".format(game,secrets.token_hex(8))),"ab")
+
+    def park(self,game,data,path=None):
+        ## Keep a paused game's snapshot, the oldest is dropped once there are too many
+        if len(self.parked) >= self.limits.max_parked:
+            del self.parked[next(iter(self.parked))]
+        token = secrets.token_hex(8)
+        self.parked[token] = (game,data,path)
+        return token
+
+    async def play_hangman(self,reader,writer,state,log=None):
+        try:
+            return await self.hangman_turns(reader,writer,state,log)
+        finally:
+            if log != None:
+                log.file.close()
+
+    async def hangman_turns(self,reader,writer,state,log):
+        ## Returns False if the client left part way through
+        lines = []
+        while True:
+            lines.append("Word: "+" ".join(state.masked))
+            lines.append("Incorrect guesses: "+state.incorrect)
+            if state.has_won():
+                lines.append("Well done, you guessed it!")
+                lines.append("END won")
+            elif state.has_lost():
+                lines.append("Game over, you have run out of guesses!")
+                lines.append("The word was \'{0:s}\'".format(state.secret))
+                lines.append("END lost")
+            if state.has_won() or state.has_lost():
+                if log != None:
+                    log.finish(state)
+                await self.send(writer,lines)
+                return True
+            lines.append("Lives left: {0}".format(state.lives_left()))
+            await self.send(writer,lines)
+            lines = []
+            guess = await self.read(reader)
+            if guess == None:
+                return False
+            if guess == "quit":
+                if log != None:
+                    log.finish(state)
+                await self.send(writer,["END quit"])
+                return True
+            if guess == "pause":
+                path = log.file.name if log != None else None
+                await self.send(writer,["PAUSED "+self.park("hangman",Hangman.encode_round(state),path)])
+                return True
+            error = state.guess_error(guess)
+            if error != None:
+                lines.append(error)
+            elif log != None:
+                log.guess(state,guess)
+            else:
+                state.guess(guess)
+
+    async def play_wumpus(self,reader,writer,cave,state,log=None):
+        try:
+            return await self.wumpus_turns(reader,writer,cave,state,log)
+        finally:
+            if log != None:
+                log.f.close()
+
+    async def wumpus_turns(self,reader,writer,cave,state,log):
+        ## Each game plays on its own copy of the contents of cave, the tunnels are shared
+        step = log.step if log != None else Hunt_the_Wumpus.step
+        lines = list(Hunt_the_Wumpus.status_lines(state))
+        while True:
+            await self.send(writer,lines)
+            line = await self.read(reader)
+            if line == None:
+                return False
+            if line == "quit":
+                if log != None:
+                    log.finish(state)
+                await self.send(writer,["END quit"])
+                return True
+            if line == "pause":
+                path = log.f.name if log != None else None
+                await self.send(writer,["PAUSED "+self.park("wumpus",Hunt_the_Wumpus.snapshot_game(state,cave),path)])
+                return True
+            action = Hunt_the_Wumpus.parse_action(line)
+            if action == None:
+                lines = ["Invalid input"]
+                continue
+            events = step(state,action)[1]
+            lines = list(Hunt_the_Wumpus.describe(events))
+            if state.status != "alive" or state.turns >= self.limits.max_turns:
+                lines.append("END "+(state.status if state.status != "alive" else "timeout"))
+                if log != None:
+                    log.finish(state)
+                await self.send(writer,lines)
+                return True
+            lines.extend(Hunt_the_Wumpus.status_lines(state))
+
+async def read_reply(reader):
+    ## Lines up to the next prompt
+    lines = []
+    while True:
+        line = await reader.readline()
+        if line == b"":
+            raise ConnectionError("server closed the connection")
+        line = line.decode().rstrip("\n")
+        if line == PROMPT:
+            return lines
+        if line == "BUSY":
+            raise ConnectionError("server is full")
+        lines.append(line)
+
+def finished(lines):
+    for line in lines:
+        if line.startswith("END "):
+            return line[4:]
+    return None
+
+def next_command(game,lines,guessed,rng):
+    ## A plausible move from the last reply
+    if game == "hangman":
+        for letter in GUESS_ORDER:
+            if letter not in guessed:
+                guessed.add(letter)
+                return letter
+        return "quit"
+    rooms = []
+    for line in lines:
+        if line.startswith("You can move to"):
+            rooms = re.findall(r"\d+",line)
+        if line == "You see a glitter":
+            return "grab gold"
+    if not rooms:
+        return "quit"
+    if rng.random() < 0.1:
+        return "shoot "+rng.choice(rooms)
+    return "move "+rng.choice(rooms)
+
+async def play_session(host,port,game,rng,latencies,outcomes):
+    reader,writer = await asyncio.open_connection(host,port)
+    try:
+        await read_reply(reader)
+        writer.write((game+"\n").encode())
+        lines = await read_reply(reader)
+        guessed = set()
+        outcome = finished(lines)
+        while outcome == None:
+            command = next_command(game,lines,guessed,rng)
+            start = time.perf_counter()
+            writer.write((command+"\n").encode())
+            lines = await read_reply(reader)
+            latencies.append(time.perf_counter()-start)
+            outcome = finished(lines)
+        outcomes[outcome] = outcomes.get(outcome,0)+1
+        writer.write(b"quit\n")
+    finally:
+        writer.close()
+
+async def load_test(args):
+    server = None
+    host = args.host
+    port = args.port
+    if port == None:
+        ## No server given, so run one in this process and loop
+        server = GameServer(ServerLimits(max_sessions=args.concurrency*2),args.log_dir)
+        await server.start(host,0)
+        port = server.port()
+    rng = random.Random(args.seed)
+    latencies = []
+    outcomes = {}
+    errors = 0
+    remaining = list(range(args.sessions))
+
+    async def worker():
+        nonlocal errors
+        while remaining:
+            number = remaining.pop()
+            game = args.game
+            if game == "mixed":
+                game = "hangman" if number%2 == 0 else "wumpus"
+            try:
+                await play_session(host,port,game,rng,latencies,outcomes)
+            except (ConnectionError,OSError):
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for i in range(args.concurrency)])
+    seconds = time.perf_counter()-start
+    if server != None:
+        server.server.close()
+        await server.server.wait_closed()
+    latencies.sort()
+    def percentile(p):
+        if not latencies:
+            return 0
+        return latencies[min(len(latencies)-1,int(p*len(latencies)))]*1000
+    return {
+        "sessions":args.sessions,
+        "concurrency":args.concurrency,
+        "game":args.game,
+        "errors":errors,
+        "outcomes":outcomes,
+        "turns":len(latencies),
+        "seconds":seconds,
+        "sessions_per_second":args.sessions/seconds if seconds else 0,
+        "turns_per_second":len(latencies)/seconds if seconds else 0,
+        "p50_ms":percentile(0.50),
+        "p99_ms":percentile(0.99),
+        "max_ms":latencies[-1]*1000 if latencies else 0,
+        }
+
+def replay(args):
+    ## Play every log again and check each ends where it says, exit status 1 if any did not
+    caves = {}
+    logs = 0
+    actions = 0
+    failed = 0
+    start = time.perf_counter()
+    for folder_or_file in args.paths:
+        if os.path.isdir(folder_or_file):
+            paths = [os.path.join(folder_or_file,name) for name in sorted(os.listdir(folder_or_file)) if name.endswith(".log")]
+        else:
+            paths = [folder_or_file]
+        for path in paths:
+            with open(path,"rb") as f:
+                data = f.read()
+            try:
+                if data[:4] == Hunt_the_Wumpus.LOG_MAGIC:
+                    name = Hunt_the_Wumpus.log_map(data)
+                    if name not in caves:
+                        caves[name] = Hunt_the_Wumpus.CaveSystem()
+                        caves[name].load(Hunt_the_Wumpus.map_path(name))
+                    actions += Hunt_the_Wumpus.replay_log(data,caves[name])[2]
+                else:
+                    state = Hangman.replay_round(data)
+                    actions += bin(state.guessed).count("1")-1
+            except (ValueError,OSError,struct.error) as error:
+                failed += 1
+                print(json.dumps({"log":path,"error":str(error)}))
+            logs += 1
+    seconds = time.perf_counter()-start
+    print(json.dumps({"logs":logs,"failed":failed,"actions":actions,"seconds":seconds,
+                      "actions_per_second":actions/seconds if seconds else 0}),file=sys.stderr)
+    return 1 if failed else 0
+
+async def serve(args):
+    limits = ServerLimits(args.max_sessions,args.idle_timeout,args.max_line,args.max_turns,args.max_rooms)
+    server = GameServer(limits,args.log_dir)
+    await server.start(args.host,args.port)
+    print("Serving on {0}:{1}".format(args.host,server.port()),flush=True)
+    async with server.server:
+        await server.server.serve_forever()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Hangman and Hunt the Wumpus over TCP")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    command = commands.add_parser("serve",help="run the game server")
+    command.add_argument("--host",default="127.0.0.1")
+    command.add_argument("--port",type=int,default=7777)
+    command.add_argument("--max-sessions",type=int,default=10000,help="connections served at once")
+    command.add_argument("--idle-timeout",type=float,default=300.0,help="seconds before a quiet session is closed")
+    command.add_argument("--max-line",type=int,default=256,help="longest line a client may send")
+    command.add_argument("--max-turns",type=int,default=1000,help="turns a Wumpus game may last")
+    command.add_argument("--max-rooms",type=int,default=10000,help="largest map a session may play")
+    command.add_argument("--log-dir",default=None,help="folder to write an action log per game")
+    command.set_defaults(run=lambda args: asyncio.run(serve(args)))
+
+    command = commands.add_parser("load",help="play many scripted sessions and report throughput and latency")
+    command.add_argument("--host",default="127.0.0.1")
+    command.add_argument("--port",type=int,default=None,help="server to test (default: start one in this process)")
+    command.add_argument("--sessions",type=int,default=2000,help="games to play, one per connection")
+    command.add_argument("--concurrency",type=int,default=200,help="connections open at once")
+    command.add_argument("--game",choices=["hangman","wumpus","mixed"],default="mixed")
+    command.add_argument("--seed",type=int,default=0,help="seed for the scripted players")
+    command.add_argument("--log-dir",default=None,help="log every game when the server runs in this process")
+    command.set_defaults(run=lambda args: print(json.dumps(asyncio.run(load_test(args)))))
+
+    command = commands.add_parser("replay",help="replay game logs and check they end as logged")
+    command.add_argument("paths",nargs="+",help="log files or folders of .log files")
+    command.set_defaults(run=replay)
+
+    args = parser.parse_args(argv)
+    return args.run(args) or 0
+
+if __name__ == "__main__":
+    sys.exit(main())
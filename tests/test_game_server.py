@@ -0,0 +1,129 @@
+# Regression tests for the line based game server
+#   python -m unittest discover tests
+import os
+import sys
+import glob
+import shutil
+import random
+import asyncio
+import tempfile
+import unittest
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import game_server
+from game_server import GameServer,ServerLimits,read_reply,finished
+from Games import Hunt_the_Wumpus
+
+class GameServerTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.server = GameServer(ServerLimits(idle_timeout=10.0),self.folder)
+        await self.server.start(port=0)
+        self.clients = []
+
+    async def asyncTearDown(self):
+        ## Let every session see its client leave before the loop is closed
+        for writer in self.clients:
+            writer.close()
+        while self.server.sessions > 0:
+            await asyncio.sleep(0.01)
+        self.server.server.close()
+        await self.server.server.wait_closed()
+        shutil.rmtree(self.folder)
+
+    async def connect(self):
+        ## A client already past the welcome message
+        reader,writer = await asyncio.open_connection("127.0.0.1",self.server.port())
+        self.clients.append(writer)
+        welcome = await read_reply(reader)
+        self.assertTrue(welcome[0].startswith("Welcome"))
+        return reader,writer
+
+    async def send(self,reader,writer,line):
+        writer.write((line+"\n").encode())
+        return await read_reply(reader)
+
+    async def assertClosed(self,reader):
+        with self.assertRaises(ConnectionError):
+            await asyncio.wait_for(read_reply(reader),5)
+
+    async def test_lobby(self):
+        reader,writer = await self.connect()
+        self.assertEqual(await self.send(reader,writer,"chess"),["Invalid option"])
+        self.assertEqual(await self.send(reader,writer,""),["Invalid option"])
+        writer.write(b"quit\n")
+        await self.assertClosed(reader)
+
+    async def test_hangman(self):
+        reader,writer = await self.connect()
+        lines = await self.send(reader,writer,"hangman 3")
+        self.assertTrue(lines[0].startswith("Word: "))
+        self.assertIn("Lives left: 3",lines)
+        self.assertEqual(await self.send(reader,writer,"7"),["Please enter a single lowercase letter"]+lines)
+        guessed = set()
+        while finished(lines) == None:
+            lines = await self.send(reader,writer,game_server.next_command("hangman",lines,guessed,None))
+        self.assertIn(finished(lines),("won","lost"))
+        ## Back in the lobby afterwards
+        self.assertEqual(await self.send(reader,writer,"chess"),["Invalid option"])
+
+    async def test_wumpus(self):
+        reader,writer = await self.connect()
+        lines = await self.send(reader,writer,"wumpus")
+        self.assertIn("You are in room 4",lines)
+        self.assertIn("You can move to rooms 3, 12 & 5",lines)
+        self.assertEqual(await self.send(reader,writer,"dance"),["Invalid input"])
+        rng = random.Random(1)
+        while finished(lines) == None:
+            lines = await self.send(reader,writer,game_server.next_command("wumpus",lines,None,rng))
+        self.assertIn(finished(lines),("eaten","pit","escaped","jumped","timeout"))
+        lines = await self.send(reader,writer,"wumpus test_cave")
+        self.assertEqual(lines[0],"You are in room 1")
+
+    async def test_pause_resume(self):
+        reader,writer = await self.connect()
+        await self.send(reader,writer,"hangman")
+        lines = await self.send(reader,writer,"e")
+        reply = await self.send(reader,writer,"pause")
+        self.assertRegex(reply[0],r"^PAUSED [0-9a-f]+$")
+        token = reply[0].split()[1]
+        ## Resumed from another connection, where it was left
+        other_reader,other_writer = await self.connect()
+        self.assertEqual(await self.send(other_reader,other_writer,"resume "+token),lines[-3:])
+        self.assertEqual(await self.send(other_reader,other_writer,"quit"),["END quit"])
+        ## A token is only good once
+        self.assertEqual(await self.send(reader,writer,"resume "+token),["Invalid option"])
+
+        lines = await self.send(reader,writer,"wumpus")
+        token = (await self.send(reader,writer,"pause"))[0].split()[1]
+        self.assertEqual(await self.send(reader,writer,"resume "+token),lines)
+        self.assertEqual(await self.send(reader,writer,"quit"),["END quit"])
+        ## The resumed game appended to the log it started, which replays to the end
+        paths = glob.glob(os.path.join(self.folder,"wumpus-*.log"))
+        self.assertEqual(len(paths),1)
+        with open(paths[0],"rb") as f:
+            data = f.read()
+        cave = Hunt_the_Wumpus.CaveSystem()
+        cave.load(game_server.DEFAULT_MAP)
+        self.assertTrue(Hunt_the_Wumpus.replay_log(data,cave)[1])
+
+    async def test_invalid_token(self):
+        reader,writer = await self.connect()
+        self.assertEqual(await self.send(reader,writer,"resume 0123456789abcdef"),["Invalid option"])
+        self.assertEqual(await self.send(reader,writer,"resume"),["Invalid option"])
+
+    async def test_unknown_map(self):
+        reader,writer = await self.connect()
+        for name in ("no_such_map","../cave_1","cave_1.txt"):
+            self.assertEqual(await self.send(reader,writer,"wumpus "+name),["Unknown map"],name)
+
+    async def test_oversized_line(self):
+        reader,writer = await self.connect()
+        writer.write(b"x"*(self.server.limits.max_line*4)+b"\n")
+        await self.assertClosed(reader)
+        ## The server carries on for everyone else
+        reader,writer = await self.connect()
+        self.assertEqual(await self.send(reader,writer,"chess"),["Invalid option"])
+
+if __name__ == "__main__":
+    unittest.main()
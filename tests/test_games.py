@@ -0,0 +1,35 @@
+# Regression tests for the lazy game registry used by the launcher
+#   python -m unittest discover tests
+import os
+import sys
+import subprocess
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,ROOT)
+import Games
+
+class GameRegistryTests(unittest.TestCase):
+    def test_listing_imports_nothing(self):
+        ## Run in a new interpreter, as this one may already have imported games
+        script = ("import sys\n"
+                  "import Games\n"
+                  "names = [(game.module,game.name,game.path) for game in Games.games]\n"
+                  "assert ('Hangman','Hangman','Games.Hangman') in names, names\n"
+                  "print(sorted(name for name in sys.modules if name.startswith('Games.')))\n")
+        output = subprocess.run([sys.executable,"-c",script],cwd=ROOT,capture_output=True,text=True,check=True)
+        self.assertEqual(output.stdout.strip(),"[]")
+
+    def test_load_game_once(self):
+        first = Games.load_game("Hangman")
+        self.assertIs(Games.load_game("Hangman"),first)
+        self.assertIs(Games.load_game(Games.get_game("Hangman")),first)
+        self.assertIs(sys.modules["Games.Hangman"],first)
+        self.assertIs(Games.load_game("Hunt the Wumpus"),Games.load_game("Hunt_the_Wumpus"))
+
+    def test_unknown_game(self):
+        with self.assertRaises(KeyError):
+            Games.load_game("Chess")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,268 @@
+# Regression tests for Hangman dictionaries, round snapshots and logs
+#   python -m unittest discover tests
+import io
+import os
+import sys
+import random
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Games import Hangman
+
+class WordsTests(unittest.TestCase):
+    def test_words_alias(self):
+        words = Hangman.WORDS
+        self.assertEqual(words,list(Hangman.get_dictionary()))
+        self.assertIn("wombat",words)
+        self.assertIs(Hangman.WORDS,words)
+        with self.assertRaises(AttributeError):
+            Hangman.NO_SUCH_NAME
+
+class DictionaryTests(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        ## Lines the two modes could split or trim differently
+        self.path = os.path.join(self.folder,"awkward.txt")
+        with open(self.path,"wb") as f:
+            f.write(b"\n  Wombat \r\n\tgrey heron\t\r\n\r\n \nCAT\nkiwi\rkea\nox\nyak")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def both_modes(self,name):
+        text = Hangman.Dictionary(name,False)
+        mapped = Hangman.Dictionary(name,True)
+        text.load()
+        mapped.load()
+        self.assertIsNotNone(text.words)
+        self.assertIsNotNone(mapped.data)
+        return text,mapped
+
+    def check_same(self,text,mapped):
+        self.assertEqual(len(mapped),len(text))
+        self.assertEqual(list(mapped),list(text))
+        self.assertEqual({key:list(bucket) for key,bucket in mapped.buckets.items()},
+                         {key:list(bucket) for key,bucket in text.buckets.items()})
+
+    def test_modes_match(self):
+        self.check_same(*self.both_modes(Hangman.DEFAULT_DICTIONARY))
+        text,mapped = self.both_modes(self.path)
+        self.check_same(text,mapped)
+        self.assertEqual(list(text),["wombat","grey heron","cat","kiwi\rkea","ox","yak"])
+
+    def test_buckets(self):
+        text = Hangman.Dictionary(Hangman.DEFAULT_DICTIONARY)
+        text.load()
+        for key,bucket in text.buckets.items():
+            for number in bucket:
+                word = text.word(number)
+                difficulty = Hangman.word_difficulty(word)
+                self.assertIn(key,(len(word),difficulty,(len(word),difficulty)))
+        self.assertEqual(sum(len(bucket) for key,bucket in text.buckets.items() if isinstance(key,int)),len(text))
+
+    def test_random_word(self):
+        text,mapped = self.both_modes(Hangman.DEFAULT_DICTIONARY)
+        for seed in range(50):
+            word = text.random_word(None,None,random.Random(seed))
+            self.assertEqual(mapped.random_word(None,None,random.Random(seed)),word)
+            self.assertIn(word,list(text))
+        for length,difficulty in ((5,None),(None,"easy"),(6,"medium")):
+            rng = random.Random(length)
+            for trial in range(20):
+                word = text.random_word(length,difficulty,rng)
+                if length != None:
+                    self.assertEqual(len(word),length)
+                if difficulty != None:
+                    self.assertEqual(Hangman.word_difficulty(word),difficulty)
+        self.assertIsNone(text.random_word(99))
+        self.assertIsNone(mapped.random_word(99,"easy"))
+
+    def test_random_word_covers_bucket(self):
+        ## Every word of a small bucket turns up, so none is out of reach
+        text = Hangman.Dictionary(self.path)
+        rng = random.Random(1)
+        seen = {text.random_word(None,"easy",rng) for trial in range(200)}
+        self.assertEqual(seen,{word for word in text if Hangman.word_difficulty(word) == "easy"})
+
+    def test_prefix_range(self):
+        dictionary = Hangman.Dictionary(Hangman.DEFAULT_DICTIONARY)
+        words = dictionary.sorted_words()
+        self.assertEqual(dictionary.prefix_range(""),(0,len(words)))
+        ## No matches, before, between and after the words
+        for prefix in ("0","aaaaaaaaa","wombatz","zzzz","~"):
+            start,end = dictionary.prefix_range(prefix)
+            self.assertEqual(start,end,prefix)
+        ## The last words of the list
+        last = words[-1]
+        for size in range(1,len(last)+1):
+            start,end = dictionary.prefix_range(last[:size])
+            self.assertEqual(end,len(words))
+            self.assertEqual(words[start:end],[word for word in words if word.startswith(last[:size])])
+        ## Every prefix of every word, against a scan of the list
+        prefixes = {word[:size] for word in words for size in range(1,4)}
+        for prefix in prefixes:
+            start,end = dictionary.prefix_range(prefix)
+            self.assertEqual(words[start:end],[word for word in words if word.startswith(prefix)],prefix)
+
+    def test_empty(self):
+        path = os.path.join(self.folder,"empty.txt")
+        with open(path,"w") as f:
+            f.write(" \n\t\n")
+        for use_mmap in (False,True):
+            with self.assertRaises(ValueError):
+                Hangman.Dictionary(path,use_mmap).load()
+
+def brute_matches(words,pattern,excluded):
+    ## Words that fit the board, checking every word letter by letter
+    revealed = set(pattern)-{"_"}
+    output = []
+    for word in words:
+        if len(word) != len(pattern) or set(word) & set(excluded):
+            continue
+        if all(letter == shown if shown != "_" else letter not in revealed
+               for letter,shown in zip(word,pattern)):
+            output.append(word)
+    return sorted(output)
+
+def brute_letter_counts(words,pattern,excluded):
+    guessed = set(pattern+excluded)
+    output = {}
+    for word in brute_matches(words,pattern,excluded):
+        for letter in set(word)-guessed-{" "}:
+            output[letter] = output.get(letter,0)+1
+    return output
+
+class WordIndexTests(unittest.TestCase):
+    def setUp(self):
+        ## Dictionary words plus some with many repeated letters
+        self.words = list(Hangman.get_dictionary())+["banana","bookkeeper","mississippi",
+                                                     "grey heron","aaa","abab","baba"]
+        self.index = Hangman.WordIndex(self.words)
+
+    def check(self,pattern,excluded):
+        self.assertEqual(self.index.matches(pattern,excluded),brute_matches(self.words,pattern,excluded),
+                         (pattern,excluded))
+        self.assertEqual(self.index.letter_counts(pattern,excluded),
+                         brute_letter_counts(self.words,pattern,excluded),(pattern,excluded))
+
+    def test_boards_from_rounds(self):
+        ## Every board seen while guessing each word in a random order
+        rng = random.Random(4)
+        letters = list(Hangman.ALPHABET.strip())
+        for word in self.words:
+            rng.shuffle(letters)
+            guessed = ""
+            wrong = ""
+            for letter in letters[:rng.randrange(len(letters))]:
+                if letter in word:
+                    guessed += letter
+                else:
+                    wrong += letter
+                pattern = "".join(c if c in guessed or c == " " else "_" for c in word)
+                self.check(pattern,wrong)
+
+    def test_repeated_letters(self):
+        for pattern,excluded in (("_a_a_a",""),("_a_a_a","n"),("b_b_",""),("_b_b","a"),("aaa",""),
+                                 ("a_a",""),("_ss_ss_pp_","m"),("b__kk__p__","o"),("______","xyz")):
+            self.check(pattern,excluded)
+
+    def test_no_words(self):
+        self.check("_"*40,"")
+        self.check("zz_","")
+        self.check("___",Hangman.ALPHABET.strip())
+
+class RoundSnapshotTests(unittest.TestCase):
+    def check(self,state):
+        restored = Hangman.decode_round(Hangman.encode_round(state))
+        self.assertEqual(restored.snapshot(),state.snapshot())
+        return restored
+
+    def test_dictionary_words(self):
+        rng = random.Random(1)
+        for word in Hangman.get_dictionary().sorted_words():
+            state = Hangman.RoundState(word,rng.randrange(1,len(Hangman.HANGMAN)))
+            letters = list(Hangman.ALPHABET.strip())
+            rng.shuffle(letters)
+            self.check(state)
+            for letter in letters:
+                if state.has_won() or state.has_lost():
+                    break
+                state.guess(letter)
+                self.check(state)
+
+    def test_custom_word(self):
+        state = Hangman.RoundState("grey heron",5)
+        for letter in "qer":
+            state.guess(letter)
+        restored = self.check(state)
+        self.assertEqual(restored.masked_word(),"_re_ _er__")
+        ## The restored round carries on as the original does
+        for letter in "gyhonz":
+            self.assertEqual(restored.guess(letter),state.guess(letter))
+        self.assertEqual(restored.snapshot(),state.snapshot())
+        self.assertTrue(restored.has_won())
+
+    def test_long_dictionary_name(self):
+        state = Hangman.RoundState("cat",5)
+        with self.assertRaises(ValueError):
+            Hangman.encode_round(state,"x"*256)
+
+    def test_not_a_snapshot(self):
+        data = Hangman.encode_round(Hangman.RoundState("cat",5))
+        with self.assertRaises(ValueError):
+            Hangman.decode_round(b"XXXX"+data[4:])
+
+class RoundLogTests(unittest.TestCase):
+    def play(self,seed,letters,f=None):
+        ## A logged round from seed, guessing letters in order until it ends
+        f = f if f != None else io.BytesIO()
+        log = Hangman.RoundLog(f,seed,5)
+        state = Hangman.seeded_round(seed,5)
+        for letter in letters:
+            if state.has_won() or state.has_lost():
+                break
+            if state.guess_error(letter) == None:
+                log.guess(state,letter)
+        return state,log,f
+
+    def test_replay(self):
+        rng = random.Random(2)
+        for seed in range(50):
+            letters = list(Hangman.ALPHABET.strip())
+            rng.shuffle(letters)
+            state,log,f = self.play(seed,letters)
+            log.finish(state)
+            replayed = Hangman.replay_round(f.getvalue())
+            self.assertEqual(replayed.snapshot(),state.snapshot())
+
+    def test_unfinished_log(self):
+        state,log,f = self.play(3,"eat")
+        self.assertEqual(Hangman.replay_round(f.getvalue()).snapshot(),state.snapshot())
+
+    def test_resumed_log(self):
+        ## A paused round carries on appending to the same log
+        state,log,f = self.play(4,"eat")
+        state = Hangman.decode_round(Hangman.encode_round(state))
+        log = Hangman.RoundLog(f)
+        for letter in "oinsrhl":
+            if not (state.has_won() or state.has_lost()):
+                log.guess(state,letter)
+        log.finish(state)
+        self.assertEqual(Hangman.replay_round(f.getvalue()).snapshot(),state.snapshot())
+
+    def test_wrong_ending(self):
+        state,log,f = self.play(5,"etaoinshrdlu")
+        log.finish(state)
+        data = bytearray(f.getvalue())
+        data[-1] += 1
+        with self.assertRaises(ValueError):
+            Hangman.replay_round(bytes(data))
+
+    def test_long_dictionary_name(self):
+        with self.assertRaises(ValueError):
+            Hangman.RoundLog(io.BytesIO(),1,5,"x"*256)
+
+if __name__ == "__main__":
+    unittest.main()
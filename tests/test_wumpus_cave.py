@@ -0,0 +1,129 @@
+# Regression tests for the Hunt the Wumpus cave caches
+#   python -m unittest discover tests
+import os
+import sys
+import random
+import unittest
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Games import Hunt_the_Wumpus as wumpus
+
+ITEMS = [wumpus.PIT,wumpus.BATS,wumpus.WUMPUS,wumpus.GOLD,wumpus.EXIT,wumpus.ARROW,"Rope"]
+
+def brute_percepts(cave,room_id):
+    ## What a player in room_id notices, from the room and the rooms it links to
+    mask = 0
+    for item in cave.rooms[room_id][wumpus.ROOM_CONTENTS]:
+        mask |= wumpus.PERCEPT_HERE.get(item,0)
+    for link in cave.rooms[room_id][wumpus.ROOM_LINKS]:
+        for item in cave.rooms[link][wumpus.ROOM_CONTENTS]:
+            mask |= wumpus.PERCEPT_NEAR.get(item,0)
+    return mask
+
+class PerceptTests(unittest.TestCase):
+    def check(self,cave):
+        for room_id in cave.rooms:
+            self.assertEqual(cave.percepts(room_id),brute_percepts(cave,room_id),room_id)
+
+    def test_random_edits(self):
+        ## The masks are kept up to date by each edit rather than rebuilt, so after
+        ## every edit they must match a full recompute
+        rng = random.Random(2)
+        for trial in range(20):
+            cave = wumpus.CaveSystem()
+            cave.load("cave_1")
+            room_ids = list(cave.rooms)
+            self.check(cave)
+            for edit in range(60):
+                choice = rng.randrange(4)
+                if choice == 0:
+                    cave.add_contents(rng.choice(ITEMS),rng.choice(room_ids))
+                elif choice == 1:
+                    contents = cave.get_contents()
+                    if contents:
+                        item,room_id = rng.choice(contents)
+                        cave.remove_contents(item,room_id)
+                elif choice == 2:
+                    cave.add_tunnel(rng.choice(room_ids),rng.choice(room_ids),rng.random() < 0.5)
+                else:
+                    ## remove_tunnel() takes out both directions, so only two way tunnels
+                    room_id = rng.choice(room_ids)
+                    links = [link for link in cave.rooms[room_id][wumpus.ROOM_LINKS]
+                             if link != room_id and room_id in cave.rooms[link][wumpus.ROOM_LINKS]]
+                    if links:
+                        cave.remove_tunnel(room_id,rng.choice(links))
+                self.check(cave)
+
+    def test_set_contents(self):
+        cave = wumpus.CaveSystem()
+        cave.load("cave_1")
+        self.check(cave)
+        cave.set_contents([(wumpus.WUMPUS,3),(wumpus.PIT,3),(wumpus.GOLD,7),(wumpus.BATS,20)])
+        self.check(cave)
+        cave.clear_contents()
+        self.check(cave)
+        self.assertEqual(cave.percepts(1),0)
+
+class SearchTests(unittest.TestCase):
+    ## test_cave has tunnels 1-2, 1-6, 2-3, 4-5 and 4-6, an exit in 1, bats in 3,
+    ## gold in 4, the wumpus in 5 and a pit in 6
+    def setUp(self):
+        self.cave = wumpus.CaveSystem()
+        self.cave.load("test_cave")
+
+    def test_distances(self):
+        cave = self.cave
+        self.assertEqual(cave.distance_map(1),{1:0,2:1,3:2,4:2,5:3,6:1})
+        self.assertEqual(cave.distance_map(1,wumpus.PIT),{1:0,2:1,3:2})
+        ## Bats in 3 can drop the player in 4, the only safe room not yet reached
+        self.assertEqual(cave.distance_map(1,wumpus.PIT,True),{1:0,2:1,3:2,4:3,5:4})
+        self.assertEqual(cave.distance_map(5),{5:0,4:1,6:2,1:3,2:4,3:5})
+
+    def test_paths(self):
+        cave = self.cave
+        self.assertEqual(cave.path_to(1,1),[1])
+        self.assertEqual(cave.path_to(1,5),[1,6,4,5])
+        self.assertIsNone(cave.path_to(1,5,wumpus.PIT))
+        self.assertEqual(cave.path_to(1,5,wumpus.PIT,True),[1,2,3,4,5])
+        self.assertEqual(cave.reachable(1,wumpus.GOLD),4)
+        self.assertIsNone(cave.reachable(1,wumpus.GOLD,wumpus.PIT,False))
+        self.assertEqual(cave.reachable(1,wumpus.GOLD,None,False),4)
+        self.assertIsNone(cave.reachable(1,"Rope"))
+        self.assertEqual(cave.df_walk(1,wumpus.GOLD),(4,[1,2,3,4]))
+        self.assertEqual(cave.df_walk(1,"Rope"),(None,[1]))
+
+    def test_tunnel_added(self):
+        cave = self.cave
+        cave.distance_map(1,wumpus.PIT)
+        cave.add_tunnel(3,4)
+        self.assertEqual(cave.distance_map(1,wumpus.PIT),{1:0,2:1,3:2,4:3,5:4})
+        self.assertEqual(cave.path_to(1,5,wumpus.PIT),[1,2,3,4,5])
+        self.assertEqual(cave.reachable(1,wumpus.GOLD,wumpus.PIT,False),4)
+
+    def test_tunnel_removed(self):
+        cave = self.cave
+        cave.distance_map(1)
+        cave.remove_tunnel(1,6)
+        self.assertEqual(cave.distance_map(1),{1:0,2:1,3:2})
+        self.assertIsNone(cave.path_to(1,4))
+        self.assertEqual(cave.path_to(6,5),[6,4,5])
+
+    def test_cache(self):
+        cave = self.cave
+        ## The same distance list back means the search was not run again
+        plain = cave.search(1)[0]
+        avoiding = cave.search(1,wumpus.PIT)[0]
+        self.assertIs(cave.search(1)[0],plain)
+        self.assertIs(cave.search(1,wumpus.PIT)[0],avoiding)
+        ## Contents edits only drop searches that look at contents
+        cave.add_contents(wumpus.PIT,2)
+        self.assertIs(cave.search(1)[0],plain)
+        self.assertIsNot(cave.search(1,wumpus.PIT)[0],avoiding)
+        self.assertEqual(cave.distance_map(1,wumpus.PIT),{1:0})
+        ## Tunnel edits drop every search
+        cave.add_tunnel(3,4)
+        self.assertIsNot(cave.search(1)[0],plain)
+        self.assertEqual(cave.distance_map(3),{3:0,2:1,4:1,1:2,5:2,6:2})
+
+if __name__ == "__main__":
+    unittest.main()
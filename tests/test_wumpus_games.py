@@ -0,0 +1,261 @@
+# Regression tests for Hunt the Wumpus snapshots and action logs
+#   python -m unittest discover tests
+import io
+import os
+import sys
+import random
+import unittest
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Games import Hunt_the_Wumpus as wumpus
+
+def play(state,choices,step=wumpus.step):
+    ## Play (kind, n) choices, moving or shooting down the n-th tunnel of the room,
+    ## until they run out or the game ends, returns where the game got to
+    for kind,n in choices:
+        if state.status != "alive":
+            break
+        links = state.cave.rooms[state.location][wumpus.ROOM_LINKS]
+        if kind == wumpus.GRAB:
+            step(state,(wumpus.GRAB,wumpus.GOLD))
+        else:
+            step(state,(kind,links[n % len(links)]))
+    return outcome(state)
+
+def outcome(state):
+    return (state.location,state.gold,state.wumpus_killed,state.status,state.turns,state.arrows,
+            state.cave.get_contents())
+
+def random_choices(rng,count):
+    kinds = [wumpus.MOVE]*6+[wumpus.SHOOT,wumpus.GRAB]
+    return [(rng.choice(kinds),rng.randrange(3)) for i in range(count)]
+
+def bat_cave():
+    ## cave_1 with more bats and no pits, so games last and use the random number
+    ## generator often
+    cave = wumpus.CaveSystem()
+    cave.load("cave_1")
+    for room_id in cave.rooms_with(wumpus.PIT):
+        cave.remove_contents(wumpus.PIT,room_id)
+    for room_id in (2,9,11,17):
+        cave.add_contents(wumpus.BATS,room_id)
+    return cave
+
+class StepTests(unittest.TestCase):
+    ## test_cave has tunnels 1-2, 1-6, 2-3, 4-5 and 4-6, an exit in 1, bats in 3,
+    ## gold in 4, the wumpus in 5 and a pit in 6
+    SEED = 11
+
+    def setUp(self):
+        self.cave = wumpus.CaveSystem()
+        self.cave.load("test_cave")
+
+    def new_game(self,location):
+        return wumpus.GameState(self.cave.copy(),location,self.SEED)
+
+    def test_walked(self):
+        state,events = wumpus.step(self.new_game(1),(wumpus.MOVE,2))
+        self.assertEqual(events,[("walked",2)])
+        self.assertEqual((state.location,state.status,state.turns),(2,"alive",1))
+
+    def test_dropped(self):
+        ## A one way tunnel has no link back
+        self.cave.add_tunnel(2,4,True)
+        state,events = wumpus.step(self.new_game(2),(wumpus.MOVE,4))
+        self.assertEqual(events,[("dropped",4)])
+        self.assertEqual((state.location,state.status),(4,"alive"))
+
+    def test_carried(self):
+        state,events = wumpus.step(self.new_game(2),(wumpus.MOVE,3))
+        ## Bats land the player in a safe room, drawn from the game's own generator
+        landing = self.cave.copy().bat_landing(3,wumpus.SmallRandom(self.SEED))
+        self.assertIn(landing,(1,2,4))
+        self.assertEqual(events,[("walked",3),("carried",landing)])
+        self.assertEqual((state.location,state.status),(landing,"alive"))
+        self.assertEqual(wumpus.step(self.new_game(2),(wumpus.MOVE,3))[1],events)
+
+    def test_jumped(self):
+        ## Holding the gold next to the wumpus
+        state,events = wumpus.step(self.new_game(4),(wumpus.GRAB,wumpus.GOLD))
+        self.assertEqual(events,[("picked_gold",4),("jumped",4)])
+        self.assertTrue(state.gold)
+        self.assertEqual(state.status,"jumped")
+
+    def test_escaped(self):
+        state = self.new_game(2)
+        state.gold = True
+        state.wumpus_killed = True
+        state,events = wumpus.step(state,(wumpus.MOVE,1))
+        self.assertEqual(events,[("walked",1),("escaped",1)])
+        self.assertEqual(state.status,"escaped")
+        self.assertEqual(wumpus.step(state,(wumpus.MOVE,2))[1],[("game_over","escaped")])
+
+    def test_resolve(self):
+        ## resolve() on its own, for a player put in a room without moving there
+        for location,expected in ((1,[]),(6,[("pit",6)])):
+            state = self.new_game(location)
+            events = []
+            wumpus.resolve(state,events)
+            self.assertEqual(events,expected)
+        state = self.new_game(3)
+        events = []
+        wumpus.resolve(state,events)
+        self.assertEqual(events,[("carried",state.location)])
+        state = self.new_game(1)
+        state.gold = True
+        state.wumpus_killed = True
+        events = []
+        wumpus.resolve(state,events)
+        self.assertEqual(events,[("escaped",1)])
+
+class SnapshotTests(unittest.TestCase):
+    def setUp(self):
+        self.cave = bat_cave()
+
+    def check_resume(self,make_rng):
+        ## A game paused at any turn and restored ends as the uninterrupted game does
+        rng = random.Random(7)
+        for game in range(40):
+            choices = random_choices(rng,60)
+            pause = rng.randrange(len(choices))
+            expected = play(wumpus.GameState(self.cave.copy(),rng=make_rng(game)),choices)
+            state = wumpus.GameState(self.cave.copy(),rng=make_rng(game))
+            play(state,choices[:pause])
+            data = wumpus.snapshot_game(state,self.cave)
+            self.assertEqual(wumpus.snapshot_map(data),"cave_1")
+            restored = wumpus.restore_game(data,self.cave)
+            self.assertEqual(outcome(restored),outcome(state))
+            self.assertEqual(play(restored,choices[pause:]),expected)
+
+    def test_resume_small_random(self):
+        self.check_resume(wumpus.SmallRandom)
+
+    def test_resume_mersenne(self):
+        self.check_resume(random.Random)
+
+    def test_snapshot_leaves_base_unchanged(self):
+        contents = self.cave.get_contents()
+        state = wumpus.GameState(self.cave.copy(),seed=1)
+        play(state,random_choices(random.Random(1),30))
+        wumpus.restore_game(wumpus.snapshot_game(state,self.cave),self.cave)
+        self.assertEqual(self.cave.get_contents(),contents)
+
+    def test_different_map(self):
+        state = wumpus.GameState(self.cave.copy(),seed=1)
+        data = wumpus.snapshot_game(state,self.cave)
+        other = wumpus.CaveSystem()
+        other.load("test_cave")
+        with self.assertRaises(ValueError):
+            wumpus.restore_game(data,other)
+        with self.assertRaises(ValueError):
+            wumpus.restore_game(b"XXXX"+data[4:],self.cave)
+
+class ActionLogTests(unittest.TestCase):
+    def setUp(self):
+        self.cave = bat_cave()
+
+    def logged_game(self,seed,choices,finish=True):
+        state = wumpus.GameState(self.cave.copy(),seed=seed)
+        f = io.BytesIO()
+        log = wumpus.ActionLog(f,state,seed)
+        play(state,choices,log.step)
+        if finish:
+            log.finish(state)
+        return state,f.getvalue()
+
+    def test_replay(self):
+        rng = random.Random(3)
+        for seed in range(40):
+            state,data = self.logged_game(seed,random_choices(rng,80))
+            self.assertEqual(wumpus.log_map(data),"cave_1")
+            replayed,finished,actions = wumpus.replay_log(data,self.cave)
+            self.assertTrue(finished)
+            self.assertEqual(actions,state.turns)
+            self.assertEqual(outcome(replayed),outcome(state))
+
+    def test_invalid_moves_not_logged(self):
+        state = wumpus.GameState(self.cave.copy(),seed=1)
+        f = io.BytesIO()
+        log = wumpus.ActionLog(f,state,1)
+        log.step(state,(wumpus.MOVE,999))
+        log.step(state,("jump",))
+        log.step(state,(None,0))
+        self.assertEqual(state.turns,0)
+        log.finish(state)
+        self.assertEqual(wumpus.replay_log(f.getvalue(),self.cave)[1:],(True,0))
+
+    def test_record_invalid_kind(self):
+        ## Kind 0 would be read back as the start of the final state
+        log = wumpus.ActionLog(io.BytesIO(),wumpus.GameState(self.cave.copy(),seed=1),1)
+        for action in ((None,0),("jump",0)):
+            with self.assertRaises(ValueError):
+                log.record(action)
+
+    def test_cut_off_log(self):
+        state,data = self.logged_game(5,random_choices(random.Random(5),30),False)
+        replayed,finished,actions = wumpus.replay_log(data,self.cave)
+        self.assertFalse(finished)
+        self.assertEqual(outcome(replayed),outcome(state))
+        ## Cut off part way through a record, or through the final state
+        self.assertFalse(wumpus.replay_log(data[:-2],self.cave)[1])
+        state,data = self.logged_game(5,random_choices(random.Random(5),30))
+        self.assertFalse(wumpus.replay_log(data[:-wumpus.LOG_RECORD.size],self.cave)[1])
+        with self.assertRaises(ValueError):
+            wumpus.replay_log(data[:wumpus.LOG_HEADER.size-1],self.cave)
+
+    def test_wrong_ending(self):
+        state,data = self.logged_game(6,random_choices(random.Random(6),30))
+        data = bytearray(data)
+        data[-4] += 1
+        with self.assertRaises(ValueError):
+            wumpus.replay_log(bytes(data),self.cave)
+
+    def test_resumed_log(self):
+        ## A game paused and restored carries on appending to its log
+        rng = random.Random(8)
+        for seed in range(20):
+            choices = random_choices(rng,60)
+            pause = rng.randrange(len(choices))
+            state = wumpus.GameState(self.cave.copy(),seed=seed)
+            f = io.BytesIO()
+            log = wumpus.ActionLog(f,state,seed)
+            play(state,choices[:pause],log.step)
+            state = wumpus.restore_game(wumpus.snapshot_game(state,self.cave),self.cave)
+            log = wumpus.ActionLog(f)
+            play(state,choices[pause:],log.step)
+            log.finish(state)
+            replayed,finished,actions = wumpus.replay_log(f.getvalue(),self.cave)
+            self.assertTrue(finished)
+            self.assertEqual(outcome(replayed),outcome(state))
+
+class CustomItemTests(unittest.TestCase):
+    def setUp(self):
+        self.cave = wumpus.CaveSystem()
+        self.cave.load("cave_1")
+        self.cave.add_contents("Rope",5)
+
+    def test_map_with_custom_item_is_valid(self):
+        self.assertEqual(list(self.cave.validate()),[True])
+
+    def test_log_and_replay(self):
+        state = wumpus.GameState(self.cave.copy(),seed=3)
+        f = io.BytesIO()
+        log = wumpus.ActionLog(f,state,3)
+        play(state,[(wumpus.MOVE,0)]*20,log.step)
+        log.step(state,(wumpus.GRAB,"Rope"))
+        log.finish(state)
+        replayed,finished,actions = wumpus.replay_log(f.getvalue(),self.cave)
+        self.assertTrue(finished)
+        self.assertEqual(replayed.cave.rooms,state.cave.rooms)
+
+    def test_snapshot_changed_custom_item(self):
+        state = wumpus.GameState(self.cave.copy(),seed=3)
+        state.cave.remove_contents("Rope",5)
+        state.cave.add_contents("Rope",7)
+        state.cave.add_contents("Lamp",7)
+        restored = wumpus.restore_game(wumpus.snapshot_game(state,self.cave),self.cave)
+        self.assertEqual(restored.cave.rooms,state.cave.rooms)
+        self.assertEqual(restored.cave.rooms_with("Rope"),{7})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+# Regression tests for the Hunt the Wumpus cave generator
+#   python -m unittest discover tests
+import os
+import sys
+import random
+import unittest
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Games import Hunt_the_Wumpus as wumpus
+
+def random_layout(rng,n):
+    ## A connected layout: a two way spanning tree, then extra tunnels of either kind
+    cave = wumpus.CaveSystem()
+    for room_id in range(1,n+1):
+        cave.add_room(room_id)
+    for room_id in range(2,n+1):
+        cave.add_tunnel(rng.randrange(1,room_id),room_id)
+    for extra in range(n//2):
+        cave.add_tunnel(rng.randrange(1,n+1),rng.randrange(1,n+1),rng.random() < 0.5)
+    return cave
+
+class CaveGeneratorTests(unittest.TestCase):
+    def setUp(self):
+        self.cave = wumpus.CaveSystem()
+        self.cave.load("cave_1")
+
+    def test_generated_caves_validate(self):
+        generator = wumpus.CaveGenerator(self.cave,seed=1)
+        for trial in range(200):
+            cave = generator.generate()
+            self.assertEqual(list(cave.validate()),[True],cave.get_contents())
+
+    def test_random_layouts_validate(self):
+        rng = random.Random(3)
+        for trial in range(100):
+            layout = random_layout(rng,rng.randrange(20,60))
+            generator = wumpus.CaveGenerator(layout,bats=10,seed=trial)
+            cave = generator.generate()
+            self.assertEqual(list(cave.validate()),[True],cave.get_contents())
+
+    def test_refill_validates(self):
+        generator = wumpus.CaveGenerator(self.cave,seed=2)
+        cave = generator.generate()
+        for trial in range(20):
+            generator.generate(cave)
+            self.assertEqual(list(cave.validate()),[True])
+
+    def test_same_seed_same_cave(self):
+        first = wumpus.CaveGenerator(self.cave,seed=5)
+        second = wumpus.CaveGenerator(self.cave,seed=5)
+        for trial in range(10):
+            self.assertEqual(first.generate().get_contents(),second.generate().get_contents())
+        first.seed(9)
+        second.seed(9)
+        self.assertEqual(first.generate().get_contents(),second.generate().get_contents())
+
+    def test_not_connected(self):
+        self.cave.add_room(99)
+        with self.assertRaises(ValueError):
+            wumpus.CaveGenerator(self.cave)
+        with self.assertRaises(ValueError):
+            wumpus.CaveGenerator(wumpus.CaveSystem())
+
+    def test_too_few_bats(self):
+        ## Two end partitions, each needs its own bats
+        cave = wumpus.CaveSystem()
+        for room_id in range(1,10):
+            cave.add_room(room_id)
+        for room_id in range(2,4):
+            cave.add_tunnel(room_id-1,room_id)
+        cave.add_tunnel(3,4,True)
+        cave.add_tunnel(3,7,True)
+        for room_id in (5,6,8,9):
+            cave.add_tunnel(room_id-1,room_id)
+        with self.assertRaises(ValueError):
+            wumpus.CaveGenerator(cave,bats=1).generate()
+        generated = wumpus.CaveGenerator(cave,bats=2,pits=0,seed=1).generate()
+        self.assertEqual(list(generated.validate()),[True])
+
+    def test_cave_too_small(self):
+        cave = wumpus.CaveSystem()
+        for room_id in range(3):
+            cave.add_room(room_id)
+        cave.add_tunnel(0,1)
+        cave.add_tunnel(1,2)
+        with self.assertRaises(ValueError):
+            wumpus.CaveGenerator(cave,seed=1).generate()
+
+if __name__ == "__main__":
+    unittest.main()
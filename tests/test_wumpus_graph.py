@@ -0,0 +1,356 @@
+# Regression tests for the Hunt the Wumpus cave graph algorithms
+#   python -m unittest discover tests
+import os
+import sys
+import random
+import unittest
+from array import array
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Games import Hunt_the_Wumpus as wumpus
+
+def make_topology(n,edges):
+    ## CaveTopology over rooms 0..n-1 from (parent, child) pairs
+    links = [[] for i in range(n)]
+    for parent,child in edges:
+        links[parent].append(child)
+    offsets = array("i",[0])
+    targets = array("i")
+    for room_links in links:
+        targets.extend(room_links)
+        offsets.append(len(targets))
+    return wumpus.CaveTopology(list(range(n)),offsets,targets)
+
+def random_edges(rng,n,m):
+    return [(rng.randrange(n),rng.randrange(n)) for i in range(m)]
+
+def brute_components(n,edges):
+    ## Set of frozensets of rooms, two rooms share one when each reaches the other
+    links = [set() for i in range(n)]
+    for parent,child in edges:
+        links[parent].add(child)
+    reach = []
+    for start in range(n):
+        seen = {start}
+        stack = [start]
+        while stack:
+            for j in links[stack.pop()]:
+                if j not in seen:
+                    seen.add(j)
+                    stack.append(j)
+        reach.append(seen)
+    return {frozenset(j for j in range(n) if i in reach[j] and j in reach[i]) for i in range(n)}
+
+def found_components(component,count):
+    groups = [set() for c in range(count)]
+    for i,c in enumerate(component):
+        groups[c].add(i)
+    return {frozenset(group) for group in groups}
+
+class StrongComponentTests(unittest.TestCase):
+    def check(self,n,edges):
+        topology = make_topology(n,edges)
+        component,count = wumpus.strong_components(topology.offsets,topology.targets)
+        expected = brute_components(n,edges)
+        self.assertEqual(count,len(expected))
+        self.assertEqual(found_components(component,count),expected)
+        ## Reverse topological numbering, no edge leads to a higher component
+        for parent,child in edges:
+            self.assertGreaterEqual(component[parent],component[child])
+
+    def test_random_graphs(self):
+        rng = random.Random(1)
+        for trial in range(300):
+            n = rng.randrange(1,40)
+            self.check(n,random_edges(rng,n,rng.randrange(3*n)))
+
+    def test_one_room(self):
+        self.check(1,[])
+
+    def test_self_loop(self):
+        self.check(1,[(0,0)])
+        self.check(3,[(0,0),(0,1),(1,1),(2,2)])
+
+    def test_disconnected(self):
+        self.check(6,[(0,1),(1,0),(2,3),(3,2),(4,4)])
+
+    def test_empty(self):
+        self.assertEqual(wumpus.strong_components(array("i",[0]),array("i")),([],0))
+
+    def test_long_chain_is_not_recursive(self):
+        ## Far deeper than the recursion limit
+        n = 50000
+        topology = make_topology(n,[(i,i+1) for i in range(n-1)])
+        component,count = topology.components()
+        self.assertEqual(count,n)
+        self.assertEqual(component,list(range(n-1,-1,-1)))
+        topology = make_topology(n,[(i,i+1) for i in range(n-1)]+[(n-1,0)])
+        self.assertEqual(topology.components(),([0]*n,1))
+
+class CondensationTests(unittest.TestCase):
+    def check(self,n,edges):
+        topology = make_topology(n,edges)
+        dag = wumpus.Condensation(topology)
+        expected = brute_components(n,edges)
+        self.assertEqual(len(dag),len(expected))
+        self.assertEqual({frozenset(members) for members in dag.members},expected)
+        for c,members in enumerate(dag.members):
+            self.assertEqual(members,sorted(members))
+            for room_id in members:
+                self.assertEqual(dag.component_of(room_id),c)
+        ## DAG edges are exactly the tunnels between different components
+        links = [set() for c in range(len(dag))]
+        for parent,child in edges:
+            if dag.component[parent] != dag.component[child]:
+                links[dag.component[parent]].add(dag.component[child])
+        self.assertEqual([set(successors) for successors in dag.successors],links)
+        has_parent = set().union(*links)
+        self.assertEqual(dag.sources,[c for c in range(len(dag)) if c not in has_parent])
+        self.assertEqual(dag.sinks,[c for c in range(len(dag)) if not links[c]])
+        ## Some room reaches every room exactly when one component has no parent
+        reaches = any(len(self.reach(edges,start)) == n for start in range(n))
+        self.assertEqual(dag.reaches_all(),reaches)
+        partitions = dag.partitions()
+        self.assertEqual(list(partitions),sorted(partitions))
+        self.assertEqual({frozenset(rooms) for rooms in partitions.values()},expected)
+
+    def reach(self,edges,start):
+        seen = {start}
+        stack = [start]
+        while stack:
+            i = stack.pop()
+            for parent,child in edges:
+                if parent == i and child not in seen:
+                    seen.add(child)
+                    stack.append(child)
+        return seen
+
+    def test_random_graphs(self):
+        rng = random.Random(2)
+        for trial in range(200):
+            n = rng.randrange(1,25)
+            self.check(n,random_edges(rng,n,rng.randrange(2*n+1)))
+
+    def test_one_room(self):
+        self.check(1,[])
+
+    def test_self_loop(self):
+        self.check(2,[(0,0),(0,1)])
+
+    def test_disconnected(self):
+        self.check(4,[(0,1),(2,3)])
+
+class LandingPoolTests(unittest.TestCase):
+    ## Rooms 0-3 are partition 0, 4-5 partition 1 and 6-8 partition 2
+    component = [0,0,0,0,1,1,2,2,2]
+
+    def samples(self,pools,i,count=200):
+        rng = random.Random(i)
+        return {pools.sample(i,rng) for trial in range(count)}
+
+    def test_other_partitions_first(self):
+        pools = wumpus.LandingPools(self.component,3,[1,2,5,7])
+        self.assertEqual(self.samples(pools,0),{5,7})
+        self.assertEqual(self.samples(pools,4),{1,2,7})
+        pools.remove(5)
+        pools.remove(7)
+        self.assertEqual(self.samples(pools,6),{1,2})
+
+    def test_own_partition_only_when_no_other(self):
+        ## Only partition 0 has safe rooms, so a player there lands in it, never
+        ## in their own room
+        pools = wumpus.LandingPools(self.component,3,[0,1,2])
+        self.assertEqual(self.samples(pools,0),{1,2})
+        self.assertEqual(self.samples(pools,3),{0,1,2})
+        ## A player elsewhere is taken into partition 0
+        self.assertEqual(self.samples(pools,8),{0,1,2})
+        pools.add(4)
+        self.assertEqual(self.samples(pools,0),{4})
+
+    def test_nowhere_to_land(self):
+        pools = wumpus.LandingPools(self.component,3,[2])
+        self.assertEqual(self.samples(pools,2),{None})
+        pools.remove(2)
+        self.assertEqual(self.samples(pools,5),{None})
+
+    def test_edit_order(self):
+        ## Samples depend on which rooms are safe, not on how they came to be
+        first = wumpus.LandingPools(self.component,3,[0,3,5,8])
+        second = wumpus.LandingPools(self.component,3)
+        for i in (8,1,5,0,3):
+            second.add(i)
+        second.remove(1)
+        for i in range(9):
+            rng_first = random.Random(i)
+            rng_second = random.Random(i)
+            self.assertEqual([first.sample(i,rng_first) for trial in range(20)],
+                             [second.sample(i,rng_second) for trial in range(20)])
+
+def cave_links(cave):
+    return {room_id:list(room_data[wumpus.ROOM_LINKS]) for room_id,room_data in cave.rooms.items()}
+
+def topology_links(topology):
+    return {room_id:topology.get_tunnel(room_id) for room_id in topology.ids}
+
+class FreezeTests(unittest.TestCase):
+    def caves(self):
+        ## cave_1, and a cave with one way tunnels, a self loop and a room on its own
+        cave = wumpus.CaveSystem()
+        cave.load("cave_1")
+        yield cave
+        cave = two_partitions()
+        cave.add_tunnel(5,5,True)
+        cave.add_room(9)
+        yield cave
+
+    def test_round_trip(self):
+        for cave in self.caves():
+            links = cave_links(cave)
+            contents = cave.get_contents()
+            topology = cave.freeze()
+            self.assertEqual(topology_links(topology),links)
+            ## Into a new cave, with no contents
+            thawed = topology.thaw()
+            self.assertEqual(list(thawed.rooms),list(cave.rooms))
+            self.assertEqual(cave_links(thawed),links)
+            self.assertEqual(thawed.get_contents(),[])
+            ## Back into the same cave, which keeps its contents
+            cave.thaw(topology)
+            self.assertEqual(cave_links(cave),links)
+            self.assertEqual(cave.get_contents(),contents)
+            self.assertIs(cave.freeze(),topology)
+
+    def test_edits_give_new_topology(self):
+        cave = wumpus.CaveSystem()
+        cave.load("cave_1")
+        topology = first = cave.freeze()
+        self.assertIs(cave.freeze(),topology)
+        ## Contents edits keep the layout
+        cave.add_contents(wumpus.BATS,3)
+        self.assertIs(cave.freeze(),topology)
+        before = topology_links(topology)
+        for edit in (lambda: cave.add_tunnel(1,20),lambda: cave.remove_tunnel(1,2),lambda: cave.add_room(21)):
+            edit()
+            changed = cave.freeze()
+            self.assertIsNot(changed,topology)
+            self.assertEqual(topology_links(changed),cave_links(cave))
+            topology = changed
+        self.assertEqual(len(topology),21)
+        self.assertEqual(cave_links(topology.thaw()),cave_links(cave))
+        ## A frozen topology is not changed by later edits
+        self.assertEqual(topology_links(first),before)
+        self.assertEqual(before[1],[2,5,6])
+        self.assertNotEqual(cave_links(cave)[1],[2,5,6])
+
+class LegacyHelperTests(unittest.TestCase):
+    ## The deprecated rooms dict helpers keep their old results
+    def old_rooms(self):
+        ## 1 <-> 2 -> 3 -> 4 <-> 5, and 6 on its own
+        links = {1:[2],2:[1,3],3:[4],4:[5],5:[4],6:[]}
+        return {room_id:[[],room_links,[],False] for room_id,room_links in links.items()}
+
+    def visited(self,rooms):
+        return [room_id for room_id,room_data in rooms.items() if room_data[wumpus.ROOM_VISITED]]
+
+    def test_create_graph(self):
+        rooms = self.old_rooms()
+        self.assertEqual(wumpus.create_graph(rooms),([1,2,3,4,5,6],[(1,2),(2,1),(2,3),(3,4),(4,5),(5,4)]))
+
+    def test_transpose(self):
+        rooms = wumpus.transpose(self.old_rooms())
+        self.assertEqual({room_id:room_data[wumpus.ROOM_REVERSED] for room_id,room_data in rooms.items()},
+                         {1:[2],2:[1],3:[2],4:[3,5],5:[4],6:[]})
+
+    def test_connected(self):
+        rooms = self.old_rooms()
+        self.assertEqual(self.visited(wumpus.connected(rooms,2)),[1,2,3,4,5])
+        self.assertEqual(self.visited(wumpus.connected(wumpus.reset_visited(rooms),4,True)),[1,2,3,4,5])
+        self.assertEqual(self.visited(wumpus.connected(wumpus.reset_visited(rooms),3,True)),[1,2,3])
+        self.assertEqual(self.visited(wumpus.connected(wumpus.reset_visited(rooms),6)),[6])
+        ## Rooms already flagged visited are not walked through
+        wumpus.reset_visited(rooms)
+        rooms[3][wumpus.ROOM_VISITED] = True
+        self.assertEqual(self.visited(wumpus.connected(rooms,1)),[1,2,3])
+
+    def test_connected_long_walk(self):
+        n = 50000
+        rooms = {i:[[],[i+1] if i+1 < n else [],[],False] for i in range(n)}
+        self.assertEqual(len(self.visited(wumpus.connected(rooms,0))),n)
+
+def two_partitions():
+    ## Rooms 1-3 lead one way into rooms 4-6, exit in 1, gold in 2 and wumpus in 6
+    cave = wumpus.CaveSystem()
+    for room_id in range(1,7):
+        cave.add_room(room_id)
+    cave.add_tunnel(1,2)
+    cave.add_tunnel(2,3)
+    cave.add_tunnel(3,4,True)
+    cave.add_tunnel(4,5)
+    cave.add_tunnel(5,6)
+    cave.add_contents(wumpus.EXIT,1)
+    cave.add_contents(wumpus.GOLD,2)
+    cave.add_contents(wumpus.WUMPUS,6)
+    return cave
+
+class ValidateTests(unittest.TestCase):
+    def test_partitions_in_room_order(self):
+        cave = two_partitions()
+        self.assertEqual(list(cave.validate(3))[:2],["Bats Missing from partition [1, 2, 3]",
+                                                      "Bats Missing from partition [4, 5, 6]"])
+        cave.add_contents(wumpus.BATS,4)
+        self.assertEqual(list(cave.validate(3))[:2],["Path from partition [1, 2, 3] to Bats in room 4 found",
+                                                      "Bats Ok in partition [4, 5, 6]"])
+
+    def test_unreachable_reported(self):
+        cave = two_partitions()
+        cave.add_contents(wumpus.BATS,4)
+        self.assertEqual(list(cave.validate(2)),["Map Ok",True])
+        ## Bats next to the wumpus carry the player off before reaching it
+        cave.remove_contents(wumpus.BATS,4)
+        cave.add_contents(wumpus.BATS,5)
+        self.assertEqual(list(cave.validate(2)),["Unable to reach Wumpus","Map Failed",False])
+        ## A pit on the only way to the gold
+        cave.remove_contents(wumpus.BATS,5)
+        cave.add_contents(wumpus.BATS,4)
+        cave.add_tunnel(2,3)
+        cave.remove_tunnel(1,2)
+        cave.add_tunnel(1,3)
+        cave.add_contents(wumpus.PIT,3)
+        self.assertIn("Unable to reach Gold",list(cave.validate(2)))
+
+    def test_not_connected(self):
+        cave = two_partitions()
+        cave.add_room(7)
+        messages = list(cave.validate(2))
+        self.assertIn("Not Connected",messages)
+        self.assertEqual(messages[-1],False)
+
+    def test_validate_leaves_cave_unchanged(self):
+        cave = two_partitions()
+        rooms = repr(cave.rooms)
+        list(cave.validate(3))
+        self.assertEqual(repr(cave.rooms),rooms)
+
+    def test_cache_cleared_by_edits(self):
+        cave = two_partitions()
+        cave.add_contents(wumpus.BATS,4)
+        first = cave.check()
+        self.assertIs(cave.check(),first)
+        self.assertTrue(first[0])
+        ## A content edit redoes the item checks
+        cave.add_contents(wumpus.GOLD,5)
+        second = cave.check()
+        self.assertIsNot(second,first)
+        self.assertIn((2,"Gold Count Too High"),second[1])
+        cave.remove_contents(wumpus.GOLD,5)
+        self.assertTrue(cave.check()[0])
+        ## A tunnel edit redoes the graph checks, one partition needs no bats
+        cave.remove_contents(wumpus.BATS,4)
+        self.assertFalse(cave.check()[0])
+        cave.add_tunnel(4,3,True)
+        valid,messages = cave.check()
+        self.assertTrue(valid)
+        self.assertFalse([message for level,message in messages if "Bats" in message])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+# Regression tests for the Hunt the Wumpus instrumentation counters
+#   python -m unittest discover tests
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Games import Hunt_the_Wumpus as wumpus
+
+def instrumented_functions():
+    return {(owner,name):getattr(owner,name) for owner,names in wumpus.INSTRUMENTED for name in names}
+
+class InstrumentTests(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.cave = wumpus.CaveSystem()
+        self.cave.load("cave_1")
+
+    def tearDown(self):
+        wumpus.instrument(False)
+        shutil.rmtree(self.folder)
+
+    def test_off_restores_originals(self):
+        originals = instrumented_functions()
+        wumpus.instrument(True)
+        for key,function in instrumented_functions().items():
+            self.assertIsNot(function,originals[key],key)
+            self.assertIs(function.__wrapped__,originals[key],key)
+        list(self.cave.validate())
+        wumpus.step(wumpus.GameState(self.cave.copy(),seed=1),(wumpus.MOVE,2))
+        snapshot = wumpus.instrument(False)
+        self.assertEqual(snapshot["CaveSystem.validate"]["calls"],1)
+        self.assertEqual(snapshot["step"]["calls"],1)
+        for key,function in instrumented_functions().items():
+            self.assertIs(function,originals[key],key)
+        self.assertEqual(wumpus.instrument_stats(),{})
+        ## Turning on twice, then off once, still leaves the originals
+        wumpus.instrument(True)
+        wumpus.instrument(True)
+        wumpus.instrument(False)
+        self.assertEqual(instrumented_functions(),originals)
+
+    def test_environment(self):
+        for setting in ("","0","off","False"):
+            self.assertFalse(wumpus.instrument_from_environment({wumpus.INSTRUMENT_ENV:setting}))
+            self.assertEqual(wumpus.instrument_stats(),{})
+        self.assertTrue(wumpus.instrument_from_environment({wumpus.INSTRUMENT_ENV:"true"}))
+        self.assertIsNone(wumpus.dump_path)
+        wumpus.instrument(False)
+        self.assertEqual(os.listdir(self.folder),[])
+
+    def test_environment_dump_file(self):
+        path = os.path.join(self.folder,"stats.jsonl")
+        environ = {wumpus.INSTRUMENT_ENV:"1",wumpus.INSTRUMENT_FILE_ENV:path}
+        self.assertTrue(wumpus.instrument_from_environment(environ))
+        list(self.cave.validate())
+        wumpus.instrument(False)
+        with open(path) as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual(lines[-1]["stats"]["CaveSystem.validate"]["calls"],1)
+
+    def test_environment_path_refused(self):
+        ## A path in WUMPUS_INSTRUMENT is no longer taken as the dump file
+        path = os.path.join(self.folder,"stats.jsonl")
+        with self.assertRaises(ValueError):
+            wumpus.instrument_from_environment({wumpus.INSTRUMENT_ENV:path})
+        self.assertEqual(wumpus.instrument_stats(),{})
+        self.assertFalse(os.path.exists(path))
+
+if __name__ == "__main__":
+    unittest.main()
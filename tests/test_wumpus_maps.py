@@ -0,0 +1,95 @@
+# Regression tests for Hunt the Wumpus map files
+#   python -m unittest discover tests
+import io
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Games import Hunt_the_Wumpus as wumpus
+
+class BinaryMapTests(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder,"cave"+wumpus.MAP_EXTENSION)
+        cave = wumpus.CaveSystem()
+        cave.load("cave_1")
+        cave.save(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_save_over_own_map(self):
+        ## The loaded cave still has the file memory mapped while it is rewritten
+        cave = wumpus.CaveSystem()
+        cave.load(self.path)
+        copy = cave.copy()
+        cave.add_contents(wumpus.BATS,3)
+        cave.save(self.path)
+        saved = wumpus.CaveSystem()
+        saved.load(self.path)
+        self.assertEqual(saved.rooms,cave.rooms)
+        self.assertEqual(copy.rooms[3][wumpus.ROOM_CONTENTS],[])
+        self.assertEqual(os.listdir(self.folder),["cave"+wumpus.MAP_EXTENSION])
+
+    def test_load_path_and_file(self):
+        text = wumpus.CaveSystem()
+        text.load("cave_1")
+        from_path = wumpus.CaveSystem()
+        from_path.load(self.path)
+        with open(self.path,"rb") as f:
+            from_file = wumpus.CaveSystem()
+            from_file.load(f)
+        with open(self.path,"rb") as f:
+            from_bytes = wumpus.CaveSystem()
+            from_bytes.load(io.BytesIO(f.read()))
+        for cave in (from_path,from_file,from_bytes):
+            self.assertEqual(cave.rooms,text.rooms)
+            self.assertEqual(cave.get_contents(),text.get_contents())
+        self.assertEqual(from_path.name,"cave")
+        self.assertEqual(from_file.name,"cave")
+        self.assertEqual(from_bytes.name,"")
+
+    def test_mapped_rooms_act_as_dict(self):
+        ## Each dict method sees every room, not only those looked up so far
+        text = wumpus.CaveSystem()
+        text.load("cave_1")
+        expected = text.rooms
+        checks = [list,lambda rooms: list(reversed(rooms)),len,dict,sorted,repr,
+                  lambda rooms: list(rooms.keys()),lambda rooms: list(rooms.values()),
+                  lambda rooms: list(rooms.items()),lambda rooms: rooms.copy(),
+                  lambda rooms: rooms | {},lambda rooms: {} | rooms,lambda rooms: {**rooms},
+                  lambda rooms: rooms.get(20),lambda rooms: 20 in rooms,
+                  lambda rooms: rooms == expected,lambda rooms: expected == rooms,
+                  lambda rooms: rooms != expected]
+        for check in checks:
+            cave = wumpus.CaveSystem()
+            cave.load(self.path)
+            cave.rooms[3]
+            self.assertIsInstance(cave.rooms,wumpus.MappedRooms)
+            self.assertEqual(check(cave.rooms),check(expected))
+        cave = wumpus.CaveSystem()
+        cave.load(self.path)
+        cave.rooms |= {21:[[],[]]}
+        self.assertEqual(len(cave.rooms),21)
+        self.assertEqual(sorted(cave.rooms),list(range(1,22)))
+        self.assertEqual(type(wumpus.MappedRooms.fromkeys([1,2])),dict)
+        ## Any dict method left to dict itself must not read the rooms
+        for name in set(dir(dict))-set(vars(wumpus.MappedRooms)):
+            self.assertIn(name,{"__getitem__","__class__","__class_getitem__","__delattr__","__dir__",
+                                "__doc__","__format__","__ge__","__getattribute__","__getstate__","__gt__",
+                                "__init_subclass__","__le__","__lt__","__new__","__reduce_ex__",
+                                "__setattr__","__sizeof__","__str__","__subclasshook__"})
+
+    def test_convert_onto_itself(self):
+        before = wumpus.CaveSystem()
+        before.load(self.path)
+        wumpus.convert_map(self.path,self.path)
+        after = wumpus.CaveSystem()
+        after.load(self.path)
+        self.assertEqual(after.rooms,before.rooms)
+
+if __name__ == "__main__":
+    unittest.main()
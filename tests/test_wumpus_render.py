@@ -0,0 +1,83 @@
+# Regression tests for drawing Hunt the Wumpus caves without Graphviz
+#   python -m unittest discover tests
+import os
+import re
+import sys
+import shutil
+import tempfile
+import unittest
+import xml.etree.ElementTree as ElementTree
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Games import Hunt_the_Wumpus as wumpus
+
+## One DOT statement per line, its quoted strings holding only escaped quotes
+DOT_STRING = r'"(?:[^"\\]|\\.)*"'
+DOT_LINE = re.compile(r'^(digraph {0} {{|\t\d+ \[label={0}( style=filled fillcolor=lightblue)?\]|\t\d+ -> \d+|}})$'.format(DOT_STRING))
+
+def dot_labels(text):
+    ## Room id -> label of the last node statement for it, unescaped
+    labels = {}
+    for room_id,label in re.findall(r'\t(\d+) \[label=({0})'.format(DOT_STRING),text):
+        labels[int(room_id)] = re.sub(r'\\(.)',r'\1',label[1:-1])
+    return labels
+
+class RendererTests(unittest.TestCase):
+    def setUp(self):
+        self.cave = wumpus.CaveSystem()
+        self.cave.load("cave_1")
+        self.cave.add_contents('Say "hi"',6)
+        self.cave.add_contents("back\\slash",7)
+        self.cave.add_contents("<b>&amp;",9)
+
+    def test_dot_escapes_items(self):
+        text = self.cave.renderer().dot(6)
+        for line in text.splitlines():
+            self.assertRegex(line,DOT_LINE)
+        labels = dot_labels(text)
+        self.assertEqual(labels[6],'6nSay "hi", Player')
+        self.assertEqual(labels[7],"7nback\\slash")
+        self.assertEqual(labels[9],"9n<b>&amp;")
+
+    def test_svg_escapes_items(self):
+        root = ElementTree.fromstring(self.cave.renderer().svg(9))
+        texts = [element.text for element in root.iter("{http://www.w3.org/2000/svg}text")]
+        self.assertIn('Say "hi"',texts)
+        self.assertIn("back\\slash",texts)
+        self.assertIn("<b>&amp;, Player",texts)
+
+    def test_frames_redraw_changed_rooms(self):
+        renderer = self.cave.renderer()
+        static = renderer.static_text("dot")
+        self.assertEqual(renderer.dot(),static+"}\n")
+        self.cave.add_contents(wumpus.ARROW,3)
+        text = renderer.dot(4)
+        self.assertTrue(text.startswith(static))
+        self.assertEqual(sorted(dot_labels(text[len(static):])),[3,4])
+        ## A tunnel edit draws the cave again
+        self.cave.add_tunnel(3,20)
+        self.assertIn("\t3 -> 20\n",renderer.dot())
+
+    def test_ascii(self):
+        text = self.cave.renderer().ascii(1)
+        self.assertIn("*     1  Pit, Player",text)
+        self.assertIn('Say "hi"',text)
+
+    def test_export(self):
+        folder = tempfile.mkdtemp()
+        try:
+            renderer = self.cave.renderer()
+            for room_id in (1,2,3):
+                renderer.capture(room_id)
+            written = renderer.export(os.path.join(folder,"game.gv"))
+            with open(written[0]) as f:
+                self.assertEqual(f.read().count("digraph"),3)
+            written = renderer.export(os.path.join(folder,"game"),"svg")
+            self.assertEqual(len(written),3)
+            for path in written:
+                ElementTree.parse(path)
+        finally:
+            shutil.rmtree(folder)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+# Command line tools for Hunt the Wumpus maps
+#   python wumpus_tools.py validate <maps or folders> [--workers N] [--chunk-size N]
+#   python wumpus_tools.py convert <source> <target>   (.txt <-> .wmap)
+#   python wumpus_tools.py simulate <map> [--games N] [--policy random|greedy|module:function]
+import sys
+import json
+import time
+import argparse
+import importlib
+
+from Games import Hunt_the_Wumpus
+
+def validate(args):
+    ## One JSON line per map as each one finishes, exit status 1 if any failed
+    start = time.perf_counter()
+    checked = 0
+    failed = 0
+    paths = Hunt_the_Wumpus.find_maps(args.paths)
+    for result in Hunt_the_Wumpus.validate_maps(paths,args.workers,args.chunk_size):
+        checked += 1
+        if not result["valid"]:
+            failed += 1
+        print(json.dumps(result),flush=True)
+    summary = {"checked":checked,"failed":failed,"seconds":time.perf_counter()-start}
+    print(json.dumps(summary),file=sys.stderr)
+    return 1 if failed else 0
+
+def convert(args):
+    ## Convert between the .txt and binary .wmap formats, decided by extension
+    Hunt_the_Wumpus.convert_map(args.source,args.target)
+    return 0
+
+def load_policy(name):
+    ## A built in policy name, or module:function for a policy of your own
+    if name in Hunt_the_Wumpus.POLICIES:
+        return Hunt_the_Wumpus.POLICIES[name]
+    module,function = name.split(":")
+    return getattr(importlib.import_module(module),function)
+
+def simulate(args):
+    ## Monte Carlo games on one map, prints the aggregated results as JSON
+    cave = Hunt_the_Wumpus.CaveSystem()
+    cave.load(args.map)
+    policy = load_policy(args.policy)
+    results = Hunt_the_Wumpus.simulate(cave,args.games,policy,args.seed,args.workers,args.max_turns)
+    results["map"] = args.map
+    results["policy"] = args.policy
+    results["games_per_second"] = args.games/results["seconds"] if results["seconds"] else 0
+    print(json.dumps(results))
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Hunt the Wumpus map tools")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    command = commands.add_parser("validate",help="validate map files in parallel")
+    command.add_argument("paths",nargs="+",help="map files or folders of .txt and .wmap maps")
+    command.add_argument("--workers",type=int,default=None,help="worker processes (default: one per CPU)")
+    command.add_argument("--chunk-size",type=int,default=16,help="maps handed to a worker at a time")
+    command.set_defaults(run=validate)
+
+    command = commands.add_parser("convert",help="convert a map between .txt and .wmap")
+    command.add_argument("source",help="map to read")
+    command.add_argument("target",help="map to write, .wmap for the binary format")
+    command.set_defaults(run=convert)
+
+    command = commands.add_parser("simulate",help="play many games with a policy and report outcomes")
+    command.add_argument("map",help="map to play")
+    command.add_argument("--games",type=int,default=10000,help="number of games")
+    command.add_argument("--policy",default="random",help="random, greedy or module:function")
+    command.add_argument("--seed",type=int,default=0,help="seed for the per-shard RNGs")
+    command.add_argument("--workers",type=int,default=None,help="worker processes (default: one per CPU)")
+    command.add_argument("--max-turns",type=int,default=1000,help="turns before a game counts as a timeout")
+    command.set_defaults(run=simulate)
+
+    args = parser.parse_args(argv)
+    return args.run(args)
+
+if __name__ == "__main__":
+    sys.exit(main())